@@ -1 +1,2 @@
-from .utils import GraphDatabase, convert_graph_to_string, create_graph_from_string
+from .utils import GraphDatabase, convert_graph_to_string, create_graph_from_string, get_compiled_code_cache_info, Storage, ParallelSearch, \
+    AsyncGraphDatabase, GraphDatabaseServer
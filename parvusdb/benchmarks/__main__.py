@@ -0,0 +1,51 @@
+import argparse
+import json
+import multiprocessing
+import sys
+
+from parvusdb.benchmarks.generators import generators
+from parvusdb.benchmarks.report import run_benchmark, compare
+from parvusdb.benchmarks.scenarios import scenarios
+
+
+def _parse_arguments(arguments):
+    parser = argparse.ArgumentParser(prog='python3 -m parvusdb.benchmarks',
+                                     description='Measures the speed and memory of the database on generated graphs')
+    parser.add_argument('--generators', nargs='+', default=sorted(generators), choices=sorted(generators))
+    parser.add_argument('--sizes', nargs='+', type=int, default=[100, 1000],
+                        help='The numbers of vertices of the graphs')
+    parser.add_argument('--scenarios', nargs='+', default=sorted(scenarios), choices=sorted(scenarios))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--operations', type=int, default=20,
+                        help='The maximum number of operations of each scenario')
+    parser.add_argument('--max-seconds', type=float, default=2,
+                        help='The time after which a scenario stops starting new operations')
+    parser.add_argument('--output', help='Saves the results to this JSON file, to be used as a baseline')
+    parser.add_argument('--baseline', help='Compares the results with the ones saved in this JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='The relative change from the baseline that is reported as a regression')
+    return parser.parse_args(arguments)
+
+
+if __name__ == "__main__":
+    arguments = _parse_arguments(sys.argv[1:])
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for generator_name in arguments.generators:
+        for number_of_vertices in arguments.sizes:
+            for scenario_name in arguments.scenarios:
+                with context.Pool(1) as pool:
+                    result = pool.apply(run_benchmark, (generator_name, number_of_vertices, scenario_name,
+                                                        arguments.seed, arguments.operations, arguments.max_seconds))
+                print(json.dumps(result), file=sys.stderr)
+                results.append(result)
+    if arguments.output:
+        with open(arguments.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    report = {'results': results}
+    if arguments.baseline:
+        with open(arguments.baseline) as f:
+            report['regressions'] = compare(results, json.load(f), arguments.tolerance)
+    print(json.dumps(report, indent=2))
+    if report.get('regressions'):
+        sys.exit(1)
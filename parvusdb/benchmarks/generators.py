@@ -0,0 +1,99 @@
+import random
+
+_tags = ['NN', 'VB', 'JJ', 'DT', 'IN', 'PRP', 'RB', 'CC', 'CD', 'NNP']
+_tag_weights = [30, 18, 10, 12, 10, 6, 5, 4, 2, 3]
+_relations = ['nsubj', 'dobj', 'amod', 'det', 'prep', 'pobj', 'advmod', 'cc', 'conj', 'nummod']
+_words = ['time', 'person', 'year', 'way', 'day', 'thing', 'man', 'world', 'life', 'hand',
+          'is', 'has', 'goes', 'says', 'makes', 'good', 'new', 'first', 'last', 'long',
+          'the', 'a', 'of', 'in', 'to', 'he', 'she', 'it', 'very', 'and']
+
+
+def random_graph(number_of_vertices, seed=0, average_degree=2):
+    """
+    A graph where each edge joins two vertices chosen at random (Erdos-Renyi)
+
+    :param number_of_vertices: The number of vertices
+    :param seed: The seed of the random numbers, the same seed gives the same graph
+    :param average_degree: The average number of edges that leave a vertex
+    :return: The vertices and edges of the graph, as accepted by GraphDatabase.bulk_load()
+    """
+    rng = random.Random(seed)
+    vertices = [_create_vertex(rng, index) for index in range(number_of_vertices)]
+    edges = {}
+    number_of_edges = min(number_of_vertices * average_degree, number_of_vertices * (number_of_vertices - 1))
+    while len(edges) < number_of_edges:
+        source, target = rng.randrange(number_of_vertices), rng.randrange(number_of_vertices)
+        if source != target and (source, target) not in edges:
+            edges[(source, target)] = _create_edge(rng, source, target)
+    return vertices, list(edges.values())
+
+
+def power_law_graph(number_of_vertices, seed=0, edges_per_vertex=2):
+    """
+    A graph where the new vertices are joined to the vertices that already have many edges (Barabasi-Albert),
+    so that a few vertices have most of the edges
+
+    :param number_of_vertices: The number of vertices
+    :param seed: The seed of the random numbers, the same seed gives the same graph
+    :param edges_per_vertex: The number of edges that leave each new vertex
+    :return: The vertices and edges of the graph, as accepted by GraphDatabase.bulk_load()
+    """
+    rng = random.Random(seed)
+    vertices = [_create_vertex(rng, index) for index in range(number_of_vertices)]
+    edges = []
+    endpoints = []
+    for source in range(1, number_of_vertices):
+        targets = set()
+        while len(targets) < min(edges_per_vertex, source):
+            targets.add(rng.choice(endpoints) if endpoints and rng.random() < 0.9 else rng.randrange(source))
+        for target in sorted(targets):
+            edges.append(_create_edge(rng, source, target))
+            endpoints += [source, target]
+    return vertices, edges
+
+
+def parse_graph(number_of_vertices, seed=0, sentence_length=(8, 30)):
+    """
+    A graph made of dependency trees, as the ones written by a parser: each sentence is a tree of words
+    directed from the head to its dependents, with a part of speech on each word and a relation on each edge
+
+    :param number_of_vertices: The number of words
+    :param seed: The seed of the random numbers, the same seed gives the same graph
+    :param sentence_length: The minimum and maximum number of words in a sentence
+    :return: The vertices and edges of the graph, as accepted by GraphDatabase.bulk_load()
+    """
+    rng = random.Random(seed)
+    vertices = []
+    edges = []
+    while len(vertices) < number_of_vertices:
+        first_index = len(vertices)
+        length = min(rng.randint(*sentence_length), number_of_vertices - first_index)
+        for position in range(length):
+            vertex = _create_vertex(rng, first_index + position)
+            vertex['sentence'] = first_index
+            vertex['position'] = position
+            vertices.append(vertex)
+        for position in range(1, length):
+            head = first_index + rng.randrange(position)
+            edges.append(_create_edge(rng, head, first_index + position))
+    return vertices, edges
+
+
+generators = {'random': random_graph, 'power_law': power_law_graph, 'parse': parse_graph}
+
+
+def _create_vertex(rng, index):
+    return {'name': 'v' + str(index), 'tag': _choose_weighted(rng, _tags, _tag_weights), 'text': rng.choice(_words)}
+
+
+def _create_edge(rng, source, target):
+    return 'v' + str(source), 'v' + str(target), {'relation': rng.choice(_relations)}
+
+
+def _choose_weighted(rng, items, weights):
+    threshold = rng.random() * sum(weights)
+    for item, weight in zip(items, weights):
+        threshold -= weight
+        if threshold < 0:
+            return item
+    return items[-1]
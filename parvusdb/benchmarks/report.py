@@ -0,0 +1,73 @@
+import resource
+import time
+
+from parvusdb.benchmarks.generators import generators
+from parvusdb.benchmarks.scenarios import scenarios
+
+
+def run_benchmark(generator_name, number_of_vertices, scenario_name, seed, max_operations, max_seconds):
+    """
+    Runs one scenario on one generated graph. It is called in a new process, so that the memory used by
+    the other benchmarks does not change its peak memory.
+
+    :return: A dict with the throughput, the latency percentiles and the peak memory of the scenario
+    """
+    start_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    vertices, edges = generators[generator_name](number_of_vertices, seed=seed)
+    start = time.perf_counter()
+    durations = scenarios[scenario_name](vertices, edges, seed, max_operations, max_seconds)
+    total_seconds = time.perf_counter() - start
+    durations_in_ms = sorted([duration * 1000 for duration in durations])
+    return {'generator': generator_name,
+            'vertices': len(vertices),
+            'edges': len(edges),
+            'scenario': scenario_name,
+            'seed': seed,
+            'operations': len(durations),
+            'ops_per_second': len(durations) / sum(durations) if sum(durations) else None,
+            'latency_ms': {'p50': _get_percentile(durations_in_ms, 50),
+                           'p90': _get_percentile(durations_in_ms, 90),
+                           'p99': _get_percentile(durations_in_ms, 99),
+                           'max': durations_in_ms[-1] if durations_in_ms else None},
+            'setup_seconds': total_seconds - sum(durations),
+            'start_memory_kb': start_memory,
+            'peak_memory_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compares the results with the ones of a baseline with the same generator, number of vertices and scenario
+
+    :param results: The list of results of run_benchmark()
+    :param baseline: A list of results saved from a previous run
+    :param tolerance: The relative change that is considered a regression, e.g. 0.2 for 20%
+    :return: A list of dicts with the measures that are worse than the baseline
+    """
+    baseline_dict = {_get_key(result): result for result in baseline}
+    regressions = []
+    for result in results:
+        old_result = baseline_dict.get(_get_key(result))
+        if not old_result:
+            continue
+        measures = [('ops_per_second', result['ops_per_second'], old_result['ops_per_second'], -1),
+                    ('latency_ms.p99', result['latency_ms']['p99'], old_result['latency_ms']['p99'], 1),
+                    ('peak_memory_kb', result['peak_memory_kb'], old_result['peak_memory_kb'], 1)]
+        for name, value, old_value, direction in measures:
+            if value is None or not old_value:
+                continue
+            change = (value - old_value) / old_value
+            if change * direction > tolerance:
+                regressions.append({'generator': result['generator'], 'vertices': result['vertices'],
+                                    'scenario': result['scenario'], 'measure': name,
+                                    'baseline': old_value, 'value': value, 'change': change})
+    return regressions
+
+
+def _get_key(result):
+    return result['generator'], result['vertices'], result['scenario']
+
+
+def _get_percentile(sorted_values, percentile):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * percentile / 100))]
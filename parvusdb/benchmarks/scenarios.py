@@ -0,0 +1,126 @@
+import random
+import time
+
+from igraph import Graph
+from parvusdb import GraphDatabase
+
+
+def create(vertices, edges, seed, max_operations, max_seconds):
+    """
+    Adds the graph to an empty database with a CREATE for each edge
+
+    :return: The duration of each operation in seconds
+    """
+    db = GraphDatabase(Graph(directed=True))
+    properties = {vertex['name']: {k: v for k, v in vertex.items() if k != 'name'} for vertex in vertices}
+    queries = ['CREATE %s(%s), %s(%s,%s), %s(%s)' % (repr(properties[source]), source, repr(attributes),
+                                                     source, target, repr(properties[target]), target)
+               for source, target, attributes in edges]
+    return _time_operations([lambda query=query: db.query(query) for query in queries], max_operations, max_seconds)
+
+
+def match(vertices, edges, seed, max_operations, max_seconds):
+    """
+    Looks for a pair of vertices joined by an edge, with the properties of one of the edges of the graph
+
+    :return: The duration of each operation in seconds
+    """
+    db = _load(vertices, edges)
+    plan = db.prepare("MATCH {'tag': $tag1}(a), {'relation': $relation}(a,b), {'tag': $tag2}(b) RETURN a, b")
+    return _time_queries(db, plan, _sample_edge_parameters(vertices, edges, seed, max_operations),
+                         max_operations, max_seconds)
+
+
+def match_where(vertices, edges, seed, max_operations, max_seconds):
+    """
+    As match(), with a WHERE condition on one vertex and one on both of them
+
+    :return: The duration of each operation in seconds
+    """
+    db = _load(vertices, edges)
+    plan = db.prepare("MATCH {'tag': $tag1}(a), {}(a,b), {}(b) "
+                      "WHERE (= (get b \"text\") $text) WHERE (!= (get a \"text\") (get b \"text\")) RETURN a, b")
+    return _time_queries(db, plan, _sample_edge_parameters(vertices, edges, seed, max_operations),
+                         max_operations, max_seconds)
+
+
+def set_properties(vertices, edges, seed, max_operations, max_seconds):
+    """
+    Changes a property of the vertices with a given tag and text
+
+    :return: The duration of each operation in seconds
+    """
+    db = _load(vertices, edges)
+    plan = db.prepare("MATCH {'tag': $tag1, 'text': $text}(a) SET (assoc a \"visited\" $count)")
+    parameters_list = _sample_edge_parameters(vertices, edges, seed, max_operations)
+    for count, parameters in enumerate(parameters_list):
+        parameters['count'] = count
+    return _time_queries(db, plan, parameters_list, max_operations, max_seconds)
+
+
+def delete(vertices, edges, seed, max_operations, max_seconds):
+    """
+    Deletes the target of an edge with the properties of one of the edges of the graph
+
+    :return: The duration of each operation in seconds
+    """
+    db = _load(vertices, edges)
+    plan = db.prepare("MATCH {'tag': $tag1}(a), {'relation': $relation}(a,b), {'tag': $tag2}(b) DELETE b")
+    return _time_queries(db, plan, _sample_edge_parameters(vertices, edges, seed, max_operations),
+                         max_operations, max_seconds)
+
+
+def return_graph(vertices, edges, seed, max_operations, max_seconds):
+    """
+    Writes the whole graph as a string
+
+    :return: The duration of each operation in seconds
+    """
+    db = _load(vertices, edges)
+    return _time_operations([lambda: db.query('RETURN')] * max_operations, max_operations, max_seconds)
+
+
+scenarios = {'create': create, 'match': match, 'match_where': match_where, 'set': set_properties,
+             'delete': delete, 'return_graph': return_graph}
+
+
+def _load(vertices, edges):
+    db = GraphDatabase(Graph(directed=True))
+    db.bulk_load(vertices=vertices, edges=edges)
+    return db
+
+
+def _sample_edge_parameters(vertices, edges, seed, number_of_samples):
+    """
+    :return: A list with the properties of the ends of random edges of the graph, so that each query has a match
+    """
+    rng = random.Random(seed)
+    vertices_dict = {vertex['name']: vertex for vertex in vertices}
+    parameters_list = []
+    for _ in range(number_of_samples if edges else 0):
+        source, target, attributes = rng.choice(edges)
+        parameters_list.append({'tag1': vertices_dict[source]['tag'], 'tag2': vertices_dict[target]['tag'],
+                                'relation': attributes['relation'], 'text': vertices_dict[target]['text']})
+    return parameters_list
+
+
+def _time_queries(db, plan, parameters_list, max_operations, max_seconds):
+    return _time_operations([lambda parameters=parameters: db.query(plan, parameters=parameters)
+                             for parameters in parameters_list], max_operations, max_seconds)
+
+
+def _time_operations(operations, max_operations, max_seconds):
+    """
+    Runs the operations one at a time, until max_operations have run or max_seconds have passed
+
+    :return: The duration of each operation in seconds
+    """
+    durations = []
+    start = time.perf_counter()
+    for operation in operations[:max_operations]:
+        if time.perf_counter() - start > max_seconds:
+            break
+        operation_start = time.perf_counter()
+        operation()
+        durations.append(time.perf_counter() - operation_start)
+    return durations
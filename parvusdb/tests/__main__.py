@@ -1,5 +1,18 @@
+import asyncio
+import json
+import shutil
+import tempfile
+import threading
+
 from igraph import Graph
 from parvusdb.utils import convert_graph_to_string, create_graph_from_string, GraphDatabase
+from parvusdb.utils import get_compiled_code_cache_info, ParallelSearch, Storage
+from parvusdb.utils import AsyncGraphDatabase, GraphDatabaseServer
+from parvusdb.utils.code_container import DummyCodeContainer, DummyCodeContainerFactory
+from parvusdb.utils.lazy_namespace import LazyNamespace
+from parvusdb.utils.node_matcher import StringNodeMatcher
+from parvusdb.benchmarks.generators import generators
+from parvusdb.benchmarks.report import compare
 
 
 class Tests:
@@ -244,6 +257,656 @@ class Tests:
             return True
         return False
 
+    def test_single_pass_creates_the_same_edges_as_the_default_mode(self):
+        self.__print_test_title('In single pass mode CREATE is applied to each match as in the default mode')
+        edges = []
+        for single_pass in [False, True]:
+            g = Graph(directed=True)
+            db = GraphDatabase(g, single_pass=single_pass)
+            db.query("CREATE {'tag': 'P'}(a), {'tag': 'P'}(b), {'tag': 'P'}(c)")
+            db.query("MATCH {'tag': 'P'}(x) CREATE {}(x), {'r': 'knows'}(x,z), {'tag': 'Z'}(z) RETURN x",
+                     repeat_n_times=3)
+            edges.append([(g.vs[edge.source]['name'], g.vs[edge.target]['name']) for edge in g.es])
+            edges[-1].append(len(set(g.es['name'])))
+        if edges[0] == edges[1] == [('a', 'z'), ('b', 'z'), ('c', 'z'), 3]:
+            return True
+        return False
+
+    def test_single_pass_applies_set_to_every_match(self):
+        self.__print_test_title('In single pass mode the SET command is applied once to every match')
+        g = Graph(directed=True)
+        db = GraphDatabase(g, single_pass=True)
+        db.query(
+            """
+            CREATE {'word': 'alberto', 'tag':'NN'}(v1), {'type': 'nsubj'}(v1,v2), {'word': 'write', 'tag':'VB'}(v2),
+                   {'type': 'dobj'}(v2,v3), {'word': 'documentation', 'tag':'NN'}(v3)
+            """)
+        db.query(
+            """
+            MATCH {}(a), {'name': 'r'}(a,b), {}(b)
+            SET (assoc a "subject" "yes")
+            RETURN a
+            """)
+        lst = db.query(
+            """
+            MATCH {'subject': 'yes'}(a)
+            RETURN a
+            """)
+        expected_words = {'alberto', 'write'}
+        if set([row['a']['word'] for row in lst]) == expected_words:
+            return True
+        return False
+
+    def test_iter_query_yields_rows_one_at_a_time(self):
+        self.__print_test_title('The rows of a query can be read one at a time')
+        g = Graph(directed=True)
+        db = GraphDatabase(g)
+        db.query(
+            """
+            CREATE {'word': 'alberto', 'tag':'NN'}(v1), {'type': 'nsubj'}(v1,v2), {'word': 'write', 'tag':'VB'}(v2),
+                   {'type': 'dobj'}(v2,v3), {'word': 'documentation', 'tag':'NN'}(v3)
+            """)
+        rows = db.iter_query(
+            """
+            MATCH {}(a), {'name': 'r'}(a,b), {}(b)
+            RETURN a
+            """)
+        first_row = next(rows)
+        rows.close()
+        all_rows = list(db.iter_query("MATCH {}(a), {'name': 'r'}(a,b), {}(b) RETURN a"))
+        expected_dict = {'word': 'alberto', 'tag': 'NN', 'name': 'v1'}
+        if first_row['a'] == expected_dict and len(all_rows) == 2:
+            return True
+        return False
+
+    def test_prepared_query_with_parameters(self):
+        self.__print_test_title('A prepared query can be executed with different parameters')
+        g = Graph(directed=True)
+        db = GraphDatabase(g)
+        db.query(
+            """
+            CREATE {'word': 'alberto', 'tag':'NN'}(v1), {'type': 'nsubj'}(v1,v2), {'word': 'write', 'tag':'VB'}(v2),
+                   {'type': 'dobj'}(v2,v3), {'word': 'documentation', 'tag':'NN'}(v3)
+            """)
+        plan = db.prepare(
+            """
+            MATCH {'word': $word}(a), {'name': 'r'}(a,b), {}(b)
+              WHERE (in (get b "tag") $tags)
+            RETURN b
+            """)
+        lst1 = db.query(plan, parameters={'word': 'alberto', 'tags': ['VB']})
+        lst2 = db.query(plan, parameters={'word': 'write', 'tags': ['NN', 'VB']})
+        if lst1[0]['b']['word'] == 'write' and lst2[0]['b']['word'] == 'documentation':
+            return True
+        return False
+
+    def test_prepared_create_gives_new_names_to_the_edges(self):
+        self.__print_test_title('Each execution of a prepared CREATE gives new names to the edges without a name')
+        g = Graph(directed=True)
+        db = GraphDatabase(g)
+        db.query("CREATE {'tag': 'PERSON', 'text': 'ann'}(p1), {'tag': 'PERSON', 'text': 'bob'}(p2), {'tag': 'CITY'}(c1)")
+        plan = db.prepare("MATCH {'tag': 'PERSON', 'text': $name}(p), {'tag': 'CITY'}(c) "
+                          "CREATE {}(p), {'relation': 'VISITED'}(p,c), {}(c)")
+        db.query(plan, parameters={'name': 'ann'})
+        db.query(plan, parameters={'name': 'bob'})
+        edge_names = g.es['name']
+        db.query("MATCH {'text': 'ann'}(p), {'relation': 'VISITED', 'name': 'e'}(p,c), {}(c) DELETE e")
+        lst = db.query("MATCH {}(p), {'relation': 'VISITED'}(p,c), {}(c) RETURN p")
+        if len(set(edge_names)) == 2 and g.ecount() == 1 and lst[0]['p']['text'] == 'bob':
+            return True
+        return False
+
+    def test_compiled_code_is_shared_among_queries(self):
+        self.__print_test_title('The LISP code of WHERE and SET is compiled only once')
+        g = Graph(directed=True)
+        db = GraphDatabase(g)
+        db.query(
+            """
+            CREATE {'word': 'alberto', 'tag':'NN'}(v1), {'type': 'nsubj'}(v1,v2), {'word': 'write', 'tag':'VB'}(v2),
+                   {'type': 'dobj'}(v2,v3), {'word': 'documentation', 'tag':'NN'}(v3)
+            """)
+        query = """
+                MATCH {}(a), {'name': 'r'}(a,b), {}(b)
+                  WHERE (= (get a "tag") "VB")
+                SET (assoc b "checked" "yes")
+                RETURN b
+                """
+        db.query(query)
+        misses = get_compiled_code_cache_info()['misses']
+        lst = db.query(query)
+        if get_compiled_code_cache_info()['misses'] == misses and lst[0]['b']['checked'] == 'yes':
+            return True
+        return False
+
+    def test_names_are_found_after_deletion_and_creation(self):
+        self.__print_test_title('The vertices are found by name after the graph is renumbered')
+        g = Graph(directed=True)
+        db = GraphDatabase(g)
+        db.query(
+            """
+            CREATE {'word': 'alberto', 'tag':'NN'}(v1), {'type': 'nsubj'}(v1,v2), {'word': 'write', 'tag':'VB'}(v2),
+                   {'type': 'dobj'}(v2,v3), {'word': 'documentation', 'tag':'NN'}(v3)
+            """)
+        db.query(
+            """
+            MATCH {'word': 'alberto'}(a)
+            DELETE a
+            """)
+        db.query("CREATE {}(v3), {'type': 'amod'}(v3,v4), {'word': 'good', 'tag':'JJ'}(v4)")
+        lst = db.query(
+            """
+            MATCH {'tag': 'NN'}(a), {'name': 'r'}(a,b), {}(b)
+            RETURN a, b, r
+            """)
+        if lst[0]['a']['word'] == 'documentation' and lst[0]['b']['word'] == 'good' \
+                and lst[0]['r']['type'] == 'amod' and len(g.vs) == 3:
+            return True
+        return False
+
+    def test_index_is_used_and_updated(self):
+        self.__print_test_title('An attribute index finds the matches and follows the changes to the graph')
+        g = Graph(directed=True)
+        db = GraphDatabase(g)
+        db.query(
+            """
+            CREATE INDEX ON tag;
+            CREATE {'word': 'alberto', 'tag':'NN'}(v1), {'type': 'nsubj'}(v1,v2), {'word': 'write', 'tag':'VB'}(v2),
+                   {'type': 'dobj'}(v2,v3), {'word': 'documentation', 'tag':'NN'}(v3)
+            """)
+        db.query(
+            """
+            MATCH {'word': 'documentation'}(a)
+            SET (assoc a "tag" "NNS")
+            RETURN a
+            """)
+        lst1 = db.query("MATCH {'tag': 'NN'}(a), {'name': 'r'}(a,b), {}(b) RETURN b")
+        lst2 = db.query("MATCH {}(a), {'name': 'r'}(a,b), {'tag': 'NNS'}(b) RETURN a")
+        if db.indexes()['tag']['vertices'] == 3 and lst1[0]['b']['word'] == 'write' \
+                and lst2[0]['a']['word'] == 'write':
+            return True
+        return False
+
+    def test_match_with_overlapping_properties(self):
+        self.__print_test_title('The match is correct when a vertex can match more than one vertex of the pattern')
+        g = Graph(directed=True)
+        db = GraphDatabase(g)
+        db.query(
+            """
+            CREATE {'word': 'big', 'tag':'JJ'}(v1), {'type': 'amod'}(v1,v2), {'word': 'dog', 'tag':'NN'}(v2),
+                   {'type': 'amod'}(v2,v3), {'word': 'house', 'tag':'NN'}(v3)
+            """)
+        lst1 = db.query("MATCH {'tag': 'NN'}(a), {'type': 'amod'}(a,b), {'tag': 'NN', 'word': 'house'}(b) RETURN a")
+        lst2 = db.query("MATCH {}(a), {'type': 'amod'}(a,b), {'tag': 'NN'}(b) RETURN a, b")
+        words = set((item['a']['word'], item['b']['word']) for item in lst2)
+        if len(lst1) == 3 and lst1[0]['a']['word'] == 'dog' and words == {('big', 'dog'), ('dog', 'house')}:
+            return True
+        return False
+
+    def test_custom_node_matcher_is_used_on_columns(self):
+        self.__print_test_title('A node matcher that overrides _match is used to compare the properties')
+
+        class CaseInsensitiveNodeMatcher(StringNodeMatcher):
+            def _match(self, key, lhs, rhs):
+                return lhs.lower() == rhs.lower()
+
+        g = Graph(directed=True)
+        db = GraphDatabase(g, node_matcher=CaseInsensitiveNodeMatcher())
+        db.query(
+            """
+            CREATE {'word': 'Alberto', 'tag':'NN'}(v1), {'type': 'nsubj'}(v1,v2), {'word': 'write', 'tag':'VB'}(v2),
+                   {'type': 'DOBJ'}(v2,v3), {'word': 'documentation', 'tag':'NN'}(v3)
+            """)
+        lst = db.query("MATCH {'word': 'alberto'}(a), {}(a,b), {}(b), {'type': 'dobj'}(b,c), {'tag': 'nn'}(c) "
+                       "RETURN a, c")
+        if lst and lst[0]['a']['word'] == 'Alberto' and lst[0]['c']['word'] == 'documentation':
+            return True
+        return False
+
+    def test_where_with_one_and_more_variables(self):
+        self.__print_test_title('The WHERE conditions on one variable and on more variables are both checked')
+        g = Graph(directed=True)
+        db = GraphDatabase(g)
+        db.query(
+            """
+            CREATE {'word': 'alberto', 'tag':'NN'}(v1), {'type': 'nsubj'}(v1,v2), {'word': 'write', 'tag':'VB'}(v2),
+                   {'type': 'dobj'}(v2,v3), {'word': 'documentation', 'tag':'NN'}(v3),
+                   {'type': 'amod'}(v3,v4), {'word': 'good', 'tag':'JJ'}(v4)
+            """)
+        lst = db.query(
+            """
+            MATCH {}(a), {}(a,b), {}(b), {}(b,c), {}(c)
+            WHERE (and (= (get b "tag") "VB") (= (get a "tag") (get c "tag")))
+            RETURN a, c
+            """)
+        if set((item['a']['word'], item['c']['word']) for item in lst) == {('alberto', 'documentation')}:
+            return True
+        return False
+
+    def test_bulk_load_adds_vertices_and_edges(self):
+        self.__print_test_title('Many vertices and edges can be loaded at once')
+        g = Graph(directed=True)
+        db = GraphDatabase(g)
+        db.query("CREATE {'word': 'alberto', 'tag':'NN'}(v1)")
+        db.bulk_load(vertices=[{'name': 'v1', 'word': 'not alberto'}, {'name': 'v2', 'word': 'write', 'tag': 'VB'}],
+                     edges=[('v1', 'v2', {'type': 'nsubj'})],
+                     graph_strings=["{}(v2), {'type': 'dobj'}(v2,v3), {'word': 'documentation', 'tag':'NN'}(v3)"])
+        try:
+            db.bulk_load(edges=[('v1', 'v4', {'type': 'amod'})])
+            return False
+        except ValueError:
+            pass
+        lst = db.query("MATCH {}(a), {'type': 'nsubj'}(a,b), {}(b), {'type': 'dobj'}(b,c), {}(c) RETURN a, c")
+        if len(g.vs) == 3 and len(g.es) == 2 and lst[0]['a']['word'] == 'alberto' \
+                and lst[0]['c']['word'] == 'documentation':
+            return True
+        return False
+
+    def test_create_merges_vertices_with_the_same_name(self):
+        self.__print_test_title('CREATE adds only the new vertices and keeps the properties of the old ones')
+        g = Graph(directed=True)
+        db = GraphDatabase(g)
+        db.query("CREATE {'word': 'alberto', 'tag':'NN'}(v1), {'type': 'nsubj'}(v1,v2), {'word': 'write'}(v2)")
+        db.query("CREATE {'word': 'not alberto'}(v1), {'type': 'dobj'}(v1,v3), {'word': 'documentation'}(v3)")
+        lst = db.query("MATCH {}(a), {'type': 'dobj'}(a,b), {}(b) RETURN a, b")
+        if len(g.vs) == 3 and len(g.es) == 2 and lst[0]['a']['word'] == 'alberto' \
+                and lst[0]['a']['tag'] == 'NN' and lst[0]['b']['word'] == 'documentation':
+            return True
+        return False
+
+    def test_graph_is_recovered_from_storage(self):
+        self.__print_test_title('The graph is loaded again from the snapshot and the log of the storage')
+        directory = tempfile.mkdtemp()
+        try:
+            db = GraphDatabase(Graph(directed=True), storage=Storage(directory))
+            db.query("CREATE {'word': 'alberto', 'tag':'NN'}(v1), {'type': 'nsubj'}(v1,v2), {'word': 'write'}(v2)")
+            db.snapshot()
+            db.query("MATCH {'word': 'alberto'}(a) SET (assoc a \"tag\" \"NNP\") RETURN a")
+            db.bulk_load(vertices=[{'name': 'v3', 'word': 'documentation'}], edges=[('v2', 'v3', {'type': 'dobj'})])
+            db.close()
+            db = GraphDatabase(Graph(directed=True), storage=Storage(directory))
+            lst = db.query("MATCH {'tag': 'NNP'}(a), {}(a,b), {}(b), {'type': 'dobj'}(b,c), {}(c) RETURN a, c")
+            db.close()
+        finally:
+            shutil.rmtree(directory)
+        if len(db.get_graph().vs) == 3 and lst and lst[0]['a']['word'] == 'alberto' \
+                and lst[0]['c']['word'] == 'documentation':
+            return True
+        return False
+
+    def test_storage_is_not_loaded_into_a_graph_of_another_type(self):
+        self.__print_test_title('A directed graph in the storage cannot be loaded into an undirected graph')
+        directory = tempfile.mkdtemp()
+        try:
+            db = GraphDatabase(Graph(directed=True), storage=Storage(directory))
+            db.query("CREATE {'tag': 'NN'}(v1), {'type': 'nsubj'}(v1,v2), {'tag': 'VB'}(v2)")
+            db.snapshot()
+            db.close()
+            try:
+                GraphDatabase(Graph(directed=False), storage=Storage(directory))
+                return False
+            except ValueError:
+                pass
+            db = GraphDatabase(Graph(directed=True), storage=Storage(directory))
+            edge_count = db.get_graph().ecount()
+            db.close()
+        finally:
+            shutil.rmtree(directory)
+        if edge_count == 1:
+            return True
+        return False
+
+    def test_recovered_graph_has_the_same_edge_names(self):
+        self.__print_test_title('The edges created without a name have the same names after the log is replayed')
+        directory = tempfile.mkdtemp()
+        try:
+            db = GraphDatabase(Graph(directed=True), storage=Storage(directory))
+            db.query("CREATE {'tag': 'NN'}(v1), {'type': 'nsubj'}(v1,v2), {'tag': 'VB'}(v2)")
+            db.query("MATCH {'tag': 'VB'}(a) CREATE {}(a), {'type': 'dobj'}(a,v3), {'tag': 'NN'}(v3)")
+            db.bulk_load(vertices=[{'name': 'v4'}], edges=[('v3', 'v4', {'type': 'amod'})])
+            plan = db.prepare("MATCH {'tag': $tag}(a) CREATE {}(a), {'type': 'dep'}(a,v5), {}(v5)")
+            db.query(plan, parameters={'tag': 'NN'})
+            db.query(plan, parameters={'tag': 'VB'})
+            edge_names = db.get_graph().es['name']
+            db.close()
+            db = GraphDatabase(Graph(directed=True), storage=Storage(directory))
+            recovered_edge_names = db.get_graph().es['name']
+            db.close()
+        finally:
+            shutil.rmtree(directory)
+        if len(set(edge_names)) == len(edge_names) == 5 and recovered_edge_names == edge_names:
+            return True
+        return False
+
+    def test_graph_string_with_punctuation_in_the_values(self):
+        self.__print_test_title('The values in a graph string can contain spaces, commas and parentheses')
+        g = Graph(directed=True)
+        db = GraphDatabase(g)
+        db.query("CREATE {'text': 'new york (city), usa'}(v1), {}(v1,v2), {}(v2), {}(v2,v1), "
+                 "{'text': 'a {b}'}(v3)")
+        lst = db.query("MATCH {'text': 'new york (city), usa'}(a), {}(a,b), {}(b) RETURN a")
+        if len(g.vs) == 3 and len(set(g.es['name'])) == 2 and lst[0]['a']['name'] == 'v1' \
+                and g.vs[2]['text'] == 'a {b}':
+            return True
+        return False
+
+    def test_database_is_queried_by_many_threads(self):
+        self.__print_test_title('The database can be read and modified by many threads at the same time')
+        g = Graph(directed=True)
+        db = GraphDatabase(g)
+        db.query("CREATE {'word': 'alberto', 'tag':'NN'}(v0)")
+        errors = []
+
+        def run_queries(thread_index):
+            try:
+                for i in range(20):
+                    db.query("CREATE {'tag': 'NN'}(v0), {'type': 'next'}(v0,w%d_%d), {'tag': 'VB'}(w%d_%d)"
+                             % (thread_index, i, thread_index, i))
+                    db.query("MATCH {'tag': 'NN'}(a), {'type': 'next'}(a,b), {'tag': 'VB'}(b) RETURN a, b")
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run_queries, args=(thread_index,)) for thread_index in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        rows = db.iter_query("MATCH {'tag': 'NN'}(a) RETURN a")
+        next(rows)
+        try:
+            db.query("CREATE {'tag': 'NN'}(v1)")
+            return False
+        except RuntimeError:
+            pass
+        rows.close()
+        if not errors and len(g.vs) == 81 and len(g.es) == 80:
+            return True
+        return False
+
+    def test_thread_that_modifies_the_graph_can_read_it(self):
+        self.__print_test_title('A thread inside a query that modifies the graph can read it but not modify it again')
+        g = Graph(directed=True)
+        db = GraphDatabase(g)
+        db.query("CREATE {'tag': 'NN'}(v1), {'type': 'next'}(v1,v2), {'tag': 'VB'}(v2)")
+        results = []
+
+        def run_queries():
+            rows = db.iter_query("MATCH {'tag': 'NN'}(a) SET (assoc a \"seen\" True) RETURN a")
+            next(rows)
+            results.append(db.query("MATCH {'tag': 'VB'}(a) RETURN a")[0]['a']['name'])
+            try:
+                db.query("CREATE {'tag': 'NN'}(v3)")
+            except RuntimeError:
+                results.append('RuntimeError')
+            rows.close()
+
+        thread = threading.Thread(target=run_queries, daemon=True)
+        thread.start()
+        thread.join(timeout=10)
+        if not thread.is_alive() and results == ['v2', 'RuntimeError'] and g.vcount() == 2:
+            return True
+        return False
+
+    def test_dummy_code_container_accepts_everything(self):
+        self.__print_test_title('Without a code container the WHERE conditions accept every match')
+        g = Graph(directed=True)
+        db = GraphDatabase(g, code_container_factory=DummyCodeContainerFactory())
+        db.query("CREATE {'tag': 'NN'}(v1), {'type': 'next'}(v1,v2), {'tag': 'VB'}(v2)")
+        lst = db.query("MATCH {}(a), {}(a,b), {}(b) WHERE (= (get a \"tag\") \"VB\") RETURN a")
+        code_container = DummyCodeContainer()
+        if lst[0]['a']['name'] == 'v1' and code_container.split_conditions(['a']) == ({}, []) \
+                and code_container.evaluate({'a': {}}) is True:
+            return True
+        return False
+
+    def test_indexed_attribute_with_unhashable_value_is_matched_without_the_index(self):
+        self.__print_test_title('A list value in MATCH finds the same rows with or without an index on its attribute')
+        g = Graph(directed=True)
+        db = GraphDatabase(g)
+        db.query("CREATE {'tags': ['a', 'b']}(v1), {'type': 'next'}(v1,v2), {'tags': 'c'}(v2)")
+        query = "MATCH {'tags': ['a', 'b']}(a), {'type': 'next'}(a,b), {}(b) RETURN a"
+        without_index = db.query(query)
+        db.create_index('tags')
+        db.create_index('type')
+        with_index = db.query(query)
+        if without_index == with_index and with_index[0]['a']['name'] == 'v1':
+            return True
+        return False
+
+    def test_failing_query_is_rolled_back(self):
+        self.__print_test_title('A query that fails does not change the graph and the readers see the old version')
+        g = Graph(directed=True)
+        db = GraphDatabase(g, snapshot_isolation=True)
+        db.query("CREATE {'tag': 'NN', 'count': 1}(v1), {'type': 'next'}(v1,v2), {'tag': 'NN', 'count': 0}(v2)")
+        expected_graph_str = convert_graph_to_string(g)
+        try:
+            db.query("MATCH {'tag': 'NN'}(a) DELETE a; MATCH {}(a) SET (assoc a \"ratio\" (/ 1 (get a \"count\")))")
+            return False
+        except ZeroDivisionError:
+            pass
+        graph_is_unchanged = convert_graph_to_string(g) == expected_graph_str
+        rows = db.iter_query("MATCH {'tag': 'NN'}(a) RETURN a")
+        next(rows)
+        db.query("MATCH {'count': 0}(a) DELETE a")
+        if graph_is_unchanged and len(g.vs) == 1 and len(list(rows)) == 1 and db.version == 2:
+            return True
+        return False
+
+    def test_rollback_puts_back_vertices_edges_and_attributes_in_order(self):
+        self.__print_test_title('A failing query that creates, sets and deletes leaves the graph exactly as it was')
+        g = Graph(directed=True)
+        db = GraphDatabase(g)
+        db.query("CREATE {'tag': 'NN', 'count': 1}(v1), {'type': 'next'}(v1,v2), {'tag': 'VB', 'count': 2}(v2), "
+                 "{'type': 'next'}(v2,v3), {'tag': 'NN', 'count': 3}(v3)")
+        expected = (convert_graph_to_string(g), g.get_edgelist(), g.vs.attribute_names(), g.es.attribute_names())
+        try:
+            db.query("CREATE {'tag': 'ZERO', 'count': 0}(v4), {'type': 'next'}(v4,v5), {}(v5); "
+                     "MATCH {'tag': 'VB'}(a) SET (assoc a \"seen\" 1); "
+                     "MATCH {'tag': 'VB'}(a) DELETE a; "
+                     "MATCH {'tag': 'ZERO'}(a) SET (assoc a \"ratio\" (/ 1 (get a \"count\")))")
+            return False
+        except ZeroDivisionError:
+            pass
+        if (convert_graph_to_string(g), g.get_edgelist(), g.vs.attribute_names(), g.es.attribute_names()) == expected \
+                and db.query("MATCH {'tag': 'VB'}(a), {}(a,b), {}(b) RETURN b")[0]['b']['name'] == 'v3':
+            return True
+        return False
+
+    def test_parallel_search_finds_the_same_matches(self):
+        self.__print_test_title('The matches found by many processes are the same and in the same order')
+        vertices = [{'name': 'v%d' % index, 'tag': ['NN', 'VB'][index % 2]} for index in range(40)]
+        edges = [('v%d' % index, 'v%d' % ((index * 7 + 1) % 40), {'type': 'next'}) for index in range(40)]
+        match_string = "MATCH {'tag': 'NN'}(a), {'type': 'next'}(a,b), {}(b), {}(b,c), {'tag': 'NN'}(c) RETURN a, b, c"
+        results = []
+        for parallel_search in [None, ParallelSearch(2, min_vertices=0), ParallelSearch(3, min_vertices=0)]:
+            db = GraphDatabase(Graph(directed=True), parallel_search=parallel_search)
+            db.bulk_load(vertices=vertices, edges=edges)
+            results.append(db.query(match_string))
+            db.close()
+        matches = [set((row['a']['name'], row['b']['name'], row['c']['name']) for row in lst) for lst in results]
+        if matches[0] and matches[0] == matches[1] == matches[2] and results[1] == results[2]:
+            return True
+        return False
+
+    def test_async_database_merges_creates_and_serves_pipelined_requests(self):
+        self.__print_test_title('Queued CREATE queries are merged and a socket client can send many queries at once')
+        g = Graph(directed=True)
+        async_db = AsyncGraphDatabase(GraphDatabase(g))
+
+        async def run():
+            creates = [asyncio.ensure_future(async_db.query("CREATE {'tag': 'NN'}(v%d), {}(v%d,v%d), {}(v%d)"
+                                                            % (index, index, index + 1, index + 1)))
+                       for index in range(5)]
+            await asyncio.wait(creates)
+            server = await GraphDatabaseServer(async_db).start()
+            reader, writer = await asyncio.open_connection(*server.get_addresses()[0])
+            requests = [{'query': "CREATE {'tag': 'VB'}(v9)"},
+                        {'query': "MATCH {'tag': $tag}(a) RETURN a", 'parameters': {'tag': 'VB'}},
+                        {'query': "MATCH {'tag': $tag}(a) RETURN a"}]
+            writer.write(''.join([json.dumps(request) + '\n' for request in requests]).encode('utf-8'))
+            responses = [json.loads((await reader.readline()).decode('utf-8')) for _ in requests]
+            writer.close()
+            await server.close()
+            await async_db.close()
+            return responses
+
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        responses = loop.run_until_complete(run())
+        loop.close()
+        if async_db.db.version == 2 and len(g.vs) == 7 and len(g.es) == 5 \
+                and responses[0] == {'result': []} and responses[1]['result'][0]['a']['name'] == 'v9' \
+                and 'error' in responses[2]:
+            return True
+        return False
+
+    def test_query_many_shares_the_matches_until_the_graph_changes(self):
+        self.__print_test_title('Many queries with the same MATCH are searched again only after a change to the graph')
+        g = Graph(directed=True)
+        db = GraphDatabase(g)
+        db.query("CREATE {'tag': 'NN', 'text': 'john'}(v1), {'type': 'next'}(v1,v2), {'tag': 'VB'}(v2)")
+        lst = db.query_many(["MATCH {'tag': 'NN'}(a), {}(a,b), {}(b) RETURN a",
+                             "MATCH {'tag': 'NN'}(a), {}(a,b), {}(b) RETURN b",
+                             "MATCH {'tag': $tag}(a), {}(a,b), {}(b) SET (assoc a \"tag\" \"JJ\")",
+                             "MATCH {'tag': 'NN'}(a), {}(a,b), {}(b) RETURN a"],
+                            [None, None, {'tag': 'NN'}, None])
+        if lst[0][0]['a']['text'] == 'john' and lst[1][0]['b']['tag'] == 'VB' and lst[2] == [] and lst[3] == [] \
+                and g.vs[0]['tag'] == 'JJ':
+            return True
+        return False
+
+    def test_benchmark_graphs_are_reproducible_and_regressions_are_found(self):
+        self.__print_test_title('The benchmark graphs depend only on the seed and a slower run is a regression')
+        for generator in generators.values():
+            vertices, edges = generator(200, seed=3)
+            if (vertices, edges) != generator(200, seed=3) or len(vertices) != 200 or not edges:
+                return False
+        db = GraphDatabase(Graph(directed=True))
+        db.bulk_load(vertices=vertices, edges=edges)
+        if db.query("MATCH {'sentence': 0, 'position': 0}(a) RETURN a")[0]['a']['name'] != 'v0':
+            return False
+        result = {'generator': 'parse', 'vertices': 200, 'scenario': 'match', 'ops_per_second': 50,
+                  'latency_ms': {'p99': 10}, 'peak_memory_kb': 1000}
+        baseline = [dict(result, ops_per_second=100)]
+        regressions = compare([result], baseline, 0.2)
+        if len(regressions) == 1 and regressions[0]['measure'] == 'ops_per_second' \
+                and compare([result], [result], 0.2) == []:
+            return True
+        return False
+
+    def test_profile_and_explain_describe_the_query(self):
+        self.__print_test_title('PROFILE measures the phases of a query and EXPLAIN shows its plan without running it')
+        reports = []
+        g = Graph(directed=True)
+        db = GraphDatabase(g, profile_hook=reports.append)
+        db.query("CREATE {'tag': 'NN', 'text': 'john'}(v1), {'type': 'next'}(v1,v2), {'tag': 'VB'}(v2)")
+        result = db.query("PROFILE MATCH {'tag': 'NN'}(a), {}(a,b), {}(b) WHERE (= (get a \"text\") \"john\") RETURN b")
+        profile = result['profile']
+        explanation = db.query("EXPLAIN MATCH {'tag': 'NN'}(a) DELETE a")
+        if result['results'][0]['b']['tag'] == 'VB' and profile['counters']['matches_found'] == 1 \
+                and profile['counters']['where_evaluations'] > 0 and 'match' in profile['phases_ms'] \
+                and len(reports) == 2 and reports[1] is profile \
+                and explanation['plan']['lines'][0]['commands'][1] == {'command': 'DELETE', 'argument': 'a'} \
+                and g.vcount() == 2:
+            return True
+        return False
+
+    def test_skip_and_limit_return_a_page_of_matches(self):
+        self.__print_test_title('SKIP and LIMIT return only a page of the matches')
+        g = Graph(directed=True)
+        db = GraphDatabase(g)
+        db.bulk_load(vertices=[{'name': 'v' + str(i), 'tag': 'NN', 'position': i} for i in range(20)])
+        query = "MATCH {'tag': 'NN'}(a) RETURN a SKIP $start LIMIT 3"
+        lst = db.query(query, parameters={'start': 5})
+        iterated = list(db.iter_query(query, parameters={'start': 18}))
+        profile = db.query("PROFILE MATCH {'tag': 'NN'}(a) RETURN a LIMIT 2")['profile']
+        if [item['a']['position'] for item in lst] == [5, 6, 7] \
+                and [item['a']['position'] for item in iterated] == [18, 19] \
+                and profile['counters']['matches_found'] == 2 \
+                and len(db.query("MATCH {'tag': 'NN'}(a) RETURN a")) == 20:
+            return True
+        return False
+
+    def test_commands_inside_quoted_values_are_not_split(self):
+        self.__print_test_title('The words of the commands inside the properties and the strings are not commands')
+        g = Graph(directed=True)
+        db = GraphDatabase(g)
+        db.query("CREATE {'sign': 'SPEED LIMIT 50', 'note': 'SKIP ME'}(s1), {'sign': 'STOP'}(s2)")
+        lst = db.query("MATCH {'sign': 'SPEED LIMIT 50'}(a) WHERE (= (get a \"note\") \"SKIP ME\") RETURN a LIMIT 1")
+        if g.vs['sign'] == ['SPEED LIMIT 50', 'STOP'] and len(lst) == 1 and lst[0]['a']['name'] == 's1':
+            return True
+        return False
+
+    def test_set_changes_only_the_items_named_in_the_code(self):
+        self.__print_test_title('SET changes the matched variables and the vertices named in the code')
+        g = Graph(directed=True)
+        db = GraphDatabase(g)
+        db.query("CREATE {'tag': 'NN', 'text': 'john'}(v1), {'type': 'next'}(v1,v2), {'tag': 'VB'}(v2)")
+        db.query("CREATE {'tag': 'NN', 'text': 'mary'}(v3)")
+        db.query("MATCH {'tag': 'VB'}(a) SET (do (assoc a \"seen\" True) (assoc v3 \"seen\" (get v1 \"text\")))")
+        if g.vs['seen'] == [None, True, 'john'] and g.vs['text'] == ['john', None, 'mary']:
+            return True
+        return False
+
+    def test_lazy_namespace_finds_only_the_names_in_use(self):
+        self.__print_test_title('The namespace of the code looks up a vertex only when its name is used')
+        g = create_graph_from_string("{'tag': 'NN', 'text': 'john'}(v1), {'type': 'next'}(v1,v2), {'tag': 'VB'}(v2)")
+        namespace = LazyNamespace({'result': True})
+        namespace.add_graph(g)
+        child = namespace.create_child({'a': 'v1'})
+        child['result'] = False
+        g.vs[0]['text'] = 'mary'
+        if child['a']['text'] == 'mary' and child['v2']['tag'] == 'VB' and 'v3' not in child \
+                and namespace['result'] is True and set(namespace) == {'result', 'v1', 'v2'}:
+            return True
+        return False
+
+    def test_delete_all_and_set_all_change_all_the_matches_at_once(self):
+        self.__print_test_title('DELETE ALL and SET ALL change all the matches with one search')
+        g = Graph(directed=True)
+        db = GraphDatabase(g)
+        db.bulk_load(vertices=[{'name': 'v' + str(i), 'tag': 'NN' if i % 2 else 'VB', 'n': i} for i in range(10)],
+                     edges=[('v' + str(i), 'v' + str(i + 1), {'type': 'next'}) for i in range(9)])
+        db.query("MATCH {'tag': 'VB'}(a), {'type': 'next'}(a,b), {}(b) SET ALL (assoc b \"previous\" (get a \"n\"))")
+        db.query("MATCH {'tag': 'VB'}(a) DELETE ALL a")
+        lst = db.query("MATCH {}(a) SET ALL (assoc a \"n\" (* (get a \"n\") 10)) RETURN a")
+        if g.vs['name'] == ['v1', 'v3', 'v5', 'v7', 'v9'] and g.vs['previous'] == [0, 2, 4, 6, 8] \
+                and [row['a']['n'] for row in lst] == [10, 30, 50, 70, 90] and g.ecount() == 0:
+            return True
+        return False
+
+    def test_query_many_searches_again_after_set_all_and_delete_all(self):
+        self.__print_test_title('SET ALL and DELETE ALL remove the matches they change from the cache of query_many')
+        g = Graph(directed=True)
+        db = GraphDatabase(g)
+        db.query("CREATE {'tag': 'NN'}(v1), {'type': 'next'}(v1,v2), {'tag': 'NN'}(v2), {'tag': 'VB'}(v3)")
+        lst = db.query_many(["MATCH {'tag': 'NN'}(a) RETURN a",
+                             "MATCH {'tag': 'NN'}(a) SET ALL (assoc a \"tag\" \"JJ\")",
+                             "MATCH {'tag': 'NN'}(a) RETURN a",
+                             "MATCH {'tag': 'VB'}(a) RETURN a",
+                             "MATCH {'tag': 'VB'}(a) DELETE ALL a",
+                             "MATCH {'tag': 'VB'}(a) RETURN a"])
+        if lst[0][1]['a']['name'] == 'v2' and lst[2] == [] and lst[3][0]['a']['name'] == 'v3' and lst[5] == [] \
+                and g.vs['tag'] == ['JJ', 'JJ']:
+            return True
+        return False
+
+    def test_component_index_searches_only_the_components_that_can_match(self):
+        self.__print_test_title('MATCH searches only the connected components with the labels of the graph')
+        g = Graph(directed=True)
+        db = GraphDatabase(g, component_attributes=['tag', 'relation'])
+        db.bulk_load(graph_strings=["{'tag': 'NN'}(a1), {'relation': 'det'}(a1,a2), {'tag': 'DT'}(a2)",
+                                    "{'tag': 'NN'}(b1), {'relation': 'amod'}(b1,b2), {'tag': 'JJ'}(b2)",
+                                    "{'tag': 'NN'}(c1), {'relation': 'amod'}(c1,c2), {'tag': 'DT'}(c2)"])
+        query = "MATCH {'tag': 'NN'}(a), {'relation': 'det'}(a,b), {'tag': 'DT'}(b) RETURN a, b"
+        profile = db.query('PROFILE ' + query)['profile']
+        db.query("CREATE {}(c1), {'relation': 'det'}(c1,c3), {'tag': 'DT'}(c3)")
+        db.query("MATCH {'tag': 'DT'}(a) DELETE a2")
+        lst = db.query(query)
+        if profile['counters']['vertices_searched'] == 2 and db.components()['components'] == 3 \
+                and [row['b']['name'] for row in lst] == ['c3', 'c3', 'c3', 'c3', 'c3', 'c3']:
+            return True
+        return False
+
 
 if __name__ == "__main__":
     tests = Tests()
@@ -1,2 +1,7 @@
 from .aux import convert_graph_to_string, create_graph_from_string
 from .graph_database import GraphDatabase
+from .async_graph_database import AsyncGraphDatabase
+from .code_container import get_compiled_code_cache_info
+from .storage import Storage
+from .parallel_search import ParallelSearch
+from .server import GraphDatabaseServer
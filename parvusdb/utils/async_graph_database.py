@@ -0,0 +1,130 @@
+import asyncio
+import collections
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+
+class AsyncGraphDatabase:
+    def __init__(self, db, max_workers=4):
+        """
+        This class lets an asyncio program query a GraphDatabase without blocking the event loop.
+        The queries run in a pool of threads with a fixed number of workers.
+
+        The queries that only read the graph run at the same time, while the ones that modify it are put in a queue
+        and run one at a time. Each query sees the changes of the queries that modify the graph and were sent before
+        it, and the queries that modify the graph wait for the queries sent before them.
+        The queries that only CREATE are merged into the graph together when they are waiting in the queue:
+        they are added with a single bulk_load(), which increases db.version only once.
+        If this fails, they are run again one at a time, so that each error is raised by its own query.
+
+        :param db: The GraphDatabase to query
+        :param max_workers: The number of threads that run the queries
+        """
+        self.db = db
+        self._executor = ThreadPoolExecutor(max_workers)
+        self._writes = collections.deque()
+        self._reads = set()
+        self._last_write = None
+        self._writer = None
+
+    async def query(self, string, parameters=None):
+        """
+        Performs a query as GraphDatabase.query(). The query is parsed in the thread of the event loop,
+        which is cheap when the same string has been sent before.
+
+        :param string: The query or a plan returned by GraphDatabase.prepare()
+        :param parameters: A dict with the values of the parameters ($name) used in the query
+        :return: The same list as GraphDatabase.query()
+        """
+        plan = self.db.prepare(string)
+        actions = set([action for line in plan.lines for action, _ in line])
+        if actions <= set(self.db.read_only_actions):
+            read = asyncio.ensure_future(self.__read(plan, parameters, self._last_write))
+            self._reads.add(read)
+            read.add_done_callback(self._reads.discard)
+            return await asyncio.shield(read)
+        graphs = None
+        if actions == {'CREATE'}:
+            graphs = [graph for line in plan.lines for _, graph in plan.bind(line, parameters)]
+        write = asyncio.get_event_loop().create_future()
+        self._writes.append((plan, parameters, graphs, write, set(self._reads)))
+        self._last_write = write
+        if not self._writer:
+            self._writer = asyncio.ensure_future(self.__write_queued())
+        return await asyncio.shield(write)
+
+    async def close(self):
+        """
+        Waits for the queued queries, then closes the database and stops the threads
+
+        :return: None
+        """
+        if self._writer:
+            await asyncio.wait([self._writer])
+        if self._reads:
+            await asyncio.wait(list(self._reads))
+        await self.__execute(self.db.close)
+        self._executor.shutdown()
+
+    # Private
+
+    async def __read(self, plan, parameters, last_write):
+        if last_write and not last_write.done():
+            await asyncio.wait([last_write])
+        return await self.__execute(functools.partial(self.db.query, plan, parameters=parameters))
+
+    async def __write_queued(self):
+        try:
+            while self._writes:
+                writes = [self._writes.popleft()]
+                while self.__can_be_merged(writes[0], self._writes):
+                    writes.append(self._writes.popleft())
+                reads = writes[0][4]
+                if reads:
+                    await asyncio.wait(list(reads))
+                if len(writes) > 1 and await self.__try_to_create(writes):
+                    continue
+                for plan, parameters, _, write, _ in writes:
+                    await self.__run(write, functools.partial(self.db.query, plan, parameters=parameters))
+        finally:
+            self._writer = None
+
+    def __can_be_merged(self, first_write, writes):
+        """
+        The next write can be merged with the first one if they both only CREATE and no query that reads the graph
+        was sent in between (that query must see the graph before the next write)
+        """
+        if not writes or first_write[2] is None or writes[0][2] is None:
+            return False
+        return writes[0][4] <= first_write[4]
+
+    async def __try_to_create(self, writes):
+        """
+        Adds the graphs of many CREATE queries with a single bulk_load()
+
+        :return: True if the graphs have been added
+        """
+        vertices = [vertex.attributes() for _, _, graphs, _, _ in writes for graph in graphs for vertex in graph.vs]
+        edges = [(graph.vs[edge.source]['name'], graph.vs[edge.target]['name'], edge.attributes())
+                 for _, _, graphs, _, _ in writes for graph in graphs for edge in graph.es]
+        try:
+            await self.__execute(functools.partial(self.db.bulk_load, vertices=vertices, edges=edges))
+        except:
+            return False
+        for _, _, _, write, _ in writes:
+            if not write.done():
+                write.set_result([])
+        return True
+
+    async def __run(self, write, function):
+        try:
+            result = await self.__execute(function)
+        except Exception as e:
+            if not write.done():
+                write.set_exception(e)
+            return
+        if not write.done():
+            write.set_result(result)
+
+    async def __execute(self, function):
+        return await asyncio.get_event_loop().run_in_executor(self._executor, function)
@@ -0,0 +1,149 @@
+import copy
+
+
+class AttributeIndex:
+    def __init__(self, g, name_index, attribute):
+        """
+        This class keeps a dictionary from the values of one attribute to the names of the vertices and edges
+        of g that have that value. The names are used instead of the indices because they do not change
+        when the graph is renumbered.
+        Only hashable values that are not None are indexed.
+
+        :param g: The graph to index
+        :param name_index: The NameIndex of g
+        :param attribute: The name of the attribute to index
+        """
+        self.g = g
+        self.name_index = name_index
+        self.attribute = attribute
+        self._vertices = {}
+        self._edges = {}
+        self._vertex_values = {}
+        self._edge_values = {}
+        self.__build()
+
+    def get_vertex_names(self, value):
+        """
+        :param value: The value of the attribute
+        :return: The set of the names of the vertices with this value. None if the value cannot be indexed
+                 (it is not hashable), then the vertices must be searched without the index
+        """
+        try:
+            return self._vertices.get(value, set())
+        except TypeError:
+            return None
+
+    def get_edge_names(self, value):
+        """
+        :param value: The value of the attribute
+        :return: The set of the names of the edges with this value. None if the value cannot be indexed
+                 (it is not hashable), then the edges must be searched without the index
+        """
+        try:
+            return self._edges.get(value, set())
+        except TypeError:
+            return None
+
+    def update_vertices(self, names):
+        """
+        Reads again the value of the attribute for the vertices with these names.
+        The vertices that are not in the graph anymore are removed from the index.
+
+        :param names: The names of the vertices that have been created, modified or deleted
+        :return: None
+        """
+        for name in names:
+            self.__update(name, self.name_index.get_vertex_index(name), self.g.vs,
+                          self._vertices, self._vertex_values)
+
+    def update_edges(self, names):
+        """
+        Reads again the value of the attribute for the edges with these names.
+        The edges that are not in the graph anymore are removed from the index.
+
+        :param names: The names of the edges that have been created, modified or deleted
+        :return: None
+        """
+        for name in names:
+            self.__update(name, self.name_index.get_edge_index(name), self.g.es,
+                          self._edges, self._edge_values)
+
+    def add_vertices(self, first_index):
+        """
+        Adds to the index the vertices from first_index to the end of the graph
+
+        :param first_index: The index of the first new vertex
+        :return: None
+        """
+        self.__add_sequence(self.g.vs[first_index:], self._vertices, self._vertex_values)
+
+    def add_edges(self, first_index):
+        """
+        Adds to the index the edges from first_index to the end of the graph
+
+        :param first_index: The index of the first new edge
+        :return: None
+        """
+        self.__add_sequence(self.g.es[first_index:], self._edges, self._edge_values)
+
+    def copy(self, g, name_index):
+        """
+        Creates the index of a copy of self.g without reading the graph again
+
+        :param g: A copy of self.g
+        :param name_index: The NameIndex of g
+        :return: The AttributeIndex of g
+        """
+        attribute_index = copy.copy(self)
+        attribute_index.g = g
+        attribute_index.name_index = name_index
+        attribute_index._vertices = {value: set(names) for value, names in self._vertices.items()}
+        attribute_index._edges = {value: set(names) for value, names in self._edges.items()}
+        attribute_index._vertex_values = dict(self._vertex_values)
+        attribute_index._edge_values = dict(self._edge_values)
+        return attribute_index
+
+    def get_size(self):
+        """
+        :return: A dict with the number of distinct values and the number of vertices and edges in the index
+        """
+        return {'values': len(set(self._vertices) | set(self._edges)),
+                'vertices': len(self._vertex_values),
+                'edges': len(self._edge_values)}
+
+    # Private
+
+    def __build(self):
+        self.__add_sequence(self.g.vs, self._vertices, self._vertex_values)
+        self.__add_sequence(self.g.es, self._edges, self._edge_values)
+
+    def __add_sequence(self, sequence, values_dict, names_dict):
+        if self.attribute not in sequence.attribute_names() or 'name' not in sequence.attribute_names():
+            return
+        for name, value in zip(sequence['name'], sequence[self.attribute]):
+            self.__remove(name, values_dict, names_dict)
+            self.__add(name, value, values_dict, names_dict)
+
+    def __update(self, name, index, sequence, values_dict, names_dict):
+        self.__remove(name, values_dict, names_dict)
+        if index is None or self.attribute not in sequence.attribute_names():
+            return
+        self.__add(name, sequence[index][self.attribute], values_dict, names_dict)
+
+    def __add(self, name, value, values_dict, names_dict):
+        if value is None:
+            return
+        try:
+            values_dict.setdefault(value, set()).add(name)
+        except TypeError:
+            return
+        names_dict[name] = value
+
+    def __remove(self, name, values_dict, names_dict):
+        if name not in names_dict:
+            return
+        value = names_dict.pop(name)
+        names = values_dict[value]
+        names.discard(name)
+        if not names:
+            del values_dict[value]
@@ -1,9 +1,26 @@
+import ast
+import copy
+import itertools
 import random
+import re
+from collections import OrderedDict
 from igraph import Graph
 
+_name_counter = itertools.count(random.SystemRandom().getrandbits(63))
+_graph_token_regex = re.compile(r"""(?P<dict>\{(?:[^{}'"]|'(?:\\.|[^'\\])*'|"(?:\\.|[^"\\])*")*\})"""
+                                r"""|(?P<names>\([^()'"{}]*\))"""
+                                r"""|'(?:\\.|[^'\\])*'|"(?:\\.|[^"\\])*"|[{}()]|[^'"{}()]+""")
+_immutable_types = (str, int, float, bool, type(None))
+
 
 def get_random_name():
-    return "dummy" + str(random.randint(1, 10000))
+    """
+    The names are taken from a counter that starts from a random number, so that they are all different within
+    the same process and very unlikely to be the same as names created by another process
+
+    :return: A new name for an edge without a name
+    """
+    return "dummy" + str(next(_name_counter))
 
 
 def convert_graph_to_string(g):
@@ -35,29 +52,142 @@ def is_edge(string):
     return string.find(',') != -1
 
 
-def create_graph_from_string(graph_string, directed=True):
-    import ast
+def split_graph_string(graph_string):
+    """
+    Reads a graph string in a single pass and splits it into the properties and the names of its vertices and edges.
+    For example "{'tag': 'PERSON'}(v1), {'relation': 'LIVES_AT'}(v1,v2)" is split into
+    ["{'tag': 'PERSON'}", "{'relation': 'LIVES_AT'}"] and [['v1'], ['v1', 'v2']]
 
-    g = Graph(directed=directed)
-    line = graph_string.replace(' ', '')
-    line = line.replace('\n', '')
-    predicates_strings = line.split("),")
+    :param graph_string: The string with the graph
+    :return: The list of the strings with the properties and the list of the names in the parentheses
+    """
+    dict_strings = []
+    names_list = []
+    depth = 0
+    dict_start = 0
+    for match in _graph_token_regex.finditer(graph_string):
+        token = match.group()
+        if depth > 0:
+            if token == '{':
+                depth += 1
+            elif token == '}':
+                depth -= 1
+                if depth == 0:
+                    dict_strings.append(graph_string[dict_start:match.end()])
+            continue
+        if len(dict_strings) == len(names_list) and (match.lastgroup == 'dict' or token == '{'):
+            if token == '{':
+                depth = 1
+                dict_start = match.start()
+            else:
+                dict_strings.append(token)
+        elif len(dict_strings) == len(names_list) + 1 and match.lastgroup == 'names':
+            names_list.append([name.strip() for name in token[1:-1].split(',')])
+        elif token.strip(' \t\r\n,') or match.lastgroup:
+            raise ValueError('Unexpected ' + repr(token) + ' at position ' + str(match.start())
+                             + ' of the graph string')
+    if depth or len(names_list) != len(dict_strings):
+        raise ValueError('The graph string is not complete')
+    return dict_strings, names_list
+
+
+def evaluate_dict_strings(dict_strings):
+    """
+    Evaluates the strings with the properties all at once. The strings that are repeated are evaluated only once.
+
+    :param dict_strings: A list of strings like "{'tag': 'PERSON'}"
+    :return: A list with a new dict for each string
+    """
+    unique_dict_strings = list(OrderedDict.fromkeys(dict_strings))
+    evaluated_dicts = dict(zip(unique_dict_strings, ast.literal_eval('[' + ','.join(unique_dict_strings) + ']')))
+    attributes_list = []
+    for dict_string in dict_strings:
+        attributes_dict = evaluated_dicts[dict_string]
+        if all([isinstance(value, _immutable_types) for value in attributes_dict.values()]):
+            attributes_list.append(dict(attributes_dict))
+        else:
+            attributes_list.append(copy.deepcopy(attributes_dict))
+    return attributes_list
+
+
+def create_graph_from_string(graph_string, directed=True, unnamed_edges=None):
+    """
+    Builds a graph from a string like "{'tag': 'PERSON'}(v1), {'relation': 'LIVES_AT'}(v1,v2), {'tag': 'PLACE'}(v2)".
+    The properties of all the vertices and edges are evaluated at once, and the vertices and edges are added
+    to the graph with one call to add_vertices() and one to add_edges()
+
+    :param graph_string: The string with the graph
+    :param directed: Whether the graph is directed
+    :param unnamed_edges: If not None, the indices of the edges without a name in the string (that are given
+                          a random name) are appended to this list
+    :return: The graph
+    """
+    dict_strings, names_list = split_graph_string(graph_string)
+    attributes_list = evaluate_dict_strings(dict_strings)
     vertices_to_add = []
     edges_to_add = []
-    for predicate in predicates_strings:
-        predicate = predicate.replace(')', '')
-        attributes_str, name_str = predicate.split("(")
-        attributes_dict = ast.literal_eval(attributes_str)
-        if not is_edge(name_str):
-            attributes_dict['name'] = name_str
+    for attributes_dict, names in zip(attributes_list, names_list):
+        if len(names) == 1:
+            attributes_dict['name'] = names[0]
             vertices_to_add.append(attributes_dict)
-        else:
+        elif len(names) == 2:
             if 'name' not in attributes_dict:
                 attributes_dict['name'] = get_random_name()
-            source, target = name_str.split(',')
-            edges_to_add.append((source, target, attributes_dict))
-    for attributes_dict in vertices_to_add:
-        g.add_vertex(**attributes_dict)
-    for source, target, attributes_dict in edges_to_add:
-        g.add_edge(source, target, **attributes_dict)
+                if unnamed_edges is not None:
+                    unnamed_edges.append(len(edges_to_add))
+            edges_to_add.append((names[0], names[1], attributes_dict))
+        else:
+            raise ValueError('Too many names in (' + ','.join(names) + ')')
+    name_to_index_dict = {}
+    for index, attributes_dict in enumerate(vertices_to_add):
+        name_to_index_dict.setdefault(attributes_dict['name'], index)
+    edge_tuples = []
+    for source, target, _ in edges_to_add:
+        if source not in name_to_index_dict or target not in name_to_index_dict:
+            raise ValueError('The edge (' + source + ',' + target + ') connects a vertex that is not in the graph')
+        edge_tuples.append((name_to_index_dict[source], name_to_index_dict[target]))
+    g = Graph(directed=directed)
+    g.add_vertices(len(vertices_to_add))
+    set_attributes(g.vs, vertices_to_add)
+    g.add_edges(edge_tuples)
+    set_attributes(g.es, [attributes_dict for _, _, attributes_dict in edges_to_add])
     return g
+
+
+def set_attributes(sequence, attributes_list):
+    """
+    Sets the attributes of the vertices or edges in a sequence, one attribute at a time
+
+    :param sequence: The vertices or edges
+    :param attributes_list: A dict with the attributes for each item of the sequence
+    :return: None
+    """
+    keys = []
+    for attributes_dict in attributes_list:
+        keys += [key for key in attributes_dict if key not in keys]
+    for key in keys:
+        sequence[key] = [attributes_dict.get(key) for attributes_dict in attributes_list]
+
+
+def fill_graph(g, vertex_count, vertex_attributes, edges, edge_attributes):
+    """
+    Replaces all the vertices and edges of g, one attribute at a time
+
+    :param g: The graph to fill
+    :param vertex_count: The number of vertices
+    :param vertex_attributes: A dict with the list of the values of each attribute of the vertices
+    :param edges: A list of (source index, target index) pairs
+    :param edge_attributes: A dict with the list of the values of each attribute of the edges
+    :return: None
+    """
+    g.delete_vertices(range(g.vcount()))
+    for key in g.vs.attribute_names():
+        del g.vs[key]
+    for key in g.es.attribute_names():
+        del g.es[key]
+    g.add_vertices(vertex_count)
+    for key, values in vertex_attributes.items():
+        g.vs[key] = values
+    g.add_edges(edges)
+    for key, values in edge_attributes.items():
+        g.es[key] = values
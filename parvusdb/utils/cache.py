@@ -0,0 +1,66 @@
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    def __init__(self, max_size=128):
+        """
+        A dictionary with a maximum size. When it is full, the least recently used item is removed.
+        It can be shared among threads.
+
+        :param max_size: The maximum number of items in the cache
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """
+        :param key: The key of the item
+        :param default: The value to return if the key is not in the cache
+        :return: The item associated to the key
+        """
+        with self._lock:
+            try:
+                value = self._items.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self._items[key] = value
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """
+        Adds an item to the cache, removing the least recently used one if the cache is full
+
+        :param key: The key of the item
+        :param value: The item to store
+        :return: None
+        """
+        with self._lock:
+            self._items.pop(key, None)
+            self._items[key] = value
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        """
+        :return: A dict with the number of hits and misses, the current size and the maximum size of the cache
+        """
+        with self._lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'size': len(self._items),
+                    'max_size': self.max_size}
+
+    def __len__(self):
+        return len(self._items)
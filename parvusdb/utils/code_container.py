@@ -6,14 +6,99 @@ from hy._compat import string_types
 from hy.compiler import hy_compile
 from hy.errors import HyTypeError
 from hy.importer import ast_compile
-from hy.models import HyObject, replace_hy_obj
+from hy.models import HyExpression, HyObject, HySymbol, replace_hy_obj
+
+from .cache import LRUCache
+from .lazy_namespace import LazyNamespace
+from .name_index import NameIndex
+
+_compiled_code_cache = LRUCache(max_size=512)
+_symbols_cache = LRUCache(max_size=512)
+
+
+def get_compiled_code_cache_info():
+    """
+    The compiled LISP code is shared by all the CodeContainers in the process, one entry for each distinct code string
+
+    :return: A dict with the number of hits and misses, the current size and the maximum size of the cache
+    """
+    return _compiled_code_cache.info()
+
+
+def _get_top_level_forms(code_string):
+    forms = []
+    depth = 0
+    start = None
+    in_string = False
+    escape = False
+    for position, character in enumerate(code_string):
+        if in_string:
+            if escape:
+                escape = False
+            elif character == '\\':
+                escape = True
+            elif character == '"':
+                in_string = False
+            continue
+        if character.isspace() and depth == 0:
+            if start is not None:
+                forms.append(code_string[start:position])
+                start = None
+            continue
+        if start is None:
+            start = position
+        if character == '"':
+            in_string = True
+        elif character in '([{':
+            depth += 1
+        elif character in ')]}':
+            depth -= 1
+    if start is not None:
+        forms.append(code_string[start:])
+    return forms
+
+
+def _get_symbols(tree):
+    if isinstance(tree, HySymbol):
+        return {str(tree).split('.')[0]}
+    symbols = set()
+    if isinstance(tree, list):
+        for item in tree:
+            symbols |= _get_symbols(item)
+    return symbols
+
+
+def _get_code_symbols(code_string):
+    symbols = _symbols_cache.get(code_string)
+    if symbols is None:
+        symbols = frozenset(_get_symbols(hy.lex.tokenize(code_string)))
+        _symbols_cache.put(code_string, symbols)
+    return symbols
+
+
+def _get_conditions(code_string):
+    """
+    Splits a line of code of the form (and condition1 condition2 ...) into its conditions
+
+    :param code_string: The line of code
+    :return: A list of (condition, symbols in the condition) pairs
+    """
+    tree = hy.lex.tokenize(code_string)
+    if len(tree) == 1 and isinstance(tree[0], HyExpression) and tree[0] and tree[0][0] == 'and':
+        forms = _get_top_level_forms(code_string.strip()[1:-1])
+        if len(forms) == len(tree[0]):
+            return [condition for form in forms[1:] for condition in _get_conditions(form)]
+    return [(code_string, _get_symbols(tree))]
 
 
 class CodeContainer:
     def __init__(self):
         self.code_strings = []
-        self.namespace = {'result': True}
-        self._compiled_ast_and_expr = None, None
+        self.namespace = LazyNamespace({'result': True})
+        self.changed_vertices = set()
+        self.changed_edges = set()
+        self.changed_attributes = set()
+        self._compiled_code = None, None
 
     def add_line(self, string):
         """
@@ -28,27 +113,60 @@ class CodeContainer:
             code = '(setv result ' + self.code_strings[0] + ')'
         if len(self.code_strings) > 1:
             code = '(setv result (and ' + ' '.join(self.code_strings) + '))'
-        self._compiled_ast_and_expr = self.__compile_code(code_string=code)
+        self._compiled_code = self.__compile_code(code_string=code)
 
-    def add_graph_to_namespace(self, graph):
+    def has_code(self):
         """
-        Adds the variables name to the namespace of the local LISP code
+        :return: True if there are lines of code to execute
+        """
+        return bool(self.code_strings)
+
+    def add_graph_to_namespace(self, graph, name_index=None):
+        """
+        Adds the variables name to the namespace of the local LISP code.
+        The vertices and edges are looked up only when the code uses their names, and the code reads their
+        attributes from the graph through a read-only AttributeView
 
         :param graph: the graph to add to the namespace
+        :param name_index: The NameIndex of the graph. If None a new one is created
+        :return: None
+        """
+        self.namespace.add_graph(graph, name_index)
+
+    def add_items_to_namespace(self, items):
+        """
+        Adds some vertices and edges to the namespace of the local LISP code, each one with its name as variable
+
+        :param items: The vertices and edges to add
+        :return: None
+        """
+        for item in items:
+            self.namespace[item['name']] = item.attributes()
+
+    def add_parameters_to_namespace(self, parameters):
+        """
+        Adds the parameters of the query to the namespace of the local LISP code
+
+        :param parameters: A dict with the names of the parameters (as used in the code) and their values
         :return: None
         """
-        for node in graph.vs:
-            attributes = node.attributes()
-            self.namespace[node['name']] = attributes
-        for node in graph.es:
-            attributes = node.attributes()
-            self.namespace[node['name']] = attributes
+        self.namespace.update(parameters)
+
+    def get_symbols(self):
+        """
+        :return: The set of the symbols in the code: the variables it uses and the functions it calls
+        """
+        symbols = set()
+        for code_string in self.code_strings:
+            symbols |= _get_code_symbols(code_string)
+        return symbols
 
-    def execute(self, vertices_substitution_dict={}):
+    def execute(self, vertices_substitution_dict={}, ignore_errors=True):
         """
         Executes the code
 
         :param vertices_substitution_dict: aliases of the variables in the code
+        :param ignore_errors: If False the errors raised by the code are raised again
         :return: True/False, depending on the result of the code (default is True)
         """
 
@@ -56,53 +174,109 @@ class CodeContainer:
             return True
 
         if vertices_substitution_dict:
-            namespace = self.__substitute_names_in_namespace(self.namespace, vertices_substitution_dict)
+            namespace = self.namespace.create_child({variable: name
+                                                     for name, variable in vertices_substitution_dict.items()})
         else:
             namespace = self.namespace
         try:
-            self.__execute_code(self._compiled_ast_and_expr, namespace)
+            self.__execute_code(self._compiled_code, namespace)
+        except:
+            if not ignore_errors:
+                raise
+        return namespace['result']
+
+    def split_conditions(self, variables):
+        """
+        Splits the code into the conditions that are joined by 'and', and groups them by the variables they use.
+        The conditions that use only one variable can be checked on each vertex or edge alone.
+        Each condition has a CodeContainer of its own, so that an error in one condition does not hide the others.
+        The namespace must already contain the graphs and the parameters.
+
+        :param variables: The names of the variables of the graph to match
+        :return: A dict from each variable to the list of CodeContainers with the conditions that use only
+                 that variable, and a list of CodeContainers with all the other conditions
+        """
+        variables = set(variables)
+        single_variable_containers = {}
+        other_containers = []
+        for code_string in self.code_strings:
+            for condition, symbols in _get_conditions(code_string):
+                container = CodeContainer()
+                container.add_line(condition)
+                container.namespace.update({symbol: self.namespace[symbol] for symbol in symbols - variables
+                                            if symbol in self.namespace})
+                condition_variables = symbols & variables
+                if len(condition_variables) == 1:
+                    single_variable_containers.setdefault(condition_variables.pop(), []).append(container)
+                else:
+                    other_containers.append(container)
+        return single_variable_containers, other_containers
+
+    def evaluate(self, bindings):
+        """
+        Executes the code with some variables bound to the attributes of vertices or edges
+
+        :param bindings: A dict from the names of the variables to the attributes of the vertices or edges
+        :return: True/False, depending on the result of the code (default is True)
+        """
+        if not self.code_strings:
+            return True
+        namespace = self.namespace.create_child()
+        namespace.update(bindings)
+        try:
+            self.__execute_code(self._compiled_code, namespace)
         except:
             pass
         return namespace['result']
 
-    def substitute_namespace_into_graph(self, graph):
+    def substitute_namespace_into_graph(self, graph, name_index=None):
         """
-        Creates a graph from the local namespace of the code (to be used after the execution of the code)
+        Creates a graph from the local namespace of the code (to be used after the execution of the code).
+        Only the attributes that have changed are written. The names of the vertices and edges that have been
+        modified are stored in self.changed_vertices and self.changed_edges, and the names of the attributes
+        in self.changed_attributes
 
         :param graph: The graph to use as a recipient of the namespace
+        :param name_index: The NameIndex of the graph. If None a new one is created
         :return: the updated graph
         """
+        name_index = name_index or NameIndex(graph)
+        names_have_changed = False
         for key, value in self.namespace.items():
+            if not isinstance(value, dict):
+                continue
+            names_have_changed = names_have_changed or value.get('name', key) != key
             try:
-                nodes = graph.vs.select(name=key)
-                for node in nodes:
-                    for k, v in value.items():
-                        node[k] = v
+                for index in name_index.get_vertex_indices(key):
+                    if self.__substitute_dict_into_node(value, graph.vs[index]):
+                        self.changed_vertices.add(key)
             except:
                 pass
             try:
-                nodes = graph.es.select(name=key)
-                for node in nodes:
-                    for k, v in value.items():
-                        node[k] = v
+                for index in name_index.get_edge_indices(key):
+                    if self.__substitute_dict_into_node(value, graph.es[index]):
+                        self.changed_edges.add(key)
             except:
                 pass
+        if names_have_changed:
+            name_index.invalidate()
         return graph
 
-    def __substitute_names_in_namespace(self, old_namespace, vertices_substitution_dict):
-        new_namespace = {}
-        for k, v in old_namespace.items():
-            if k in new_namespace:
-                continue
-            if k in vertices_substitution_dict:
-                new_k = vertices_substitution_dict[k]
-                new_namespace[new_k] = old_namespace[k]
-                new_namespace[new_k]['name'] = k
-            else:
-                new_namespace[k] = old_namespace[k]
-        return new_namespace
+    def __substitute_dict_into_node(self, attributes_dict, node):
+        node_attributes = node.attributes()
+        is_changed = False
+        for k, v in attributes_dict.items():
+            if node_attributes.get(k) != v:
+                node[k] = v
+                self.changed_attributes.add(k)
+                is_changed = True
+        return is_changed
 
     def __compile_code(self, code_string):
+        compiled_code = _compiled_code_cache.get(code_string)
+        if compiled_code:
+            return compiled_code
+
         hytree = hy.lex.tokenize(code_string)
 
         module_name = '__main__'
@@ -128,29 +302,49 @@ class CodeContainer:
             node.lineno = 1
             node.col_offset = 1
 
-        return _ast, expr
+        compiled_code = ast_compile(_ast, "<eval_body>", "exec"), ast_compile(expr, "<eval>", "eval")
+        _compiled_code_cache.put(code_string, compiled_code)
+        return compiled_code
 
     def __execute_code(self, compiled_code, namespace):
-        _ast, expr = compiled_code
+        body_code, expr_code = compiled_code
 
         # Two-step eval: eval() the body of the exec call
-        eval(ast_compile(_ast, "<eval_body>", "exec"), namespace)
+        eval(body_code, namespace)
 
         # Then eval the expression context and return that
-        return eval(ast_compile(expr, "<eval>", "eval"), namespace)
+        return eval(expr_code, namespace)
 
 
 class DummyCodeContainer:
     def add_line(self, string):
         pass
 
-    def add_graph_to_namespace(self, graph):
+    def has_code(self):
+        return False
+
+    def add_graph_to_namespace(self, graph, name_index=None):
+        pass
+
+    def add_items_to_namespace(self, items):
+        pass
+
+    def add_parameters_to_namespace(self, parameters):
         pass
 
-    def execute(self, vertices_substitution_dict={}):
+    def get_symbols(self):
+        return set()
+
+    def execute(self, vertices_substitution_dict={}, ignore_errors=True):
+        return True
+
+    def split_conditions(self, variables):
+        return {}, []
+
+    def evaluate(self, bindings):
         return True
 
-    def substitute_namespace_into_graph(self, graph):
+    def substitute_namespace_into_graph(self, graph, name_index=None):
         return graph
 
 
@@ -0,0 +1,108 @@
+import numpy
+
+
+class CompatibilityMatrix:
+    def __init__(self, lhs_sequence, rhs_sequence, node_matcher, filters=None):
+        """
+        This class tells which vertices (or edges) of a graph have the properties of the vertices (or edges)
+        of a pattern. The items of the pattern with the same properties are grouped into classes, and the matrix
+        has a row for each class and a column for each item of the graph. Each row is computed with a few
+        operations on the columns of the attributes of the graph, using node_matcher.match_columns().
+
+        :param lhs_sequence: The vertices or edges of the bigger graph
+        :param rhs_sequence: The vertices or edges of the pattern
+        :param node_matcher: The class that decides if the properties of two vertices or edges match
+        :param filters: A dict from the index of an item of the pattern to a function that takes an item of the graph
+                        and returns False if they cannot match. The function is only called for the items that
+                        have the right properties. The filtered items of the pattern have a class of their own
+        """
+        filters = filters or {}
+        self.node_matcher = node_matcher
+        self.properties_list = []
+        self.rhs_classes = []
+        self._filters = []
+        for item in rhs_sequence:
+            properties = {k: v for k, v in item.attributes().items() if v and k != 'name'}
+            item_filter = filters.get(item.index)
+            item_class = None
+            if item_filter is None:
+                item_class = next((item_class for item_class, (other_properties, other_filter)
+                                   in enumerate(zip(self.properties_list, self._filters))
+                                   if other_filter is None and other_properties == properties), None)
+            if item_class is None:
+                item_class = len(self.properties_list)
+                self.properties_list.append(properties)
+                self._filters.append(item_filter)
+            self.rhs_classes.append(item_class)
+        self._columns = {}
+        rows = [self.__get_row(lhs_sequence, properties, item_filter)
+                for properties, item_filter in zip(self.properties_list, self._filters)]
+        self.matrix = numpy.array(rows, dtype=bool).reshape((len(rows), len(lhs_sequence)))
+        self._rows = self.matrix.tolist()
+
+    def is_compatible(self, lhs_index, rhs_index):
+        """
+        :param lhs_index: The index of the vertex or edge in the bigger graph
+        :param rhs_index: The index of the vertex or edge in the pattern
+        :return: True if the item of the bigger graph has the properties of the item of the pattern
+        """
+        return self._rows[self.rhs_classes[rhs_index]][lhs_index]
+
+    def get_colors(self):
+        """
+        Gives the colour of a class to the items of the pattern in that class and to the items of the graph that
+        have its properties. If an item of the graph has the properties of more than one class, these classes are
+        merged into the same colour. The colours are then still a necessary condition for a match, but not
+        a sufficient one.
+
+        :return: The colours of lhs, the colours of rhs and True if the colours decide exactly which items match
+        """
+        number_of_classes, number_of_items = self.matrix.shape
+        if not number_of_classes:
+            return [0] * number_of_items, [], True
+        classes_per_item = self.matrix.sum(axis=0)
+        is_shared = classes_per_item > 1
+        parents = list(range(number_of_classes))
+
+        def find(item_class):
+            while parents[item_class] != item_class:
+                item_class = parents[item_class]
+            return item_class
+
+        if is_shared.any():
+            for shared_classes in numpy.unique(self.matrix[:, is_shared], axis=1).T:
+                shared_classes = numpy.flatnonzero(shared_classes)
+                for item_class in shared_classes[1:]:
+                    parents[find(item_class)] = find(shared_classes[0])
+        roots = numpy.array([find(item_class) for item_class in range(number_of_classes)])
+        lhs_colors = numpy.where(classes_per_item > 0, roots[self.matrix.argmax(axis=0)], number_of_classes)
+        rhs_colors = roots[self.rhs_classes]
+        return lhs_colors.tolist(), rhs_colors.tolist(), not is_shared.any()
+
+    # Private
+
+    def __get_row(self, lhs_sequence, properties, item_filter):
+        row = numpy.ones(len(lhs_sequence), dtype=bool)
+        for key, value in properties.items():
+            column = self.__get_column(lhs_sequence, key)
+            if column is None:
+                return numpy.zeros(len(lhs_sequence), dtype=bool)
+            row &= self.node_matcher.match_columns(key, value, column)
+        if item_filter is not None:
+            for index in numpy.flatnonzero(row):
+                row[index] = bool(item_filter(lhs_sequence[int(index)]))
+        return row
+
+    def __get_column(self, lhs_sequence, key):
+        if key in self._columns:
+            return self._columns[key]
+        if key not in lhs_sequence.attribute_names():
+            return None
+        values = lhs_sequence[key]
+        column = numpy.array(values, dtype=object)
+        if column.ndim != 1:
+            column = numpy.empty(len(values), dtype=object)
+            for index, value in enumerate(values):
+                column[index] = value
+        self._columns[key] = column
+        return column
@@ -0,0 +1,257 @@
+import copy
+import threading
+
+from igraph import ALL, OUT, WEAK
+
+
+class ComponentIndex:
+    def __init__(self, g, name_index, attributes):
+        """
+        This class keeps the weakly connected components of g, each one with the names of its vertices and
+        the set of the values of some attributes of its vertices and edges (its labels).
+        A connected graph can only match inside one component, therefore the components that are too small
+        or that miss one of the labels of the graph to match do not need to be searched.
+        The components are kept up to date when vertices and edges are added (by joining them), and they are
+        split again only where vertices and edges are deleted. The labels of a component are read again
+        from the graph only when they are needed after a change.
+        The components can be searched by many threads that read the graph at the same time.
+
+        :param g: The graph to index
+        :param name_index: The NameIndex of g
+        :param attributes: The names of the attributes whose values are the labels of the components.
+                           The names of the vertices and edges are never used as labels
+        """
+        self.g = g
+        self.name_index = name_index
+        self.attributes = [attribute for attribute in attributes if attribute != 'name']
+        self._component_ids = None
+        self._vertices = None
+        self._labels = None
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        """
+        Tells the index that the graph has changed in a way that is not described by the other methods
+        (e.g. the names of the vertices have changed). The components are built again when needed.
+
+        :return: None
+        """
+        self._component_ids = None
+        self._vertices = None
+        self._labels = None
+
+    def add_vertices(self, first_index):
+        """
+        Adds a component for each vertex from first_index to the end of the graph
+
+        :param first_index: The index of the first new vertex
+        :return: None
+        """
+        if self._vertices is None:
+            return
+        for vertex in self.g.vs[first_index:]:
+            component_id = self.__create_component([vertex['name']])
+            self._labels[component_id] = self.__get_labels('vertex', vertex)
+
+    def add_edges(self, first_index):
+        """
+        Joins the components of the ends of each edge from first_index to the end of the graph
+
+        :param first_index: The index of the first new edge
+        :return: None
+        """
+        if self._vertices is None:
+            return
+        for edge in self.g.es[first_index:]:
+            source_id = self._component_ids[self.g.vs[edge.source]['name']]
+            target_id = self._component_ids[self.g.vs[edge.target]['name']]
+            component_id = self.__join(source_id, target_id)
+            if self._labels[component_id] is not None:
+                self._labels[component_id] |= self.__get_labels('edge', edge)
+
+    def update_vertices(self, names):
+        """
+        Reads again the labels of the components of the vertices with these names
+
+        :param names: The names of the vertices that have been modified
+        :return: None
+        """
+        if self._vertices is None:
+            return
+        for name in names:
+            component_id = self._component_ids.get(name)
+            if component_id is not None:
+                self._labels[component_id] = None
+
+    def update_edges(self, names):
+        """
+        Reads again the labels of the components of the edges with these names
+
+        :param names: The names of the edges that have been modified
+        :return: None
+        """
+        if self._vertices is None:
+            return
+        self.update_vertices([self.g.vs[self.g.es[index].source]['name']
+                              for name in names for index in self.name_index.get_edge_indices(name)])
+
+    def split_components(self, names):
+        """
+        Builds again the components of the vertices with these names, after some of their vertices or edges
+        have been deleted. The names of the deleted vertices can be among them.
+
+        :param names: The names of the vertices in the components that have changed
+        :return: None
+        """
+        if self._vertices is None:
+            return
+        component_ids = set([self._component_ids[name] for name in names if name in self._component_ids])
+        remaining_names = set()
+        for component_id in component_ids:
+            remaining_names.update(self._vertices.pop(component_id))
+            del self._labels[component_id]
+        for name in remaining_names:
+            del self._component_ids[name]
+        while remaining_names:
+            index = self.name_index.get_vertex_index(remaining_names.pop())
+            if index is None:
+                continue
+            component_names = [self.g.vs[other_index]['name']
+                               for other_index in self.g.subcomponent(index, mode=ALL)]
+            remaining_names.difference_update(component_names)
+            self.__create_component(component_names)
+
+    def get_vertex_indices(self, rhs_graph, uses_labels=True):
+        """
+        :param rhs_graph: A connected graph to match
+        :param uses_labels: If True, the values of the indexed attributes in rhs_graph must be in the component
+                            with the same value (as with an exact match). Otherwise only the sizes are compared
+        :return: The list of the indices of the vertices in the components where rhs_graph can match.
+                 None if rhs_graph can match in all the components
+        """
+        vertex_count = rhs_graph.vcount()
+        required_labels = set()
+        if uses_labels:
+            required_labels = set([label for vertex in rhs_graph.vs for label in self.__get_labels('vertex', vertex)]
+                                  + [label for edge in rhs_graph.es for label in self.__get_labels('edge', edge)])
+        names = []
+        all_components_match = True
+        with self._lock:
+            self.__update()
+            for component_id, vertex_names in self._vertices.items():
+                if len(vertex_names) >= vertex_count \
+                        and required_labels <= self.__get_component_labels(component_id):
+                    names.extend(vertex_names)
+                else:
+                    all_components_match = False
+        if all_components_match:
+            return None
+        return self.name_index.get_vertex_index_list(names)
+
+    def copy(self, g, name_index):
+        """
+        Creates the index of a copy of self.g without building the components again
+
+        :param g: A copy of self.g
+        :param name_index: The NameIndex of g
+        :return: The ComponentIndex of g
+        """
+        component_index = copy.copy(self)
+        component_index.g = g
+        component_index.name_index = name_index
+        component_index._lock = threading.Lock()
+        if self._vertices is not None:
+            component_index._component_ids = dict(self._component_ids)
+            component_index._vertices = {component_id: set(names) for component_id, names in self._vertices.items()}
+            component_index._labels = {component_id: set(labels) if labels is not None else None
+                                       for component_id, labels in self._labels.items()}
+        return component_index
+
+    def get_size(self):
+        """
+        :return: A dict with the number of components and the number of vertices in the biggest one
+        """
+        with self._lock:
+            self.__update()
+        return {'components': len(self._vertices),
+                'biggest_component': max([len(names) for names in self._vertices.values()] or [0])}
+
+    # Private
+
+    def __update(self):
+        if self._vertices is not None:
+            return
+        self._component_ids = {}
+        self._vertices = {}
+        self._labels = {}
+        self._next_id = 0
+        if not self.g.vcount():
+            return
+        membership = self.g.components(mode=WEAK).membership
+        for name, component_id in zip(self.g.vs['name'], membership):
+            self._component_ids[name] = component_id
+            self._vertices.setdefault(component_id, set()).add(name)
+        self._labels = {component_id: set() for component_id in self._vertices}
+        self._next_id = max(membership) + 1
+        edge_list = self.g.get_edgelist()
+        for attribute in self.attributes:
+            if attribute in self.g.vs.attribute_names():
+                for component_id, value in zip(membership, self.g.vs[attribute]):
+                    self.__add_label(self._labels[component_id], 'vertex', attribute, value)
+            if attribute in self.g.es.attribute_names():
+                for (source, _), value in zip(edge_list, self.g.es[attribute]):
+                    self.__add_label(self._labels[membership[source]], 'edge', attribute, value)
+
+    def __create_component(self, names):
+        component_id = self._next_id
+        self._next_id += 1
+        self._vertices[component_id] = set(names)
+        self._labels[component_id] = None
+        for name in names:
+            self._component_ids[name] = component_id
+        return component_id
+
+    def __join(self, component_id, other_id):
+        if component_id == other_id:
+            return component_id
+        if len(self._vertices[component_id]) < len(self._vertices[other_id]):
+            component_id, other_id = other_id, component_id
+        names = self._vertices.pop(other_id)
+        for name in names:
+            self._component_ids[name] = component_id
+        self._vertices[component_id].update(names)
+        labels = self._labels.pop(other_id)
+        if labels is None or self._labels[component_id] is None:
+            self._labels[component_id] = None
+        else:
+            self._labels[component_id] |= labels
+        return component_id
+
+    def __get_component_labels(self, component_id):
+        labels = self._labels[component_id]
+        if labels is not None:
+            return labels
+        labels = set()
+        for name in self._vertices[component_id]:
+            index = self.name_index.get_vertex_index(name)
+            labels.update(self.__get_labels('vertex', self.g.vs[index]))
+            for edge_index in self.g.incident(index, mode=OUT):
+                labels.update(self.__get_labels('edge', self.g.es[edge_index]))
+        self._labels[component_id] = labels
+        return labels
+
+    def __get_labels(self, kind, item):
+        labels = set()
+        attributes = item.attributes()
+        for attribute in self.attributes:
+            self.__add_label(labels, kind, attribute, attributes.get(attribute))
+        return labels
+
+    def __add_label(self, labels, kind, attribute, value):
+        if not value:
+            return
+        try:
+            labels.add((kind, attribute, value))
+        except TypeError:
+            return
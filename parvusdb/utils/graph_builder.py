@@ -1,37 +1,86 @@
+from igraph import ALL, Vertex
+
+from .aux import get_random_name, set_attributes
 from .code_container import CodeContainer
 from .match import Match
+from .name_index import NameIndex
+from .query_profile import DummyQueryProfile
 
 
 class GraphBuilder:
-    def __init__(self, g, node_matcher, code_container_factory, match_index):
+    def __init__(self, g, node_matcher, code_container_factory, match_index, parameters=None, name_index=None,
+                 attribute_indexes=None, parallel_search=None, match_cache=None, profile=None,
+                 max_matches=None, component_index=None, undo_log=None):
         """
         This class performs the operations into the graph g.
 
         :param g: The graph to modify
+        :param parameters: The values of the parameters of the query, as they are named in the LISP code
+        :param name_index: The NameIndex of g. It is kept up to date with the changes made by this class
+        :param attribute_indexes: A dict with the AttributeIndex of g for each indexed attribute.
+                                  They are kept up to date with the changes made by this class
+        :param parallel_search: A ParallelSearch to look for the matches using many processes
+        :param match_cache: A MatchCache with the matches found by other queries. The matches that can be changed
+                            by this class are removed from it
+        :param profile: A QueryProfile that measures the time of each operation
+        :param max_matches: The search of the matches stops as soon as this number of matches is found.
+                            If None all the matches are found
+        :param component_index: The ComponentIndex of g. It is kept up to date with the changes made by this class
+        :param undo_log: An UndoLog of g where the changes made by this class are recorded before they are made
         """
         self.g = g
+        self.name_index = name_index or NameIndex(g)
+        self.attribute_indexes = attribute_indexes or {}
+        self.match_cache = match_cache
+        self.component_index = component_index
+        self.undo_log = undo_log
+        self.profile = profile or DummyQueryProfile()
+        self.parameters = parameters or {}
         self.vertices_substitution_dict = {}
         self.edges_substitution_dict = {}
         self.matching_graph = None
         self.matching_code_container = code_container_factory.create()
-        self.match = Match(self.matching_code_container, node_matcher, match_index=match_index)
+        self.matching_code_container.add_parameters_to_namespace(self.parameters)
+        self.match = Match(self.matching_code_container, node_matcher, match_index=match_index,
+                           attribute_indexes=self.attribute_indexes, name_index=self.name_index,
+                           parallel_search=parallel_search, profile=self.profile, max_matches=max_matches,
+                           component_index=component_index)
         self.update = True
         self.match_info = {}
 
     def add_graph(self, rhs_graph):
         """
-        Adds a graph to self.g
+        Adds a graph to self.g. The vertices of rhs_graph with the same name as a vertex of self.g are merged into it,
+        keeping the properties of the vertex of self.g. Only the new vertices and edges are added,
+        therefore the cost does not depend on the size of self.g.
 
         :param rhs_graph: the graph to add
         :return: itself
         """
         rhs_graph = self.__substitute_names_in_graph(rhs_graph)
-        self.g = self.__merge_graphs(self.g, rhs_graph)
-        return self
+        return self.add_items([vertex.attributes() for vertex in rhs_graph.vs],
+                              [(rhs_graph.vs[edge.source]['name'], rhs_graph.vs[edge.target]['name'], edge.attributes())
+                               for edge in rhs_graph.es])
+
+    def add_items(self, vertices, edges):
+        """
+        Adds many vertices and edges to self.g with one call to add_vertices() and one to add_edges().
+        A vertex with the name of a vertex that is already in the graph (or earlier in the list) is not added,
+        the first vertex with that name is kept with its properties.
+
+        :param vertices: An iterable of dicts with the properties of the vertices, including their 'name'
+        :param edges: An iterable of (source name, target name, properties dict) triples
+        :return: itself
+        """
+        with self.profile.phase('write'):
+            return self.__add_items(vertices, edges)
 
     def set(self, code):
         """
-        Executes the code and apply it to the self.g
+        Executes the code and apply it to the self.g.
+        Only the vertices and edges that are named in the code (through the variables of the match or by their
+        own names) are passed to the code and written back, therefore the cost does not depend on the size of self.g.
+        If the code raises an error, the error is raised again and self.g is not changed by this code.
 
         :param code: the LISP code to execute
         :return: True/False, depending on the result of the LISP code
@@ -43,13 +92,44 @@ class GraphBuilder:
             self.matching_graph = self.__apply_code_to_graph(code, self.matching_graph)
         except:
             pass
-        try:
-            code = self.__substitute_names_in_code(code)
-            self.g = self.__apply_code_to_graph(code, self.g)
-        except:
-            pass
+        self.g = self.__apply_code_to_graph(code, self.g, self.__get_names_to_variables_dict(), self.name_index,
+                                            ignore_errors=False)
         return True
 
+    def set_all(self, code, matches):
+        """
+        Executes the code once for each match and then writes all the changes to self.g, one attribute at a time.
+        Each execution reads the attributes as they were before the first one. If more matches change
+        the same attribute of the same vertex or edge, the value of the last match is kept.
+        If the code raises an error, the error is raised again and self.g is not changed by this code.
+
+        :param code: the LISP code to execute
+        :param matches: A list of (vertices_substitution_dict, edges_substitution_dict, match_info) tuples,
+                        as returned by match_all()
+        :return: None
+        """
+        vertex_changes = {}
+        edge_changes = {}
+        for match in matches:
+            self.bind(*match)
+            code_container = CodeContainer()
+            with self.profile.phase('compile'):
+                code_container.add_line(code)
+            code_container.add_parameters_to_namespace(self.parameters)
+            items = self.__get_items_in_code(code_container)
+            with self.profile.phase('namespace'):
+                code_container.add_items_to_namespace(items)
+            with self.profile.phase('write'):
+                code_container.execute(self.__get_names_to_variables_dict(), ignore_errors=False)
+                for item in items:
+                    changes = vertex_changes if isinstance(item, Vertex) else edge_changes
+                    old_attributes = item.attributes()
+                    for key, value in code_container.namespace[item['name']].items():
+                        if old_attributes.get(key) != value:
+                            changes.setdefault(key, {})[item.index] = value
+        with self.profile.phase('write'):
+            self.__write_changes(vertex_changes, edge_changes)
+
     def match_graph(self, rhs_graph):
         """
         Sets the graph to match with self.g
@@ -59,6 +139,38 @@ class GraphBuilder:
         """
         self.matching_graph = rhs_graph
 
+    def match_all(self):
+        """
+        Finds all the matches of the matching graph into self.g with a single search
+
+        :return: A list with a (vertices_substitution_dict, edges_substitution_dict, match_info) tuple for each match
+        """
+        return self.match.get_all_variables_substitution_dictionaries(self.g, self.matching_graph)
+
+    def iterate_matches(self):
+        """
+        Finds the matches of the matching graph into self.g one at a time, stopping the search when the
+        generator is closed
+
+        :return: A generator of (vertices_substitution_dict, edges_substitution_dict, match_info) tuples
+        """
+        return self.match.iterate_variables_substitution_dictionaries(self.g, self.matching_graph)
+
+    def bind(self, vertices_substitution_dict, edges_substitution_dict, match_info):
+        """
+        Binds the builder to one of the matches returned by match_all(). The following operations
+        use these substitutions instead of searching the graph again.
+
+        :param vertices_substitution_dict: The substitutions of the vertices names
+        :param edges_substitution_dict: The substitutions of the edges names
+        :param match_info: The information on how the match went
+        :return: None
+        """
+        self.vertices_substitution_dict = vertices_substitution_dict
+        self.edges_substitution_dict = edges_substitution_dict
+        self.match_info = match_info
+        self.update = False
+
     def where(self, code_string):
         """
         It sets the LISP code to execute upon matching graphs
@@ -66,7 +178,8 @@ class GraphBuilder:
         :param code_string: The code to execute
         :return: None
         """
-        self.matching_code_container.add_line(code_string)
+        with self.profile.phase('compile'):
+            self.matching_code_container.add_line(code_string)
 
     def delete_list(self, variables):
         """
@@ -77,8 +190,25 @@ class GraphBuilder:
         """
         variables = set(self.__substitute_names_in_list(variables))
         self.update = False
-        self.g.delete_vertices(self.g.vs.select(name_in=variables))
-        self.g.delete_edges(self.g.es.select(name_in=variables))
+        with self.profile.phase('write'):
+            self.__delete_names(variables)
+
+    def delete_all(self, variables, matches):
+        """
+        Deletes the vertices and edges of a list of variables for all the matches, with one call to delete_edges()
+        and one to delete_vertices()
+
+        :param variables: the names of the variables to delete
+        :param matches: A list of (vertices_substitution_dict, edges_substitution_dict, match_info) tuples,
+                        as returned by match_all()
+        :return: None
+        """
+        names = set()
+        for match in matches:
+            self.bind(*match)
+            names.update(self.__substitute_names_in_list(variables))
+        with self.profile.phase('write'):
+            self.__delete_names(names)
 
     def build(self):
         """
@@ -105,19 +235,14 @@ class GraphBuilder:
         attributes = {}
         for i, variable in enumerate(variables):
             placeholder_name = variable_placeholders[i]
-            try:
-                vertices = self.g.vs.select(name=variable)
-                attributes[placeholder_name] = vertices[0].attributes()
-            except:
-                pass
+            vertex_index = self.name_index.get_vertex_index(variable)
+            if vertex_index is not None:
+                attributes[placeholder_name] = self.g.vs[vertex_index].attributes()
         for i, variable in enumerate(variables):
             placeholder_name = variable_placeholders[i]
-            try:
-                edges = self.g.es.select(name=variable)
-                edge_attr = edges[0].attributes()
-                attributes[placeholder_name] = edge_attr
-            except:
-                pass
+            edge_index = self.name_index.get_edge_index(variable)
+            if edge_index is not None:
+                attributes[placeholder_name] = self.g.es[edge_index].attributes()
         for i, variable in enumerate(variables):
             placeholder_name = variable_placeholders[i]
             try:
@@ -128,20 +253,160 @@ class GraphBuilder:
 
     # Private
 
-    def __apply_code_to_graph(self, code_string, graph):
+    def __apply_code_to_graph(self, code_string, graph, names_to_variables_dict={}, name_index=None,
+                              ignore_errors=True):
         code_container = CodeContainer()
-        code_container.add_line(code_string)
-        code_container.add_graph_to_namespace(graph)
-        code_container.execute()
-        code_container.substitute_namespace_into_graph(graph)
+        with self.profile.phase('compile'):
+            code_container.add_line(code_string)
+        code_container.add_parameters_to_namespace(self.parameters)
+        with self.profile.phase('namespace'):
+            if graph is self.g:
+                items = self.__get_items_in_code(code_container)
+                code_container.add_items_to_namespace(items)
+                if self.undo_log:
+                    self.undo_log.change_attributes(items)
+            else:
+                code_container.add_items_to_namespace(list(graph.vs) + list(graph.es))
+        with self.profile.phase('write'):
+            code_container.execute(names_to_variables_dict, ignore_errors=ignore_errors)
+            code_container.substitute_namespace_into_graph(graph, name_index)
+        if graph is self.g:
+            self.__update_attribute_indexes(code_container.changed_vertices, code_container.changed_edges)
+            self.__update_component_index(code_container.changed_vertices, code_container.changed_edges,
+                                          'name' in code_container.changed_attributes)
+            if self.match_cache:
+                self.match_cache.update_attributes(code_container.changed_attributes)
+            self.profile.count('vertices_written', len(code_container.changed_vertices))
         return graph
 
-    def __substitute_names_in_code(self, code):
-        for k, v in self.vertices_substitution_dict.items():
-            code = code.replace(' ' + k + ' ', ' ' + v + ' ')
-        for k, v in self.edges_substitution_dict.items():
-            code = code.replace(' ' + k + ' ', ' ' + v + ' ')
-        return code
+    def __add_items(self, vertices, edges):
+        new_vertices = {}
+        for attributes in vertices:
+            name = attributes['name']
+            if name not in new_vertices and self.name_index.get_vertex_index(name) is None:
+                new_vertices[name] = attributes
+        first_new_index = self.g.vcount()
+        new_indices = {name: first_new_index + i for i, name in enumerate(new_vertices)}
+        new_edge_tuples = []
+        new_edges = []
+        for source, target, attributes in edges:
+            new_edge_tuples.append((self.__get_vertex_index(source, new_indices),
+                                    self.__get_vertex_index(target, new_indices)))
+            attributes = dict(attributes)
+            if 'name' not in attributes:
+                attributes['name'] = get_random_name()
+            new_edges.append(attributes)
+        first_new_edge_index = self.g.ecount()
+        if self.undo_log and (new_vertices or new_edges):
+            self.undo_log.add_items(first_new_index, first_new_edge_index)
+        if new_vertices:
+            self.g.add_vertices(len(new_vertices))
+            set_attributes(self.g.vs[first_new_index:], list(new_vertices.values()))
+        if new_edges:
+            self.g.add_edges(new_edge_tuples)
+            set_attributes(self.g.es[first_new_edge_index:], new_edges)
+        self.name_index.add_vertices(first_new_index)
+        self.name_index.add_edges(first_new_edge_index)
+        for attribute_index in self.attribute_indexes.values():
+            attribute_index.add_vertices(first_new_index)
+            attribute_index.add_edges(first_new_edge_index)
+        if self.component_index:
+            self.component_index.add_vertices(first_new_index)
+            self.component_index.add_edges(first_new_edge_index)
+        if self.match_cache and (new_vertices or new_edges):
+            self.match_cache.clear()
+        self.profile.count('vertices_written', len(new_vertices))
+        return self
+
+    def __delete_names(self, variables):
+        vertex_indices = [index for name in variables for index in self.name_index.get_vertex_indices(name)]
+        edge_indices = [index for name in variables for index in self.name_index.get_edge_indices(name)]
+        edge_names = list(variables)
+        if self.attribute_indexes:
+            edge_names += [self.g.es[index]['name'] for vertex_index in vertex_indices
+                           for index in self.g.incident(vertex_index, mode=ALL)]
+        vertex_names = []
+        if self.component_index:
+            vertex_names = [self.g.vs[index]['name'] for index in vertex_indices] \
+                           + [self.g.vs[index]['name'] for edge_index in edge_indices
+                              for index in self.g.es[edge_index].tuple]
+        if self.undo_log:
+            self.undo_log.delete_items(vertex_indices, edge_indices)
+        self.g.delete_edges(edge_indices)
+        self.g.delete_vertices(vertex_indices)
+        self.name_index.invalidate()
+        self.__update_attribute_indexes(variables, edge_names)
+        if self.component_index:
+            self.component_index.split_components(vertex_names)
+        if self.match_cache:
+            self.match_cache.clear()
+        self.profile.count('vertices_written', len(vertex_indices))
+
+    def __write_changes(self, vertex_changes, edge_changes):
+        if self.undo_log:
+            self.undo_log.change_attributes([sequence[index] for sequence, changes in [(self.g.vs, vertex_changes),
+                                                                                       (self.g.es, edge_changes)]
+                                             for index in set([index for values in changes.values()
+                                                               for index in values])])
+        changed_vertices = set()
+        changed_edges = set()
+        for sequence, changes, changed_names in [(self.g.vs, vertex_changes, changed_vertices),
+                                                 (self.g.es, edge_changes, changed_edges)]:
+            for key, values in changes.items():
+                column = sequence[key] if key in sequence.attribute_names() else [None] * len(sequence)
+                changed_names.update([column[index] for index in values] if key == 'name' else [])
+                for index, value in values.items():
+                    column[index] = value
+                sequence[key] = column
+            indices = set([index for values in changes.values() for index in values])
+            changed_names.update([sequence[index]['name'] for index in indices])
+        if 'name' in vertex_changes or 'name' in edge_changes:
+            self.name_index.invalidate()
+        self.__update_attribute_indexes(changed_vertices, changed_edges)
+        self.__update_component_index(changed_vertices, changed_edges, 'name' in vertex_changes)
+        if self.match_cache:
+            self.match_cache.update_attributes(set(vertex_changes) | set(edge_changes))
+        self.profile.count('vertices_written', len(set([index for values in vertex_changes.values()
+                                                        for index in values])))
+
+    def __get_items_in_code(self, code_container):
+        """
+        :return: The vertices and edges of self.g that are named by the symbols of the code, either through
+                 the variables of the match or by their own names
+        """
+        items = []
+        for symbol in code_container.get_symbols():
+            name = self.vertices_substitution_dict.get(symbol, self.edges_substitution_dict.get(symbol, symbol))
+            items += [self.g.vs[index] for index in self.name_index.get_vertex_indices(name)]
+            items += [self.g.es[index] for index in self.name_index.get_edge_indices(name)]
+        return items
+
+    def __get_vertex_index(self, name, new_indices):
+        index = new_indices.get(name)
+        if index is None:
+            index = self.name_index.get_vertex_index(name)
+            if index is None:
+                raise ValueError('The vertex ' + str(name) + ' is not in the graph')
+        return index
+
+    def __update_attribute_indexes(self, vertex_names, edge_names):
+        for attribute_index in self.attribute_indexes.values():
+            attribute_index.update_vertices(vertex_names)
+            attribute_index.update_edges(edge_names)
+
+    def __update_component_index(self, vertex_names, edge_names, names_have_changed):
+        if not self.component_index:
+            return
+        if names_have_changed:
+            self.component_index.invalidate()
+            return
+        self.component_index.update_vertices(vertex_names)
+        self.component_index.update_edges(edge_names)
+
+    def __get_names_to_variables_dict(self):
+        names_to_variables_dict = {v: k for k, v in self.vertices_substitution_dict.items()}
+        names_to_variables_dict.update({v: k for k, v in self.edges_substitution_dict.items()})
+        return names_to_variables_dict
 
     def __substitute_names_in_graph(self, g):
         if self.update:
@@ -180,24 +445,3 @@ class GraphBuilder:
                 pass
             return_list.append(name)
         return return_list
-
-    def __merge_graphs(self, lhs, rhs):
-        for v in rhs.vs:
-            lhs.add_vertex(**v.attributes())
-        for e in rhs.es:
-            lhs.add_edge(rhs.vs[e.tuple[0]]['name'],
-                         rhs.vs[e.tuple[1]]['name'],
-                         **e.attributes())
-        mapping = []
-        name_to_index_dict = {}
-        mapped_index = 0
-        for v in lhs.vs:
-            name = v['name']
-            try:
-                mapping.append(name_to_index_dict[name])
-            except:
-                name_to_index_dict[name] = mapped_index
-                mapping.append(mapped_index)
-                mapped_index += 1
-        lhs.contract_vertices(mapping=mapping, combine_attrs='first')
-        return lhs
@@ -1,38 +1,105 @@
-from .aux import create_graph_from_string, convert_graph_to_string
+import itertools
+import re
+import threading
+from contextlib import contextmanager
+
+from .attribute_index import AttributeIndex
+from .aux import convert_graph_to_string, create_graph_from_string, fill_graph, get_random_name
+from .cache import LRUCache
 from .node_matcher import StringNodeMatcher
 from .graph_builder import GraphBuilder
+from .graph_version import GraphVersion
+from .match_cache import MatchCache
 from .match import MatchException
+from .name_index import NameIndex
 from .code_container import CodeContainerFactory
+from .component_index import ComponentIndex
+from .query_plan import QueryPlan
+from .query_profile import DummyQueryProfile, QueryProfile
+from .read_write_lock import ReadWriteLock
+from .undo_log import UndoLog
 
-
-def convert_special_characters_to_spaces(line):
-    line = line.replace('\t', ' ')
-    line = line.replace('\n', ' ')
-    return line
+_keyword_regex = re.compile(r'^\s*(PROFILE|EXPLAIN)\s')
 
 
 class GraphDatabase:
-    def __init__(self, g, node_matcher=StringNodeMatcher(), code_container_factory=CodeContainerFactory()):
+    def __init__(self, g, node_matcher=None, code_container_factory=None,
+                 single_pass=False, plan_cache_size=128, storage=None, snapshot_isolation=False,
+                 parallel_search=None, profile_hook=None, component_attributes=None):
         """
         This class interprets the commands translates them into operations on a graph by calling GraphBuilder().
         It accepts a graph as an argument and performs operations onto it.
 
+        The database can be queried by many threads. The queries that only read the graph (MATCH, WHERE, RETURN)
+        run at the same time, while the ones that modify it (CREATE, DELETE, SET, CREATE INDEX) run one at a time
+        and only when no other query is running.
+        Each query that modifies the graph is applied as a whole or not at all: if it raises an error, the graph
+        is brought back to the version before the query and the error is raised again.
+        The number of committed queries is in self.version.
+
         :param g: The graph to perform operations onto
-        :param node_matcher: The class that decides if two nodes match
-        :param code_container_factory: the class that creates the object that executes the LISP code
+        :param node_matcher: The class that decides if two nodes match. If None a new StringNodeMatcher is used
+        :param code_container_factory: the class that creates the object that executes the LISP code.
+                                       If None a new CodeContainerFactory is used
+        :param single_pass: If True, the queries that modify the graph (CREATE, DELETE, SET) look for the matches
+                            only once and then apply the operations to each match in turn.
+                            Queries that only read the graph (MATCH, WHERE, RETURN) are always run this way.
+        :param plan_cache_size: The number of parsed queries that are kept in memory, to be reused when the
+                                same query string is sent again
+        :param storage: A Storage that keeps the graph on disk. If the storage already contains a graph, it is
+                        loaded into g (that must be empty, and directed only if the stored graph is).
+                        Every change to the graph is then written to the storage
+        :param snapshot_isolation: If True, the queries that only read the graph use a copy of the last committed
+                                   version, so that they do not wait for the queries that modify it (and vice versa).
+                                   The copy is made when the graph is first read or modified after a commit, and it
+                                   is freed when the queries that use it are over.
+                                   Each query that modifies the graph therefore copies the whole graph and its
+                                   indices, which costs O(|V| + |E|) time and memory however small the change is
+        :param parallel_search: A ParallelSearch that splits the search of the matches of MATCH among many
+                                processes. If None, each query is matched in the thread that runs it
+        :param profile_hook: A function that is called with the report of each query run by query() and
+                             query_many(), as returned by PROFILE. If None, only the queries that start with
+                             PROFILE are profiled
+        :param component_attributes: If not None, the database keeps an index of the weakly connected components
+                                     of the graph, with the values of these attributes in each component
+                                     (e.g. ['tag', 'relation']). A connected graph in MATCH is then searched only
+                                     in the components that are big enough and that have all its values
+                                     of these attributes
         """
         self.g = g
-        self.node_matcher = node_matcher
-        self.action_list = ['MATCH ', 'CREATE ', 'DELETE ', 'RETURN', 'SET ', 'WHERE ']
+        self.name_index = NameIndex(g)
+        self.attribute_indexes = {}
+        self.component_index = None
+        if component_attributes is not None:
+            self.component_index = ComponentIndex(g, self.name_index, component_attributes)
+        self.node_matcher = node_matcher or StringNodeMatcher()
+        self.action_list = ['MATCH ', 'CREATE ', 'DELETE ', 'RETURN', 'SET ', 'WHERE ', 'SKIP ', 'LIMIT ']
         self.action_dict = {'MATCH': self.__match,
                             'CREATE': self.__create,
+                            'CREATE INDEX': self.__create_index,
                             'DELETE': self.__delete,
                             'SET': self.__set,
                             'WHERE': self.__where,
                             }
-        self.code_container_factory = code_container_factory
+        self.code_container_factory = code_container_factory or CodeContainerFactory()
+        self.single_pass = single_pass
+        self.read_only_actions = ['MATCH', 'WHERE', 'RETURN', '']
+        self.plan_cache = LRUCache(plan_cache_size)
+        self.storage = storage
+        self._is_recovering = False
+        self.snapshot_isolation = snapshot_isolation
+        self.version = 0
+        self._lock = ReadWriteLock()
+        self._version_lock = threading.Lock()
+        self._committed_version = None
+        self._transaction = None
+        self._undo_log = None
+        self.parallel_search = parallel_search
+        self.profile_hook = profile_hook
+        if storage:
+            self.__recover()
 
-    def query(self, string, repeat_n_times=None):
+    def query(self, string, repeat_n_times=None, parameters=None):
         """
         This method performs the operations onto self.g
 
@@ -43,35 +110,499 @@ class GraphDatabase:
                          MATCH {}(_a), {'relation': 'LIVES_AT'}(_a,_b), {}(_b)
                            WHERE (= (get _a "text") "joseph")
                          RETURN _a,_b;
+                       A line can end with SKIP k and/or LIMIT n: the matches of its MATCH command after the
+                       first k are used, at most n of them, and the search stops as soon as k + n matches are found.
+                       The return list then has one row for each of these matches.
+                       DELETE ALL and SET ALL change the graph for all the matches of the MATCH in their line at once:
+                       the graph is searched only once, DELETE ALL removes the vertices and edges of all the matches
+                       together and SET ALL runs its code on each match and then writes the changed attributes.
+                       The code of SET ALL reads the graph as it was before the command; if two matches change
+                       the same attribute, the last match wins.
+                       It can also be a plan returned by self.prepare()
+                       If the query starts with PROFILE, the time of each phase of the query is measured and the
+                       operations done to search the graph are counted.
+                       If the query starts with EXPLAIN, the query is not executed and the way it would be executed
+                       is returned instead
         :param repeat_n_times: The maximum number of times the graph is queried. It sets the maximum length of
                                the return list. If None then the value is set by the function
-                               self.__determine_how_many_times_to_repeat_query(string)
+                               self.__determine_how_many_times_to_repeat_query(plan)
+        :param parameters: A dict with the values of the parameters ($name) used in the query
 
         :return: If the RETURN command is called with a list of variables names, a list of JSON with
                  the corresponding properties is returned. If the RETURN command is used alone, a list with the entire
-                 graph is returned. Otherwise it returns an empty list
+                 graph is returned. Otherwise it returns an empty list.
+                 A query that starts with PROFILE returns a dict with this list ('results') and the report
+                 of the QueryProfile ('profile'). A query that starts with EXPLAIN returns a dict with the
+                 commands of each line and how they would be executed ('plan')
+        """
+        keyword, string = self.__split_keyword(string)
+        if keyword == 'EXPLAIN':
+            return {'plan': self.__explain(self.prepare(string))}
+        profile = self.__create_profile(keyword == 'PROFILE')
+        with profile.phase('parse'):
+            plan = self.prepare(string)
+        with self.__open_version(plan) as version:
+            results = self.__query_plan(version, plan, repeat_n_times, parameters, profile=profile)
+        if keyword == 'PROFILE':
+            return {'results': results, 'profile': self.__report(profile, plan, parameters)}
+        self.__report(profile, plan, parameters)
+        return results
+
+    def query_many(self, strings, parameters_list=None):
+        """
+        Performs many queries, one after the other, with the same results as calling query() for each of them.
+        The queries that start with the same MATCH and WHERE commands (and the same values of their parameters)
+        share the matches found by the first of them. The matches are searched again only after a change
+        to the graph that can modify them: a CREATE or DELETE, or a SET that changes the attributes in the MATCH
+        graph (any attribute if there are WHERE commands).
+        The matches are shared by the queries that look for all of them at once: the queries that only read
+        the graph, and the ones that modify it when the database is created with single_pass=True.
+
+        The queries are applied as a whole: if one of them raises an error, the graph goes back to how it was
+        before the first one and the error is raised again.
+
+        :param strings: A list of queries, as in query()
+        :param parameters_list: A list with a dict of parameters for each query, or None if there are no parameters
+        :return: A list with the result of each query
+        """
+        profiles = [self.__create_profile() for _ in strings]
+        plans = []
+        for string, profile in zip(strings, profiles):
+            with profile.phase('parse'):
+                plans.append(self.prepare(string))
+        parameters_list = parameters_list or [None] * len(plans)
+        match_cache = MatchCache()
+        with self.__open_version(*plans) as version:
+            results = [self.__query_plan(version, plan, None, parameters, match_cache, profile)
+                       for plan, parameters, profile in zip(plans, parameters_list, profiles)]
+        for plan, parameters, profile in zip(plans, parameters_list, profiles):
+            self.__report(profile, plan, parameters)
+        return results
+
+    def prepare(self, string):
+        """
+        Parses a query, so that it can be executed many times by self.query() without being parsed again.
+        The last parsed queries are also kept in memory and reused when query() is called with the same string.
+
+        :param string: The query to parse. The values that change from one execution to the next can be
+                       written as named parameters, for example
+                         MATCH {'tag': 'PERSON', 'text': $name}(a) RETURN a
+        :return: The parsed query (a QueryPlan)
+        """
+        if isinstance(string, QueryPlan):
+            return string
+        if self.__split_keyword(string)[0]:
+            raise ValueError('PROFILE and EXPLAIN can only be used with query()')
+        plan = self.plan_cache.get(string)
+        if not plan:
+            plan = QueryPlan(string, self.action_list)
+            self.plan_cache.put(string, plan)
+        return plan
+
+    def create_index(self, attribute):
+        """
+        Creates an index on the values of an attribute of the vertices and edges. The index is kept up to date by
+        CREATE, SET and DELETE, and it is used by MATCH to find the candidates for the vertices and edges of the
+        matching graph with a value for that attribute.
+        The same is done by the command
+            CREATE INDEX ON attribute
+
+        :param attribute: The name of the attribute to index
+        :return: None
+        """
+        with self.__writing():
+            if attribute in self.attribute_indexes:
+                return
+            self.__log({'create_index': attribute})
+            self.__add_index(attribute)
+
+    def indexes(self):
+        """
+        :return: A dict with the name of each indexed attribute as key and the size of its index as value
+        """
+        with self.__reading() as version:
+            return {attribute: attribute_index.get_size()
+                    for attribute, attribute_index in version.attribute_indexes.items()}
+
+    def components(self):
+        """
+        :return: A dict with the number of weakly connected components and the number of vertices in the biggest one,
+                 None if the database has been created without component_attributes
+        """
+        with self.__reading() as version:
+            if not version.component_index:
+                return None
+            return version.component_index.get_size()
+
+    def bulk_load(self, vertices=(), edges=(), graph_strings=()):
+        """
+        Adds many vertices and edges to the graph at once. This is much faster than a CREATE for each of them,
+        because the graph is not merged again after each addition.
+        As with CREATE, a vertex with the name of a vertex that is already in the graph is not added.
+
+        :param vertices: An iterable of dicts with the properties of the vertices, including their 'name'. E.g.
+                           [{'name': 'v1', 'tag': 'PERSON'}, {'name': 'v2', 'tag': 'PLACE'}]
+        :param edges: An iterable of (source name, target name, properties dict) triples. E.g.
+                        [('v1', 'v2', {'relation': 'LIVES_AT'})]
+                      The source and target must be in the graph or among the vertices to add
+        :param graph_strings: An iterable of graphs written as in CREATE. E.g.
+                                ["{'tag': 'PERSON'}(v1), {'relation': 'LIVES_AT'}(v1,v2), {'tag': 'PLACE'}(v2)"]
+        :return: None
+        """
+        graphs = [create_graph_from_string(graph_string) for graph_string in graph_strings]
+        vertices = itertools.chain(vertices, [vertex.attributes() for graph in graphs for vertex in graph.vs])
+        edges = itertools.chain(edges, [(graph.vs[edge.source]['name'], graph.vs[edge.target]['name'],
+                                         edge.attributes()) for graph in graphs for edge in graph.es])
+        if self.__is_logging():
+            vertices = list(vertices)
+            edges = [(source, target, attributes if 'name' in attributes else dict(attributes, name=get_random_name()))
+                     for source, target, attributes in edges]
+        with self.__writing() as version:
+            self.__log({'bulk_load': (vertices, edges)})
+            self.__create_builder(version, match_index=0).add_items(vertices, edges)
+
+    def iter_query(self, string, parameters=None):
+        """
+        This method performs the same operations as query(), but it yields the results of RETURN while the
+        graph is being searched, one row for each match. The search stops as soon as the generator is closed,
+        therefore taking only the first rows is cheaper than building the whole list.
+        The lines that modify the graph (CREATE, DELETE, SET) are executed in full before their rows are yielded.
+        The database is locked until the generator is exhausted or closed: other threads can read the graph in the
+        meantime only if the query does not modify it, and they can modify it only after the generator is closed.
+
+        :param string: The list of operations to perform, as in query()
+        :param parameters: A dict with the values of the parameters ($name) used in the query
+        :return: A generator of the JSON with the properties returned by each match
         """
+        plan = self.prepare(string)
+        code_parameters = plan.get_code_parameters(parameters)
+        with self.__open_version(plan) as version:
+            repeat_n_times = self.__determine_how_many_times_to_repeat_query(plan, version)
+            for index, line in enumerate(plan.lines):
+                actions = [action for action, _ in line]
+                is_read_only = all([action in self.read_only_actions for action in actions])
+                if is_read_only and actions.count('MATCH') <= 1:
+                    rows = self.__iterate_in_single_pass(version, plan.bind(line, parameters), code_parameters,
+                                                         *plan.get_skip_and_limit(line, parameters))
+                else:
+                    edge_names = []
+                    rows = self.__query_n_times(version, plan, line, repeat_n_times, parameters, code_parameters,
+                                                created_edge_names=edge_names)
+                    self.__log_line(plan, index, repeat_n_times, parameters, edge_names)
+                for row in rows:
+                    if row:
+                        yield row
+
+    def get_graph(self):
+        """
+        :return: The graph of the database. It must not be modified directly while other threads query the database
+        """
+        return self.g
+
+    def snapshot(self):
+        """
+        Writes the whole graph to the storage and empties its log, so that the next start is faster
+
+        :return: None
+        """
+        if not self.storage:
+            raise ValueError('The database has no storage')
+        with self._lock.writing():
+            self.__write_snapshot()
+
+    def close(self):
+        """
+        Makes sure that all the changes are written to the storage and closes it.
+        The processes of the parallel search are stopped.
+
+        :return: None
+        """
+        if self.storage:
+            with self._lock.writing():
+                self.storage.close()
+        if self.parallel_search:
+            self.parallel_search.close()
+
+    # Private
+
+    def __query_plan(self, version, plan, repeat_n_times, parameters, match_cache=None, profile=None):
+        code_parameters = plan.get_code_parameters(parameters)
         if not repeat_n_times:
-            repeat_n_times = self.__determine_how_many_times_to_repeat_query(string)
-        lines = self.__get_command_lines(string)
+            repeat_n_times = self.__determine_how_many_times_to_repeat_query(plan, version)
         return_list = []
-        for line in lines:
-            lst = self.__query_n_times(line, repeat_n_times)
+        for index, line in enumerate(plan.lines):
+            edge_names = []
+            lst = self.__query_n_times(version, plan, line, repeat_n_times, parameters, code_parameters,
+                                       match_cache, profile, created_edge_names=edge_names)
+            self.__log_line(plan, index, repeat_n_times, parameters, edge_names)
             if lst and lst[0]:
                 return_list = lst
         return return_list
 
-    def get_graph(self):
-        return self.g
+    def __split_keyword(self, string):
+        """
+        :return: The keyword at the start of the query (PROFILE or EXPLAIN, None if there is none) and the query
+                 without the keyword
+        """
+        if isinstance(string, QueryPlan):
+            return None, string
+        match = _keyword_regex.match(string)
+        if not match:
+            return None, string
+        return match.group(1), string[match.end():]
 
-    # Private
+    def __create_profile(self, is_profiled=False):
+        if is_profiled or self.profile_hook:
+            return QueryProfile()
+        return DummyQueryProfile()
+
+    def __report(self, profile, plan, parameters):
+        """
+        Sends the report of a query to the profile hook
+
+        :return: The report of the profile, with the query and its parameters. None if the query is not profiled
+        """
+        if not isinstance(profile, QueryProfile):
+            return None
+        report = dict(profile.get_report(), query=plan.query_string, parameters=parameters)
+        if self.profile_hook:
+            self.profile_hook(report)
+        return report
 
-    def __query_n_times(self, line, n):
+    def __explain(self, plan):
+        """
+        Describes how a query would be executed on the current graph, without executing it
+
+        :param plan: The QueryPlan of the query
+        :return: A dict with the number of times each line is repeated ('repeat_n_times') and a list with
+                 the commands and the way of executing each line ('lines')
+        """
+        with self.__reading() as version:
+            repeat_n_times = self.__determine_how_many_times_to_repeat_query(plan, version)
+            number_of_vertices = version.g.vcount()
+            indexed_attributes = set(version.attribute_indexes)
+        if not self.__uses_exact_match():
+            indexed_attributes = set()
+        lines = []
+        for line in plan.lines:
+            actions = [action for action, _ in line]
+            uses_single_pass = self.__uses_single_pass(line)
+            execution = 'single pass' if uses_single_pass else 'one search for each repetition'
+            if self.__is_set_oriented(line):
+                uses_single_pass = True
+                execution = 'set oriented'
+            match_graphs = [argument for action, argument in line if action == 'MATCH']
+            lines.append({'commands': [{'command': action, 'argument': text} for action, text in plan.get_texts(line)],
+                          'read_only': all([action in self.read_only_actions for action in actions]),
+                          'execution': execution,
+                          'max_searches': (1 if uses_single_pass else repeat_n_times) if match_graphs else 0,
+                          'indexed_attributes': sorted(set([attribute for graph in match_graphs
+                                                            for sequence in [graph.vs, graph.es]
+                                                            for item in sequence
+                                                            for attribute, value in item.attributes().items()
+                                                            if value and attribute in indexed_attributes])),
+                          'parallel_search': bool(match_graphs and uses_single_pass and self.parallel_search
+                                                  and number_of_vertices >= self.parallel_search.min_vertices)})
+        return {'query': plan.query_string, 'parameters': sorted(plan.parameters), 'repeat_n_times': repeat_n_times,
+                'vertices': number_of_vertices, 'lines': lines}
+
+    def __uses_exact_match(self):
+        try:
+            return self.node_matcher.uses_exact_match()
+        except AttributeError:
+            return False
+
+    def __open_version(self, *plans):
+        if self.__get_actions(*plans) <= set(self.read_only_actions):
+            return self.__reading()
+        return self.__writing()
+
+    def __get_actions(self, *plans):
+        return set([action for plan in plans for line in plan.lines for action, _ in line])
+
+    @contextmanager
+    def __reading(self):
+        if self.snapshot_isolation:
+            yield self.__get_committed_version()
+            return
+        with self._lock.reading():
+            yield self.__get_head()
+
+    @contextmanager
+    def __writing(self):
+        with self._lock.writing():
+            rollback = self.__begin()
+            try:
+                yield self.__get_head()
+            except GeneratorExit:
+                self.__commit()
+                raise
+            except:
+                rollback()
+                raise
+            self.__commit()
+
+    def __begin(self):
+        """
+        Prepares the rollback of the queries that modify the graph. The builders record in self._undo_log how to
+        undo each change before making it, therefore the cost of a query does not depend on the size of the graph.
+
+        :return: The function that rolls back the changes
+        """
+        if self.__is_logging():
+            self._transaction = self.storage.sequence + 1
+        if self.snapshot_isolation:
+            self.__get_committed_version()
+        self._undo_log = UndoLog(self.g)
+        indexed_attributes = list(self.attribute_indexes)
+        return lambda: self.__rollback(indexed_attributes)
+
+    def __commit(self):
+        self._undo_log = None
+        with self._version_lock:
+            self._committed_version = None
+            self.version += 1
+        self.__write_snapshot_if_needed()
+
+    def __rollback(self, indexed_attributes):
+        self._undo_log.rollback()
+        self._undo_log = None
+        self.name_index.invalidate()
+        self.__invalidate_component_index()
+        self.attribute_indexes.clear()
+        for attribute in indexed_attributes:
+            self.__add_index(attribute)
+        self.__log({'rollback': self._transaction})
+
+    def __get_head(self):
+        return GraphVersion(self.g, self.name_index, self.attribute_indexes, self.version, self.component_index)
+
+    def __get_committed_version(self):
+        with self._version_lock:
+            if self._committed_version is None:
+                self._committed_version = self.__get_head().copy()
+            return self._committed_version
+
+    def __create_builder(self, version, match_index, code_parameters=None, match_cache=None, profile=None,
+                         max_matches=None):
+        return GraphBuilder(version.g, self.node_matcher, self.code_container_factory, match_index=match_index,
+                            parameters=code_parameters, name_index=version.name_index,
+                            attribute_indexes=version.attribute_indexes, parallel_search=self.parallel_search,
+                            match_cache=match_cache, profile=profile, max_matches=max_matches,
+                            component_index=version.component_index, undo_log=self._undo_log)
+
+    def __recover(self):
+        snapshot, records = self.storage.load()
+        rolled_back_transactions = set([record['rollback'] for record in records if 'rollback' in record])
+        self._is_recovering = True
+        try:
+            if snapshot:
+                self.__load_snapshot(snapshot)
+            for record in records:
+                if record.get('transaction') not in rolled_back_transactions:
+                    self.__replay(record)
+        finally:
+            self._is_recovering = False
+        self.__write_snapshot_if_needed()
+
+    def __load_snapshot(self, snapshot):
+        if self.g.vcount():
+            raise ValueError('The graph must be empty to be loaded from the storage')
+        if snapshot['directed'] != self.g.is_directed():
+            raise ValueError('The graph in the storage is ' + ('directed' if snapshot['directed'] else 'undirected')
+                             + ', it cannot be loaded into a graph that is not')
+        fill_graph(self.g, snapshot['vertex_count'], snapshot['vertex_attributes'], snapshot['edges'].tolist(),
+                   snapshot['edge_attributes'])
+        self.name_index.invalidate()
+        self.__invalidate_component_index()
+        for attribute in snapshot['indexed_attributes']:
+            self.__add_index(attribute)
+
+    def __replay(self, record):
+        if 'create_index' in record:
+            self.__add_index(record['create_index'])
+        if 'bulk_load' in record:
+            self.__create_builder(self.__get_head(), match_index=0).add_items(*record['bulk_load'])
+        if 'query' in record:
+            plan = QueryPlan(record['query'], self.action_list)
+            parameters = record['parameters']
+            self.__query_n_times(self.__get_head(), plan, plan.lines[record['line']], record['repeat_n_times'],
+                                 parameters, plan.get_code_parameters(parameters),
+                                 edge_names=iter(record['edge_names']) if 'edge_names' in record else None)
+
+    def __is_logging(self):
+        return self.storage is not None and not self._is_recovering
+
+    def __log(self, record):
+        if self.__is_logging():
+            self.storage.append(dict(record, transaction=self._transaction))
+
+    def __log_line(self, plan, index, repeat_n_times, parameters, edge_names):
+        if all([action in self.read_only_actions for action, _ in plan.lines[index]]):
+            return
+        self.__log({'query': plan.query_string, 'parameters': parameters, 'line': index,
+                    'repeat_n_times': repeat_n_times, 'edge_names': edge_names})
+
+    def __write_snapshot_if_needed(self):
+        if self.__is_logging() and self.storage.needs_snapshot():
+            self.__write_snapshot()
+
+    def __write_snapshot(self):
+        self.storage.write_snapshot(self.g, self.attribute_indexes.keys())
+
+    def __invalidate_component_index(self):
+        if self.component_index:
+            self.component_index.invalidate()
+
+    def __add_index(self, attribute):
+        if attribute not in self.attribute_indexes:
+            self.attribute_indexes[attribute] = AttributeIndex(self.g, self.name_index, attribute)
+
+    def __query_n_times(self, version, plan, line, n, parameters, code_parameters, match_cache=None, profile=None,
+                        edge_names=None, created_edge_names=None):
+        """
+        Executes a line of the plan once for each repetition, or once for all its matches
+
+        :param edge_names: An iterator with the names of the edges to create, as they were logged when the line
+                           was executed before. If None the edges without a name in the query get new names
+        :param created_edge_names: If not None, the names of the edges of CREATE are appended to this list
+        :return: The list of the results of each execution of the line
+        """
+        profile = profile or DummyQueryProfile()
+
+        def bind():
+            with profile.phase('bind'):
+                action_graph_pairs = plan.bind(line, parameters, edge_names)
+            if created_edge_names is not None:
+                created_edge_names.extend(plan.get_created_edge_names(action_graph_pairs))
+            return action_graph_pairs
+
+        is_read_only = all([action in self.read_only_actions for action, _ in line])
+        skip, limit = plan.get_skip_and_limit(line, parameters)
+        if self.__is_set_oriented(line):
+            action_graph_pairs = bind()
+            return self.__query_all_matches(version, action_graph_pairs, code_parameters, match_cache, profile,
+                                            skip, limit)
+        if self.__uses_single_pass(line):
+            match_key = None
+            if match_cache:
+                match_key = plan.get_match_key(line, parameters)
+            action_graph_pairs = bind()
+            return self.__query_in_single_pass(version, action_graph_pairs, n, is_read_only,
+                                               code_parameters, match_cache, match_key, profile, skip, limit, bind)
+        is_paged = skip or limit is not None
+        indices = range(n)
+        if is_paged:
+            indices = range(skip, n if limit is None else skip + limit)
         rows = []
-        for i in range(n):
+        for i in indices:
             try:
-                builder = GraphBuilder(self.g, self.node_matcher, self.code_container_factory, match_index=i)
-                results = self.__query_with_builder(line, builder)
+                builder = self.__create_builder(version, match_index=i, code_parameters=code_parameters,
+                                                match_cache=match_cache, profile=profile,
+                                                max_matches=i + 1 if is_paged else None)
+                action_graph_pairs = bind()
+                profile.count('iterations')
+                results = self.__query_with_builder(action_graph_pairs, builder)
                 rows.append(results)
                 if not results:
                     break
@@ -79,79 +610,203 @@ class GraphDatabase:
                 break
         return rows
 
-    def __query_with_builder(self, string, builder):
+    def __is_set_oriented(self, line):
+        """
+        :param line: One of the lines of a QueryPlan
+        :return: True if the line writes to all its matches at once, with SET ALL or DELETE ALL
+        """
+        return any([action in ['SET ALL', 'DELETE ALL'] for action, _ in line])
+
+    def __uses_single_pass(self, line):
+        """
+        :param line: One of the lines of a QueryPlan
+        :return: True if the matches of the line are searched only once, False if the line is matched again
+                 for each repetition
+        """
+        actions = [action for action, _ in line]
+        is_read_only = all([action in self.read_only_actions for action in actions])
+        return actions.count('MATCH') <= 1 and (is_read_only or self.single_pass)
+
+    def __query_in_single_pass(self, version, action_graph_pairs, n, is_read_only, code_parameters,
+                               match_cache=None, match_key=None, profile=None, skip=0, limit=None, bind_line=None):
         """
-        Uses the builder in the argument to modify the graph, according to the commands in the string
+        Looks for all the matches at once and then applies the commands that follow the match to each of them.
+        If the matches of the same MATCH and WHERE commands are in the match cache, the graph is not searched.
 
-        :param string: The single query to the database
+        :param version: The GraphVersion to query
+        :param action_graph_pairs: The command/argument pairs of the query
+        :param n: The maximum number of matches to use
+        :param is_read_only: If True the rows are repeated as in the query that matches once for each index,
+                             unless the line has SKIP or LIMIT
+        :param code_parameters: The parameters of the query, as they are named in the LISP code
+        :param match_cache: The MatchCache shared by the queries of query_many()
+        :param match_key: The key of the MATCH and WHERE commands in the match cache
+        :param profile: The QueryProfile of the query
+        :param skip: The number of matches to skip
+        :param limit: The maximum number of matches to use after the skipped ones. If None, at most n matches
+                      are used when there is no SKIP, all of them otherwise
+        :param bind_line: A function that binds the line again. The graphs of CREATE are modified by each match,
+                          therefore they are bound again for each match after the first one
+        :return: The list of the results of the RETURN operation
+        """
+        is_paged = skip or limit is not None
+        max_matches = None if limit is None else skip + limit
+        if n <= 0 or max_matches == 0:
+            return []
+        match_position = self.__get_position_after_match(action_graph_pairs)
+        builder = self.__create_builder(version, match_index=0, code_parameters=code_parameters,
+                                        match_cache=match_cache, profile=profile, max_matches=max_matches)
+        rows = []
+        self.__query_with_builder(action_graph_pairs[:match_position], builder)
+        matches = self.__get_all_matches(builder, match_cache, match_key)
+        matches = matches[skip:max_matches] if is_paged else matches[:n]
+        if not matches:
+            return rows
+        commands = action_graph_pairs[match_position:]
+        creates = bind_line and 'CREATE' in [action for action, _ in commands]
+        for index, (vertices_substitution_dict, edges_substitution_dict, match_info) in enumerate(matches):
+            if index and creates:
+                commands = bind_line()[match_position:]
+            builder.bind(vertices_substitution_dict, edges_substitution_dict, match_info)
+            builder.profile.count('iterations')
+            results = self.__query_with_builder(commands, builder)
+            rows.append(results)
+            if not results and is_read_only:
+                return rows
+        if is_read_only and not is_paged:
+            rows = [rows[i % len(rows)] for i in range(n)]
+        return rows
+
+    def __query_all_matches(self, version, action_graph_pairs, code_parameters, match_cache=None, profile=None,
+                            skip=0, limit=None):
+        """
+        Looks for all the matches at once, then applies each SET ALL and DELETE ALL to all of them with
+        a single write, and finally builds a row of RETURN for each match.
+        The code of SET ALL reads the graph as it was before the command, whatever the order of the matches.
+
+        :param version: The GraphVersion to query
+        :param action_graph_pairs: The command/argument pairs of the query
+        :param code_parameters: The parameters of the query, as they are named in the LISP code
+        :param match_cache: The MatchCache shared by the queries of query_many(). The changes to the graph
+                            remove from it the matches that they can modify
+        :param profile: The QueryProfile of the query
+        :param skip: The number of matches to skip
+        :param limit: The maximum number of matches to use after the skipped ones. If None all of them are used
+        :return: The list of the results of the RETURN operation
+        """
+        max_matches = None if limit is None else skip + limit
+        if max_matches == 0:
+            return []
+        match_position = self.__get_position_after_match(action_graph_pairs)
+        builder = self.__create_builder(version, match_index=0, code_parameters=code_parameters,
+                                        match_cache=match_cache, profile=profile, max_matches=max_matches)
+        self.__query_with_builder(action_graph_pairs[:match_position], builder)
+        matches = self.__get_all_matches(builder, None, None)[skip:max_matches]
+        if not matches:
+            return []
+        builder.profile.count('iterations')
+        for action, argument in action_graph_pairs[match_position:]:
+            if action == 'SET ALL':
+                builder.set_all(argument, matches)
+            if action == 'DELETE ALL':
+                builder.delete_all(argument, matches)
+            if action in ['RETURN', '']:
+                rows = []
+                for match in matches:
+                    builder.bind(*match)
+                    rows.append(self.__return(argument, builder))
+                return rows
+        return [{}]
+
+    def __get_all_matches(self, builder, match_cache, match_key):
+        matches = None
+        if match_key:
+            matches = match_cache.get(match_key, builder.matching_graph)
+        if matches is not None:
+            builder.profile.count('match_cache_hits')
+            return matches
+        try:
+            matches = builder.match_all()
+        except MatchException:
+            matches = []
+        if match_key and builder.match.max_matches is None:
+            match_cache.put(match_key, builder.matching_graph, matches, self.__has_code(builder))
+        return matches
+
+    def __has_code(self, builder):
+        try:
+            return builder.matching_code_container.has_code()
+        except AttributeError:
+            return True
+
+    def __iterate_in_single_pass(self, version, action_graph_pairs, code_parameters, skip=0, limit=None):
+        match_position = self.__get_position_after_match(action_graph_pairs)
+        builder = self.__create_builder(version, match_index=0, code_parameters=code_parameters)
+        self.__query_with_builder(action_graph_pairs[:match_position], builder)
+        matches = builder.iterate_matches()
+        if skip or limit is not None:
+            matches = itertools.islice(matches, skip, None if limit is None else skip + limit)
+        for vertices_substitution_dict, edges_substitution_dict, match_info in matches:
+            builder.bind(vertices_substitution_dict, edges_substitution_dict, match_info)
+            results = self.__query_with_builder(action_graph_pairs[match_position:], builder)
+            if not results:
+                return
+            yield results
+
+    def __get_position_after_match(self, action_graph_pairs):
+        actions = [action for action, _ in action_graph_pairs]
+        if 'MATCH' not in actions:
+            return 0
+        position = actions.index('MATCH') + 1
+        while position < len(actions) and actions[position] == 'WHERE':
+            position += 1
+        return position
+
+    def __query_with_builder(self, action_graph_pairs, builder):
+        """
+        Uses the builder in the argument to modify the graph, according to the commands in the query
+
+        :param action_graph_pairs: The command/argument pairs of the single query to the database
         :return: The result of the RETURN operation
         """
-        action_graph_pairs = self.__get_action_graph_pairs_from_query(string)
-        for action, graph_str in action_graph_pairs:
+        for action, argument in action_graph_pairs:
             if action == 'RETURN' or action == '':
-                return self.__return(graph_str, builder)
+                return self.__return(argument, builder)
             try:
-                self.action_dict[action](graph_str, builder)
+                self.action_dict[action](argument, builder)
             except MatchException:
                 break
         return {}
 
-    def __get_action_graph_pairs_from_query(self, query):
-        """
-        Splits the query into command/argument pairs, for example [("MATCH","{}(_a))", ("RETURN","_a")]
-
-        :param query: The string with the list of commands
-        :return: the command/argument pairs
-        """
-        import re
-
-        query = convert_special_characters_to_spaces(query)
-        graph_list = re.split('|'.join(self.action_list), query)
-        query_list_positions = [query.find(graph) for graph in graph_list]
-        query_list_positions = query_list_positions
-        query_list_positions = query_list_positions
-        action_list = [query[query_list_positions[i] + len(graph_list[i]):query_list_positions[i + 1]].strip()
-                       for i in range(len(graph_list) - 1)]
-        graph_list = graph_list[1:]
-        return zip(action_list, graph_list)
-
-    def __match(self, graph_str, builder):
-        graph = create_graph_from_string(graph_str)
+    def __match(self, graph, builder):
         builder.match_graph(graph)
 
-    def __create(self, graph_str, builder):
-        graph = create_graph_from_string(graph_str)
+    def __create(self, graph, builder):
         builder.add_graph(graph)
 
-    def __delete(self, graph_str, builder):
-        variables = [v for v in graph_str.strip().replace(' ', '').split(',') if v]
+    def __create_index(self, attributes, builder):
+        for attribute in attributes:
+            self.__add_index(attribute)
+
+    def __delete(self, variables, builder):
         builder.delete_list(variables)
 
-    def __return(self, graph_str, builder):
-        variables = [v for v in graph_str.strip().replace(' ', '').split(',') if v]
-        if not variables:
-            return {'GRAPH': convert_graph_to_string(builder.build())}
-        return builder.build_variables(variables)
+    def __return(self, variables, builder):
+        with builder.profile.phase('return'):
+            if not variables:
+                return {'GRAPH': convert_graph_to_string(builder.build())}
+            return builder.build_variables(variables)
 
-    def __set(self, graph_str, builder):
-        builder.set(graph_str)
+    def __set(self, code_string, builder):
+        builder.set(code_string)
         return True
 
-    def __where(self, graph_str, builder):
-        builder.where(graph_str)
+    def __where(self, code_string, builder):
+        builder.where(code_string)
         return True
 
-    def __get_command_lines(self, string):
-        lines = []
-        for line in string.split('\n'):
-            if not line.strip() or line.strip()[0] == '#':
-                continue
-            lines.append(line)
-        lines = '\n'.join(lines).split(';')
-        return lines
-
-    def __determine_how_many_times_to_repeat_query(self, query_string):
-        repeat_n_times = len(self.g.vs)
-        if query_string.find('CREATE') != -1:
+    def __determine_how_many_times_to_repeat_query(self, plan, version):
+        repeat_n_times = len(version.g.vs)
+        if plan.has_create:
             repeat_n_times = 1
         return repeat_n_times
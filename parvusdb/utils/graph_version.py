@@ -0,0 +1,32 @@
+class GraphVersion:
+    def __init__(self, g, name_index, attribute_indexes, number, component_index=None):
+        """
+        A graph with its indices, as it was after a number of changes had been committed to the database.
+
+        :param g: The graph
+        :param name_index: The NameIndex of g
+        :param attribute_indexes: A dict with the AttributeIndex of g for each indexed attribute
+        :param number: The number of changes committed before this version
+        :param component_index: The ComponentIndex of g, None if the components are not indexed
+        """
+        self.g = g
+        self.name_index = name_index
+        self.attribute_indexes = attribute_indexes
+        self.number = number
+        self.component_index = component_index
+
+    def copy(self):
+        """
+        Copies the graph and its indices. The copy does not change when this version is modified,
+        therefore it can be read while the graph of this version is being changed.
+
+        :return: A GraphVersion with a copy of the graph
+        """
+        g = self.g.copy()
+        name_index = self.name_index.copy(g)
+        attribute_indexes = {attribute: attribute_index.copy(g, name_index)
+                             for attribute, attribute_index in self.attribute_indexes.items()}
+        component_index = None
+        if self.component_index:
+            component_index = self.component_index.copy(g, name_index)
+        return GraphVersion(g, name_index, attribute_indexes, self.number, component_index)
@@ -0,0 +1,104 @@
+from collections.abc import Mapping
+
+from .name_index import NameIndex
+
+_not_found = object()
+
+
+class AttributeView(Mapping):
+    def __init__(self, item):
+        """
+        A read-only dict with the attributes of a vertex or an edge. The attributes are read from the graph
+        when they are asked for, therefore nothing is copied and the values are always up to date.
+
+        :param item: The vertex or edge
+        """
+        self._item = item
+
+    def __getitem__(self, key):
+        return self._item[key]
+
+    def __iter__(self):
+        return iter(self._item.attribute_names())
+
+    def __len__(self):
+        return len(self._item.attribute_names())
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+class LazyNamespace(dict):
+    def __init__(self, items=(), parent=None, aliases=None):
+        """
+        The namespace of the LISP code. Besides the names that are set as in a dict, it can contain the vertices
+        and edges of some graphs: a vertex or an edge is looked up only when the code uses its name,
+        and then it is an AttributeView of its attributes. Adding a graph therefore does not depend on its size.
+
+        :param items: The names and values to set
+        :param parent: Another LazyNamespace. The names that are not in this namespace are looked up in the parent
+        :param aliases: A dict from names of this namespace to the names they stand for in the parent
+        """
+        super().__init__(items)
+        self._parent = parent
+        self._aliases = aliases or {}
+        self._graphs = []
+        self._found_names = set()
+
+    def add_graph(self, graph, name_index=None):
+        """
+        Adds the vertices and edges of a graph, each one with its name. As when adding the attributes one by one,
+        an edge hides a vertex with the same name and the items of the last graph hide the ones of the others.
+        The items already looked up are looked up again, so that a graph can be added again after it has changed.
+
+        :param graph: The graph to add
+        :param name_index: The NameIndex of the graph. If None, a new one is built the first time a name is used
+        :return: None
+        """
+        for name in self._found_names:
+            self.pop(name, None)
+        self._found_names = set()
+        self._graphs = [(other_graph, other_name_index) for other_graph, other_name_index in self._graphs
+                        if other_graph is not graph]
+        self._graphs.append((graph, name_index or NameIndex(graph)))
+
+    def create_child(self, aliases=None):
+        """
+        :param aliases: A dict from new names to the names they stand for in this namespace
+        :return: A new namespace where the code can set names without changing this one
+        """
+        if not aliases and not self._graphs and self._parent is None:
+            return LazyNamespace(self)
+        return LazyNamespace(parent=self, aliases=aliases)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or self.__find(key) is not _not_found
+
+    def __missing__(self, key):
+        value = self.__find(key)
+        if value is _not_found:
+            raise KeyError(key)
+        return value
+
+    # Private
+
+    def __find(self, key):
+        if key in self._aliases:
+            return self._parent.get(self._aliases[key], _not_found)
+        for graph, name_index in reversed(self._graphs):
+            edge_indices = name_index.get_edge_indices(key)
+            vertex_indices = name_index.get_vertex_indices(key)
+            if edge_indices or vertex_indices:
+                item = graph.es[edge_indices[-1]] if edge_indices else graph.vs[vertex_indices[-1]]
+                self[key] = AttributeView(item)
+                self._found_names.add(key)
+                return self[key]
+        if self._parent is not None:
+            return self._parent.get(key, _not_found)
+        return _not_found
@@ -1,4 +1,12 @@
 import functools
+import queue
+import threading
+
+from igraph import ALL, OUT, WEAK
+
+from .compatibility_matrix import CompatibilityMatrix
+from .lazy_namespace import AttributeView
+from .query_profile import DummyQueryProfile
 
 
 class MatchException(Exception):
@@ -7,10 +15,39 @@ class MatchException(Exception):
 
 
 class Match:
-    def __init__(self, matching_code_container, node_matcher, match_index=0):
+    def __init__(self, matching_code_container, node_matcher, match_index=0, attribute_indexes=None,
+                 name_index=None, parallel_search=None, profile=None, max_matches=None, component_index=None):
+        """
+        This class looks for the sub-isomorphisms of a graph into another one
+
+        :param matching_code_container: The code that decides if two vertices or edges match
+        :param node_matcher: The class that decides if the properties of two vertices or edges match
+        :param match_index: The index of the match returned by get_variables_substitution_dictionaries()
+        :param attribute_indexes: A dict with the AttributeIndex for each indexed attribute of the bigger graph
+        :param name_index: The NameIndex of the bigger graph, needed to use the attribute indexes
+        :param parallel_search: A ParallelSearch that looks for all the matches using many processes.
+                                If None, the search runs in the calling process
+        :param profile: A QueryProfile that measures the time of the search and counts the calls to the callbacks
+        :param max_matches: The search stops as soon as this number of matches is found. If None all the matches
+                            are found. If the search stops with fewer matches than match_index + 1, there is no
+                            match with that index (instead of starting again from the first match)
+        :param component_index: The ComponentIndex of the bigger graph. A connected graph is then searched only
+                                in the components where it can match
+        """
         self.matching_code_container = matching_code_container
         self.node_matcher = node_matcher
         self._match_index = match_index
+        self.attribute_indexes = attribute_indexes or {}
+        self.name_index = name_index
+        self.parallel_search = parallel_search
+        self.profile = profile or DummyQueryProfile()
+        self.max_matches = max_matches
+        self.component_index = component_index
+        self._on_match = self.__append_match
+        self._vertex_matrix = None
+        self._edge_matrix = None
+        self._code_for_each_pair = True
+        self._code_for_each_match = None
 
     def get_variables_substitution_dictionaries(self, lhs_graph, rhs_graph):
         """
@@ -22,49 +59,291 @@ class Match:
         """
         if not rhs_graph:
             return {}, {}, {}
-        self.matching_code_container.add_graph_to_namespace(lhs_graph)
-        self.matching_code_container.add_graph_to_namespace(rhs_graph)
-        return self.__collect_variables_that_match_graph(lhs_graph, rhs_graph)
+        self.__add_graphs_to_namespace(lhs_graph, rhs_graph)
+        with self.profile.phase('match'):
+            return self.__collect_variables_that_match_graph(lhs_graph, rhs_graph)
+
+    def get_all_variables_substitution_dictionaries(self, lhs_graph, rhs_graph):
+        """
+        Looks for all the sub-isomorphisms of rhs into lhs, running the search only once
+
+        :param lhs_graph: The graph to look sub-isomorphisms into (the bigger graph)
+        :param rhs_graph: The smaller graph
+        :return: A list with a (vertices_substitution_dict, edges_substitution_dict, match_info) tuple for each match
+        """
+        if not rhs_graph:
+            return [({}, {}, {})]
+        self.__add_graphs_to_namespace(lhs_graph, rhs_graph)
+        with self.profile.phase('match'):
+            self.__search_for_matches(lhs_graph, rhs_graph)
+        return [(vertices_substitution_dict, edges_substitution_dict, {'__RESULT__': True})
+                for vertices_substitution_dict, edges_substitution_dict
+                in zip(self._vertices_substitution_list, self._edges_substitution_list)]
+
+    def iterate_variables_substitution_dictionaries(self, lhs_graph, rhs_graph):
+        """
+        Looks for the sub-isomorphisms of rhs into lhs and yields them while the search is still running.
+        The search runs in a separate thread that waits for the next match to be requested,
+        and it is stopped as soon as the generator is closed. The graphs must not be modified in the meantime.
+
+        :param lhs_graph: The graph to look sub-isomorphisms into (the bigger graph)
+        :param rhs_graph: The smaller graph
+        :return: A generator of (vertices_substitution_dict, edges_substitution_dict, match_info) tuples
+        """
+        if not rhs_graph:
+            yield {}, {}, {}
+            return
+        self.__add_graphs_to_namespace(lhs_graph, rhs_graph)
+        with self.profile.phase('match'):
+            lhs_graph = self.__get_graph_to_search(lhs_graph, rhs_graph)
+        if lhs_graph is None:
+            return
+        matches = queue.Queue(maxsize=1)
+        resume = threading.Semaphore(0)
+        stop = threading.Event()
+
+        def on_match(vertices_substitution_dict, edges_substitution_dict):
+            self.profile.count('matches_found')
+            matches.put((vertices_substitution_dict, edges_substitution_dict))
+            resume.acquire()
+            return not stop.is_set()
+
+        def search():
+            try:
+                self._on_match = on_match
+                self.__run_vf2(lhs_graph, rhs_graph)
+                matches.put(None)
+            except Exception as e:
+                matches.put(e)
+
+        thread = threading.Thread(target=search, daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = matches.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                vertices_substitution_dict, edges_substitution_dict = item
+                yield vertices_substitution_dict, edges_substitution_dict, {'__RESULT__': True}
+                resume.release()
+        finally:
+            stop.set()
+            resume.release()
+            thread.join()
+            self._on_match = self.__append_match
+
+    def __add_graphs_to_namespace(self, lhs_graph, rhs_graph):
+        name_index = None
+        if self.name_index and self.name_index.g is lhs_graph:
+            name_index = self.name_index
+        with self.profile.phase('namespace'):
+            self.matching_code_container.add_graph_to_namespace(lhs_graph, name_index)
+            self.matching_code_container.add_graph_to_namespace(rhs_graph)
 
     def __collect_variables_that_match_graph(self, lhs_graph, rhs_graph):
         match_info = {}
+        self.__search_for_matches(lhs_graph, rhs_graph)
+        match_info['__RESULT__'] = self._is_match
+
+        max_return_length = len(self._vertices_substitution_list)
+        if self.max_matches is not None and max_return_length <= self._match_index:
+            raise MatchException()
+
+        return self._vertices_substitution_list[self._match_index%max_return_length], \
+               self._edges_substitution_list[self._match_index%max_return_length], \
+               match_info
+
+    def __search_for_matches(self, lhs_graph, rhs_graph):
         self._vertices_substitution_list = []
         self._edges_substitution_list = []
         self._is_match = False
-        lhs_graph.subisomorphic_vf2(other=rhs_graph,
-                                    node_compat_fn=self.__node_compare,
-                                    edge_compat_fn=self.__edge_compare,
-                                    callback=self.__callback)
+        lhs_graph = self.__get_graph_to_search(lhs_graph, rhs_graph)
+        if lhs_graph is None:
+            raise MatchException()
+        self.__run_vf2(lhs_graph, rhs_graph, can_split=True)
         if not self._is_match:
             raise MatchException()
 
-        match_info['__RESULT__'] = self._is_match
+    def __run_vf2(self, lhs_graph, rhs_graph, can_split=False):
+        """
+        Runs the search of igraph. The properties of the vertices and edges are compared all at once in
+        the compatibility matrices, and they are encoded as colours so that most of the candidates are discarded
+        without calling python. The callbacks are only used when the colours are not enough to decide if
+        two vertices or edges match, and then they look up the matrices.
 
-        max_return_length = len(self._vertices_substitution_list)
+        The conditions of the code that use only one variable are checked on each candidate vertex or edge when
+        building the matrices. The other conditions are checked once for each match.
 
-        return self._vertices_substitution_list[self._match_index%max_return_length], \
-               self._edges_substitution_list[self._match_index%max_return_length], \
-               match_info
+        If can_split is True and the colours and matrices are enough to decide if two items match (there is no
+        code to run on each pair), the search can be split among the processes of self.parallel_search.
+        The matches found by the processes are then passed to the callback in the order of the chunks.
+        The search is not split when it stops after self.max_matches, because the serial search can stop earlier.
+        """
+        arguments = {'other': rhs_graph, 'callback': self.__callback}
+        self.profile.count('vertices_searched', lhs_graph.vcount())
+        with self.profile.phase('compile'):
+            vertex_filters, edge_filters, self._code_for_each_match = self.__split_code(rhs_graph)
+        self._code_for_each_pair = self.__has_code() and self._code_for_each_match is None
+        self._vertex_matrix = self.__get_compatibility_matrix(lhs_graph.vs, rhs_graph.vs, vertex_filters)
+        is_exact = False
+        if self._vertex_matrix is not None:
+            arguments['color1'], arguments['color2'], is_exact = self._vertex_matrix.get_colors()
+        if not is_exact or self._code_for_each_pair:
+            arguments['node_compat_fn'] = self.__node_compare
+        self._edge_matrix = self.__get_compatibility_matrix(lhs_graph.es, rhs_graph.es, edge_filters)
+        is_exact = False
+        if self._edge_matrix is not None:
+            arguments['edge_color1'], arguments['edge_color2'], is_exact = self._edge_matrix.get_colors()
+        if not is_exact or self._code_for_each_pair:
+            arguments['edge_compat_fn'] = self.__edge_compare
+        if can_split and self.parallel_search and not self._code_for_each_pair and self.max_matches is None:
+            mappings = self.parallel_search.search(lhs_graph, rhs_graph, arguments,
+                                                   self._vertex_matrix, self._edge_matrix)
+            if mappings is not None:
+                for mapping in mappings:
+                    if not self.__callback(lhs_graph, rhs_graph, None, mapping):
+                        break
+                return
+        lhs_graph.subisomorphic_vf2(**arguments)
 
-    def __substitute_names_in_list(self, lst, substitution_dict):
-        for i, v in enumerate(lst):
-            name = lst[i]
-            try:
-                new_name = substitution_dict[name]
-                lst[i] = new_name
-                continue
-            except:
-                pass
-        return lst
+    def __split_code(self, rhs_graph):
+        """
+        :return: The filters for the vertices and for the edges of rhs, and the list of CodeContainers to execute
+                 on each match. The list is None if the code cannot be split
+        """
+        if not self.__has_code() or not self.__uses_column_match():
+            return {}, {}, None
+        vertex_names = [vertex['name'] for vertex in rhs_graph.vs]
+        edge_names = [edge['name'] for edge in rhs_graph.es]
+        try:
+            single_variable_containers, other_containers \
+                = self.matching_code_container.split_conditions(vertex_names + edge_names)
+        except AttributeError:
+            return {}, {}, None
+        vertex_filters = {index: self.__create_filter(single_variable_containers[name], name)
+                          for index, name in enumerate(vertex_names) if name in single_variable_containers}
+        edge_filters = {index: self.__create_filter(single_variable_containers[name], name)
+                        for index, name in enumerate(edge_names) if name in single_variable_containers}
+        return vertex_filters, edge_filters, other_containers
+
+    def __create_filter(self, code_containers, variable):
+        return lambda item: self.__is_accepted_by_code(code_containers, {variable: AttributeView(item)})
+
+    def __get_compatibility_matrix(self, lhs_sequence, rhs_sequence, filters):
+        if not self.__uses_column_match():
+            return None
+        return CompatibilityMatrix(lhs_sequence, rhs_sequence, self.node_matcher, filters)
+
+    def __uses_column_match(self):
+        try:
+            return self.node_matcher.uses_column_match()
+        except AttributeError:
+            return False
+
+    def __has_code(self):
+        try:
+            return self.matching_code_container.has_code()
+        except AttributeError:
+            return True
+
+    def __get_graph_to_search(self, lhs_graph, rhs_graph):
+        """
+        Uses the attribute indexes to find the vertices of lhs that can match the most selective vertex of rhs.
+        If rhs is connected, a match can only contain the vertices that are close enough to these candidates,
+        and that are in the components of lhs where rhs can match.
+
+        :return: The graph to search (lhs_graph or one of its subgraphs), None if there cannot be any match
+        """
+        vertices = self.__get_vertices_near_candidates(lhs_graph, rhs_graph)
+        if vertices is not None and not vertices:
+            return None
+        if self.component_index and self.component_index.g is lhs_graph and rhs_graph.vcount() \
+                and rhs_graph.is_connected(mode=WEAK):
+            component_vertices = self.component_index.get_vertex_indices(rhs_graph, self.__uses_exact_match())
+            if component_vertices is not None:
+                vertices = set(component_vertices) if vertices is None else vertices & set(component_vertices)
+                if not vertices:
+                    return None
+        if vertices is None or len(vertices) == lhs_graph.vcount():
+            return lhs_graph
+        return lhs_graph.induced_subgraph(sorted(vertices))
+
+    def __get_vertices_near_candidates(self, lhs_graph, rhs_graph):
+        """
+        :return: The set of the indices of the vertices of lhs close enough to the candidates found with
+                 the attribute indexes. None if the indexes cannot be used or rhs is not connected
+        """
+        if not self.attribute_indexes or not self.name_index or not self.__uses_exact_match():
+            return None
+        candidates_dict = self.__get_candidates_from_indexes(lhs_graph, rhs_graph)
+        if not candidates_dict:
+            return None
+        anchor, candidate_names = min(candidates_dict.items(), key=lambda item: len(item[1]))
+        if not candidate_names:
+            return set()
+        if not rhs_graph.is_connected(mode=WEAK):
+            return None
+        candidate_indices = [self.name_index.get_vertex_index(name) for name in candidate_names]
+        radius = int(rhs_graph.eccentricity(anchor, mode=ALL))
+        vertices = set()
+        for neighborhood in lhs_graph.neighborhood(candidate_indices, order=radius, mode=ALL):
+            vertices.update(neighborhood)
+        return vertices
+
+    def __get_candidates_from_indexes(self, lhs_graph, rhs_graph):
+        candidates_dict = {}
+        for vertex in rhs_graph.vs:
+            for attribute, value in self.__get_indexed_properties(vertex):
+                names = self.attribute_indexes[attribute].get_vertex_names(value)
+                if names is not None:
+                    self.__add_candidates(candidates_dict, vertex.index, names)
+        for edge in rhs_graph.es:
+            for attribute, value in self.__get_indexed_properties(edge):
+                edge_names = self.attribute_indexes[attribute].get_edge_names(value)
+                if edge_names is None:
+                    continue
+                edge_indices = [self.name_index.get_edge_index(name) for name in edge_names]
+                names = set([lhs_graph.vs[lhs_graph.es[index].source]['name'] for index in edge_indices])
+                self.__add_candidates(candidates_dict, edge.source, names)
+        return candidates_dict
+
+    def __add_candidates(self, candidates_dict, rhs_index, names):
+        if rhs_index in candidates_dict:
+            candidates_dict[rhs_index] = candidates_dict[rhs_index] & names
+        else:
+            candidates_dict[rhs_index] = set(names)
+
+    def __get_indexed_properties(self, item):
+        return [(k, v) for k, v in item.attributes().items()
+                if v and k != 'name' and k in self.attribute_indexes]
+
+    def __uses_exact_match(self):
+        try:
+            return self.node_matcher.uses_exact_match()
+        except AttributeError:
+            return False
 
     @functools.lru_cache(10)
     def __node_compare(self, lhs_graph, rhs_graph,
                        lhs_graph_index, rhs_graph_index):
+        self.profile.count('vertex_compat_calls')
+        if self._vertex_matrix is not None:
+            if not self._vertex_matrix.is_compatible(lhs_graph_index, rhs_graph_index):
+                return False
+            if not self._code_for_each_pair:
+                return True
+            self.profile.count('where_evaluations')
+            return self.matching_code_container.execute({lhs_graph.vs[lhs_graph_index]['name']:
+                                                             rhs_graph.vs[rhs_graph_index]['name']})
         lhs_attr = lhs_graph.vs[lhs_graph_index].attributes()
         rhs_attr = rhs_graph.vs[rhs_graph_index].attributes()
         lhs_name = lhs_attr.pop('name')
         rhs_name = rhs_attr.pop('name')
 
+        if self.__has_code():
+            self.profile.count('where_evaluations')
         if not self.matching_code_container.execute({lhs_name: rhs_name}):
             return False
         rhs_attr = {k: v for k, v in rhs_attr.items() if v}
@@ -75,11 +354,22 @@ class Match:
     @functools.lru_cache(10)
     def __edge_compare(self, lhs_graph, rhs_graph,
                        lhs_graph_index, rhs_graph_index):
+        self.profile.count('edge_compat_calls')
+        if self._edge_matrix is not None:
+            if not self._edge_matrix.is_compatible(lhs_graph_index, rhs_graph_index):
+                return False
+            if not self._code_for_each_pair:
+                return True
+            self.profile.count('where_evaluations')
+            return self.matching_code_container.execute({lhs_graph.es[lhs_graph_index]['name']:
+                                                             rhs_graph.es[rhs_graph_index]['name']})
         lhs_attr = lhs_graph.es[lhs_graph_index].attributes()
         rhs_attr = rhs_graph.es[rhs_graph_index].attributes()
         lhs_name = lhs_attr.pop('name')
         rhs_name = rhs_attr.pop('name')
 
+        if self.__has_code():
+            self.profile.count('where_evaluations')
         if not self.matching_code_container.execute({lhs_name: rhs_name}):
             return False
         rhs_attr = {k: v for k, v in rhs_attr.items() if v}
@@ -88,32 +378,40 @@ class Match:
         return False
 
     def __callback(self, lhs_graph, rhs_graph, map12, map21):
-        vertices_substitution_dict = {}
-        edges_substitution_dict = {}
-
-        if all([item == -1 for item in map12]):
+        self.profile.count('vf2_callbacks')
+        if all([item == -1 for item in map21]):
             return False
 
-        for lhs, rhs in enumerate(map12):
-            if rhs == -1:
-                continue
-            lhs_name = lhs_graph.vs[lhs]['name']
-            rhs_name = rhs_graph.vs[rhs]['name']
-            vertices_substitution_dict[rhs_name] = lhs_name
+        vertex_pairs = [(rhs_graph.vs[rhs], lhs_graph.vs[lhs]) for rhs, lhs in enumerate(map21) if lhs != -1]
+        edge_pairs = []
         for rhs_edge in rhs_graph.es:
-            source_target_list = self.__substitute_names_in_list([rhs_graph.vs[rhs_edge.tuple[0]]['name'],
-                                                                  rhs_graph.vs[rhs_edge.tuple[1]]['name']],
-                                                                 vertices_substitution_dict)
-            source_index = lhs_graph.vs.select(name=source_target_list[0])[0].index
-            target_index = lhs_graph.vs.select(name=source_target_list[1])[0].index
-            lhs_edges = lhs_graph.es.select(_source=source_index, _target=target_index)
-            for lhs_edge in lhs_edges:
-                lhs_name = lhs_edge['name']
-                rhs_name = rhs_edge['name']
-                edges_substitution_dict[rhs_name] = lhs_name
+            source_index = map21[rhs_edge.tuple[0]]
+            target_index = map21[rhs_edge.tuple[1]]
+            for edge_index in lhs_graph.incident(source_index, mode=OUT):
+                lhs_edge = lhs_graph.es[edge_index]
+                if lhs_edge.tuple != (source_index, target_index):
+                    continue
+                edge_pairs.append((rhs_edge, lhs_edge))
+        if self._code_for_each_match \
+                and not self.__is_accepted_by_code(self._code_for_each_match,
+                                                   {rhs['name']: AttributeView(lhs)
+                                                    for rhs, lhs in vertex_pairs + edge_pairs}):
+            return True
+
+        vertices_substitution_dict = {rhs['name']: lhs['name'] for rhs, lhs in vertex_pairs}
+        edges_substitution_dict = {rhs['name']: lhs['name'] for rhs, lhs in edge_pairs}
+        return self._on_match(vertices_substitution_dict, edges_substitution_dict)
 
+    def __is_accepted_by_code(self, code_containers, bindings):
+        for code_container in code_containers:
+            self.profile.count('where_evaluations')
+            if not code_container.evaluate(bindings):
+                return False
+        return True
+
+    def __append_match(self, vertices_substitution_dict, edges_substitution_dict):
         self._is_match = True
+        self.profile.count('matches_found')
         self._vertices_substitution_list.append(vertices_substitution_dict)
         self._edges_substitution_list.append(edges_substitution_dict)
-
-        return True
+        return self.max_matches is None or len(self._vertices_substitution_list) < self.max_matches
@@ -0,0 +1,65 @@
+class MatchCache:
+    def __init__(self):
+        """
+        This class keeps the matches found for the MATCH and WHERE commands of a list of queries, so that the
+        queries that start with the same commands do not search the graph again.
+        The matches are forgotten when the graph changes in a way that could change them: adding or deleting
+        vertices and edges forgets all of them, while changing the attributes of the graph only forgets the
+        matches of the graphs with those attributes (or with a WHERE condition, which can read any attribute).
+        """
+        self._entries = {}
+
+    def get(self, key, matching_graph):
+        """
+        :param key: The key of the MATCH and WHERE commands, returned by QueryPlan.get_match_key()
+        :param matching_graph: The graph of the MATCH command. It has the same vertices and edges as the one
+                               used to find the matches, though the edges without a name can have other names
+        :return: The list of the matches, as returned by GraphBuilder.match_all(), None if it is not in the cache
+        """
+        entry = self._entries.get(key)
+        if not entry:
+            return None
+        matches, edge_names, _ = entry
+        new_edge_names = dict(zip(edge_names, matching_graph.es['name'] if matching_graph.ecount() else []))
+        return [(vertices_substitution_dict,
+                 {new_edge_names.get(name, name): value for name, value in edges_substitution_dict.items()},
+                 match_info)
+                for vertices_substitution_dict, edges_substitution_dict, match_info in matches]
+
+    def put(self, key, matching_graph, matches, has_code):
+        """
+        :param key: The key of the MATCH and WHERE commands
+        :param matching_graph: The graph of the MATCH command
+        :param matches: The list of the matches found (empty if there is no match)
+        :param has_code: True if the commands have a WHERE condition
+        :return: None
+        """
+        attributes = None
+        if not has_code:
+            attributes = set([attribute for sequence in [matching_graph.vs, matching_graph.es] for item in sequence
+                              for attribute, value in item.attributes().items() if value and attribute != 'name'])
+        edge_names = matching_graph.es['name'] if matching_graph.ecount() else []
+        self._entries[key] = matches, edge_names, attributes
+
+    def update_attributes(self, attributes):
+        """
+        Forgets the matches that can be changed by new values of some attributes
+
+        :param attributes: The names of the attributes that have changed
+        :return: None
+        """
+        if not attributes:
+            return
+        if 'name' in attributes:
+            self.clear()
+            return
+        self._entries = {key: entry for key, entry in self._entries.items()
+                         if entry[2] is not None and not entry[2] & set(attributes)}
+
+    def clear(self):
+        """
+        Forgets all the matches
+
+        :return: None
+        """
+        self._entries = {}
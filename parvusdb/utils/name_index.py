@@ -0,0 +1,153 @@
+import threading
+
+
+class NameIndex:
+    def __init__(self, g):
+        """
+        This class keeps a dictionary from the names of the vertices and edges of g to their indices.
+        The dictionaries are built when needed, and built again after the graph has been modified in a way
+        that changes the indices (new or deleted vertices and edges) or the names.
+        The dictionaries can be built by many threads that read the graph at the same time.
+
+        :param g: The graph to index
+        """
+        self.g = g
+        self._vertices = None
+        self._edges = None
+        self._vertex_count = 0
+        self._edge_count = 0
+        self._is_shared = False
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        """
+        Tells the index that the indices or the names in the graph have changed
+
+        :return: None
+        """
+        self._vertices = None
+        self._edges = None
+
+    def add_vertices(self, first_index):
+        """
+        Tells the index that the vertices from first_index to the end of the graph have been added,
+        so that they can be indexed without building the index again
+
+        :param first_index: The index of the first new vertex
+        :return: None
+        """
+        if self._vertices is None or first_index != self._vertex_count:
+            self.invalidate()
+            return
+        self.__unshare()
+        self.__add_to_dict(self._vertices, self.g.vs, first_index)
+        self._vertex_count = self.g.vcount()
+
+    def add_edges(self, first_index):
+        """
+        Tells the index that the edges from first_index to the end of the graph have been added,
+        so that they can be indexed without building the index again
+
+        :param first_index: The index of the first new edge
+        :return: None
+        """
+        if self._edges is None or first_index != self._edge_count:
+            self.invalidate()
+            return
+        self.__unshare()
+        self.__add_to_dict(self._edges, self.g.es, first_index)
+        self._edge_count = self.g.ecount()
+
+    def copy(self, g):
+        """
+        Creates the index of a copy of self.g without building it again.
+        The dictionaries are shared by the two indices until one of them is modified.
+
+        :param g: A copy of self.g
+        :return: The NameIndex of g
+        """
+        name_index = NameIndex(g)
+        self.__update()
+        name_index._vertices, name_index._edges = self._vertices, self._edges
+        name_index._vertex_count, name_index._edge_count = self._vertex_count, self._edge_count
+        name_index._is_shared = self._is_shared = True
+        return name_index
+
+    def get_vertex_indices(self, name):
+        """
+        :param name: The name of the vertex
+        :return: The list of indices of the vertices with this name (empty if there is none)
+        """
+        self.__update()
+        return self._vertices.get(name, [])
+
+    def get_edge_indices(self, name):
+        """
+        :param name: The name of the edge
+        :return: The list of indices of the edges with this name (empty if there is none)
+        """
+        self.__update()
+        return self._edges.get(name, [])
+
+    def get_vertex_index(self, name):
+        """
+        :param name: The name of the vertex
+        :return: The index of the first vertex with this name, None if there is none
+        """
+        indices = self.get_vertex_indices(name)
+        if not indices:
+            return None
+        return indices[0]
+
+    def get_edge_index(self, name):
+        """
+        :param name: The name of the edge
+        :return: The index of the first edge with this name, None if there is none
+        """
+        indices = self.get_edge_indices(name)
+        if not indices:
+            return None
+        return indices[0]
+
+    def get_vertex_index_list(self, names):
+        """
+        The same as get_vertex_index() for many names at once, faster when there are many of them
+
+        :param names: An iterable of names of vertices
+        :return: The list with the index of the first vertex with each name (None if there is none)
+        """
+        self.__update()
+        vertices = self._vertices
+        return [vertices[name][0] if name in vertices else None for name in names]
+
+    # Private
+
+    def __update(self):
+        with self._lock:
+            if self._vertices is not None \
+                    and self._vertex_count == self.g.vcount() \
+                    and self._edge_count == self.g.ecount():
+                return
+            self._vertices = self.__build_dict(self.g.vs)
+            self._edges = self.__build_dict(self.g.es)
+            self._vertex_count = self.g.vcount()
+            self._edge_count = self.g.ecount()
+            self._is_shared = False
+
+    def __unshare(self):
+        if not self._is_shared:
+            return
+        self._vertices = dict(self._vertices)
+        self._edges = dict(self._edges)
+        self._is_shared = False
+
+    def __build_dict(self, sequence):
+        names_dict = {}
+        self.__add_to_dict(names_dict, sequence, 0)
+        return names_dict
+
+    def __add_to_dict(self, names_dict, sequence, first_index):
+        if 'name' not in sequence.attribute_names():
+            return
+        for index, name in enumerate(sequence[first_index:]['name'], first_index):
+            names_dict[name] = names_dict.get(name, []) + [index]
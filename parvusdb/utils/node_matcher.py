@@ -1,3 +1,6 @@
+import numpy
+
+
 class StringNodeMatcher(object):
     """
     Checks whether one dict is contained into another one.
@@ -19,3 +22,37 @@ class StringNodeMatcher(object):
             except:
                 return False
         return True
+
+    def match_columns(self, key, lhs, rhs_column):
+        """
+        Matches a value against all the values of an attribute at once.
+        A matcher that overrides _match can override this method too, otherwise _match is called for each value.
+
+        :param key: The name of the attribute
+        :param lhs: The value to match
+        :param rhs_column: A numpy array of objects with the values of the attribute
+        :return: A numpy array of booleans, True where the value of the column matches lhs
+        """
+        if self.uses_exact_match() and isinstance(lhs, (str, int, float)):
+            return numpy.asarray(rhs_column == lhs, dtype=bool)
+        matches = numpy.zeros(len(rhs_column), dtype=bool)
+        for index, rvalue in enumerate(rhs_column):
+            try:
+                matches[index] = self._match(key, lhs, rvalue)
+            except:
+                pass
+        return matches
+
+    def uses_column_match(self):
+        """
+        :return: True if the properties can be compared with match_columns() instead of left_contains_right()
+        """
+        return type(self).left_contains_right is StringNodeMatcher.left_contains_right
+
+    def uses_exact_match(self):
+        """
+        :return: True if the values are compared with the exact match of this class. In that case
+                 the attribute indices of the database can be used to find the matching candidates
+        """
+        return type(self)._match is StringNodeMatcher._match \
+            and type(self).left_contains_right is StringNodeMatcher.left_contains_right
@@ -0,0 +1,193 @@
+import os
+import pickle
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy
+from igraph import ALL, Graph
+
+_cached_search = {}
+
+
+class ParallelSearch:
+    def __init__(self, number_of_workers, min_vertices=10000, chunks_per_worker=4):
+        """
+        This class looks for the sub-isomorphisms of a pattern into a big graph using many processes.
+        The vertices of the graph that can match one vertex of the pattern (the anchor) are split into chunks,
+        and each process looks for the matches where the anchor is one of the vertices of a chunk.
+        The graph is sent to the processes as a list of edges, together with the colours and the compatibility
+        matrices of the search. They are written once to a temporary file that each process reads only once
+        for each search, while the tasks only carry the name of the file and their chunk. Each process sorts the matches of its chunk by the vertex of the anchor and then
+        by the other vertices, and the chunks are joined in order: the result does not depend on which process
+        ends first nor on the number of processes.
+
+        :param number_of_workers: The number of processes
+        :param min_vertices: The graphs with fewer vertices are searched in the calling process
+        :param chunks_per_worker: The number of chunks for each process, more chunks balance better the work
+                                  when the matches are not evenly spread in the graph
+        """
+        self.number_of_workers = number_of_workers
+        self.min_vertices = min_vertices
+        self.chunks_per_worker = chunks_per_worker
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def search(self, lhs_graph, rhs_graph, arguments, vertex_matrix, edge_matrix):
+        """
+        Runs the search in the processes
+
+        :param lhs_graph: The graph to look sub-isomorphisms into (the bigger graph)
+        :param rhs_graph: The smaller graph
+        :param arguments: The arguments of subisomorphic_vf2() for the search in a single process. The colours are
+                          sent to the processes, and the compatibility functions tell that the colours are not enough
+        :param vertex_matrix: The CompatibilityMatrix of the vertices
+        :param edge_matrix: The CompatibilityMatrix of the edges
+        :return: The sorted list of the matches (as lists from the vertices of rhs to the vertices of lhs),
+                 None if the search cannot be split and must be run by the caller
+        """
+        if lhs_graph.vcount() < self.min_vertices or vertex_matrix is None or edge_matrix is None \
+                or not rhs_graph.vcount():
+            return None
+        anchor = min(range(rhs_graph.vcount()),
+                     key=lambda index: vertex_matrix.matrix[vertex_matrix.rhs_classes[index]].sum())
+        candidates = numpy.flatnonzero(vertex_matrix.matrix[vertex_matrix.rhs_classes[anchor]])
+        if len(candidates) < 2:
+            return None
+        order = self.__get_order(rhs_graph, anchor)
+        position = {vertex: index for index, vertex in enumerate(order)}
+        rhs_edges = [(position[source], position[target]) for source, target in rhs_graph.get_edgelist()]
+        number_of_chunks = min(len(candidates), self.number_of_workers * self.chunks_per_worker)
+        graph_data = (lhs_graph.vcount(), numpy.array(lhs_graph.get_edgelist(), dtype=numpy.int64),
+                      lhs_graph.is_directed())
+        search_data = (rhs_graph.vcount(), rhs_edges, rhs_graph.is_directed(),
+                       arguments['color1'], [arguments['color2'][vertex] for vertex in order],
+                       arguments['edge_color1'], arguments['edge_color2'],
+                       self.__get_compatibility_data(vertex_matrix, arguments, 'node_compat_fn', order),
+                       self.__get_compatibility_data(edge_matrix, arguments, 'edge_compat_fn', None))
+        path = self.__write_search(graph_data, search_data)
+        try:
+            tasks = [(path, chunk) for chunk in numpy.array_split(candidates, number_of_chunks)]
+            mappings = []
+            for chunk_mappings in self.__get_executor().map(_search_chunk, tasks):
+                mappings += [[mapping[position[vertex]] for vertex in range(len(order))]
+                             for mapping in chunk_mappings]
+        finally:
+            os.remove(path)
+        return mappings
+
+    def close(self):
+        """
+        Stops the processes
+
+        :return: None
+        """
+        with self._lock:
+            if self._executor:
+                self._executor.shutdown()
+            self._executor = None
+
+    # Private
+
+    def __get_executor(self):
+        with self._lock:
+            if not self._executor:
+                self._executor = ProcessPoolExecutor(self.number_of_workers)
+            return self._executor
+
+    def __write_search(self, graph_data, search_data):
+        """
+        :return: The path of a new temporary file with the data of the search
+        """
+        file_descriptor, path = tempfile.mkstemp(prefix='parvusdb-search-')
+        with os.fdopen(file_descriptor, 'wb') as f:
+            pickle.dump((graph_data, search_data), f, protocol=pickle.HIGHEST_PROTOCOL)
+        return path
+
+    def __get_order(self, rhs_graph, anchor):
+        """
+        The search of igraph matches the vertices of the pattern roughly in the order of their indices.
+        The vertices of the pattern are sent to the processes starting from the anchor and then in the order
+        of a breadth first visit, so that each process only searches around the vertices of its chunk.
+
+        :return: The list of the vertices of rhs in the new order
+        """
+        order = rhs_graph.bfs(anchor, mode=ALL)[0]
+        return order + sorted(set(range(rhs_graph.vcount())) - set(order))
+
+    def __get_compatibility_data(self, matrix, arguments, compatibility_function, order):
+        """
+        :return: The matrix and the classes of the pattern (in the new order, if given), None if the colours are
+                 enough to decide if two items match
+        """
+        if compatibility_function not in arguments:
+            return None
+        if order is None:
+            return matrix.matrix, matrix.rhs_classes
+        return matrix.matrix, [matrix.rhs_classes[vertex] for vertex in order]
+
+
+def _load_search(path):
+    """
+    Reads the data of a search and builds its graph, only the first time that the process works on the search
+
+    :return: The graph to search and the data of the search
+    """
+    if path not in _cached_search:
+        _cached_search.clear()
+        with open(path, 'rb') as f:
+            (vertex_count, edges, is_directed), search_data = pickle.load(f)
+        _cached_search[path] = Graph(n=vertex_count, edges=edges.tolist(), directed=is_directed), search_data
+    return _cached_search[path]
+
+
+def _search_chunk(task):
+    """
+    Looks for the matches where the anchor of the pattern (its first vertex) is one of the vertices in the chunk.
+    It runs in the processes of ParallelSearch.
+
+    :return: The list of the matches found, sorted by the vertex of the anchor and then by the other vertices
+    """
+    path, chunk = task
+    lhs_graph, search_data = _load_search(path)
+    rhs_vertex_count, rhs_edges, rhs_is_directed, color1, color2, edge_color1, edge_color2, \
+        vertex_compatibility, edge_compatibility = search_data
+    rhs_graph = Graph(n=rhs_vertex_count, edges=rhs_edges, directed=rhs_is_directed)
+    in_chunk = numpy.zeros(lhs_graph.vcount(), dtype=bool)
+    in_chunk[chunk] = True
+    in_chunk = in_chunk.tolist()
+    mappings = []
+
+    def callback(lhs, rhs, map12, map21):
+        if all([item == -1 for item in map21]):
+            return False
+        mappings.append(list(map21))
+        return True
+
+    arguments = {'other': rhs_graph, 'callback': callback, 'color1': color1, 'color2': color2,
+                 'edge_color1': edge_color1, 'edge_color2': edge_color2}
+    anchor = 0
+    anchor_color = color2[anchor]
+    if vertex_compatibility is None and color2.count(anchor_color) == 1:
+        dead_color = max(color1 + color2) + 1
+        arguments['color1'] = [dead_color if color == anchor_color and not in_chunk[index] else color
+                               for index, color in enumerate(color1)]
+    else:
+        arguments['node_compat_fn'] = _create_compatibility_function(vertex_compatibility, anchor, in_chunk)
+    if edge_compatibility is not None:
+        arguments['edge_compat_fn'] = _create_compatibility_function(edge_compatibility, None, None)
+    lhs_graph.subisomorphic_vf2(**arguments)
+    return sorted(mappings, key=lambda mapping: (mapping[anchor], mapping))
+
+
+def _create_compatibility_function(compatibility, anchor, in_chunk):
+    rows, rhs_classes = compatibility or (None, None)
+    if rows is not None:
+        rows = rows.tolist()
+
+    def is_compatible(lhs, rhs, lhs_index, rhs_index):
+        if rows is not None and not rows[rhs_classes[rhs_index]][lhs_index]:
+            return False
+        return rhs_index != anchor or in_chunk[lhs_index]
+
+    return is_compatible
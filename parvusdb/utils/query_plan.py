@@ -0,0 +1,285 @@
+import re
+
+from .aux import create_graph_from_string, get_random_name
+
+_parameter_regex = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|\$([A-Za-z_][A-Za-z0-9_]*)')
+_parameter_placeholder_prefix = '\x00'
+_page_parameter_regex = re.compile(r'^\$([A-Za-z_][A-Za-z0-9_]*)$')
+_quoted_regex_string = r"""\{(?:[^{}'"]|'(?:\\.|[^'\\])*'|"(?:\\.|[^"\\])*")*\}|"(?:\\.|[^"\\])*\""""
+
+
+def convert_special_characters_to_spaces(line):
+    line = line.replace('\t', ' ')
+    line = line.replace('\n', ' ')
+    return line
+
+
+def get_parameter_symbol(name):
+    """
+    :param name: The name of a parameter of the query
+    :return: The name of the variable that holds the parameter in the LISP code
+    """
+    return '__parameter_' + name
+
+
+class QueryPlan:
+    def __init__(self, query_string, action_list):
+        """
+        This class parses a query once, so that it can be executed many times.
+        The graphs of MATCH and CREATE are built from their strings and the other commands are split into
+        lists of variables or lines of code.
+
+        A query can have named parameters, written as $name in the properties of a graph, in the LISP code
+        of WHERE and SET, or as the number of SKIP and LIMIT. For example
+            MATCH {'tag': 'PERSON', 'text': $name}(a) WHERE (in (get a "tag") $tags) RETURN a SKIP $start LIMIT 10
+        SKIP and LIMIT are not commands to execute: they are removed from the lines and kept aside for each line
+        DELETE ALL and SET ALL are commands of their own, and they can only follow the MATCH and WHERE of a line
+
+        :param query_string: The query to parse
+        :param action_list: The keywords of the commands in the query
+        """
+        self.query_string = query_string
+        self.parameters = set()
+        self.has_create = query_string.find('CREATE') != -1
+        self._parameter_positions = {}
+        self._unnamed_edges = {}
+        self._match_keys = {}
+        self._texts = {}
+        self._pages = {}
+        self.lines = [self.__parse_line(line, action_list) for line in self.__get_command_lines(query_string)]
+
+    def bind(self, action_graph_pairs, parameters=None, edge_names=None):
+        """
+        Makes a copy of the graphs in a line of the plan and writes the values of the parameters into them.
+        The edges of CREATE without a name in the query are given a new random name each time, so that each
+        execution creates different edges.
+        The graphs can then be modified by the execution of the query.
+
+        :param action_graph_pairs: One of the elements of self.lines
+        :param parameters: A dict with the values of the parameters
+        :param edge_names: An iterator with the names to give to all the edges of CREATE, as returned by
+                           get_created_edge_names() when the line was executed before (e.g. from the log of a Storage)
+        :return: The command/argument pairs of the line, with the arguments ready to be executed
+        """
+        self.__check_parameters(parameters)
+        bound_pairs = []
+        for action, argument in action_graph_pairs:
+            if action in ['MATCH', 'CREATE']:
+                bound_graph = self.__bind_graph(argument, parameters)
+                if action == 'CREATE':
+                    self.__name_edges(bound_graph, self._unnamed_edges.get(id(argument), []), edge_names)
+                argument = bound_graph
+            bound_pairs.append((action, argument))
+        return bound_pairs
+
+    def get_created_edge_names(self, action_graph_pairs):
+        """
+        :param action_graph_pairs: A line returned by bind()
+        :return: The list of the names of the edges of the CREATE commands in the line
+        """
+        return [edge['name'] for action, graph in action_graph_pairs if action == 'CREATE' for edge in graph.es]
+
+    def get_match_key(self, action_graph_pairs, parameters=None):
+        """
+        The MATCH command of a line and the WHERE commands that follow it have the same matches as the ones
+        of another line with the same key. The key is made of their text, without the spaces around each command,
+        and of the values of the parameters they use.
+
+        :param action_graph_pairs: One of the elements of self.lines
+        :param parameters: A dict with the values of the parameters
+        :return: The key, None if the line does not start with a MATCH command
+        """
+        if id(action_graph_pairs) not in self._match_keys:
+            return None
+        texts, parameter_names = self._match_keys[id(action_graph_pairs)]
+        return texts, tuple([repr(parameters[name]) for name in parameter_names])
+
+    def get_texts(self, action_graph_pairs):
+        """
+        :param action_graph_pairs: One of the elements of self.lines
+        :return: A list with a (command, argument) pair for each command of the line, with the argument as written
+                 in the query
+        """
+        return self._texts[id(action_graph_pairs)]
+
+    def get_skip_and_limit(self, action_graph_pairs, parameters=None):
+        """
+        :param action_graph_pairs: One of the elements of self.lines
+        :param parameters: A dict with the values of the parameters
+        :return: The number of matches to skip (0 if there is no SKIP) and the maximum number of matches to use
+                 after them (None if there is no LIMIT)
+        """
+        page = self._pages.get(id(action_graph_pairs), {})
+        skip, limit = page.get('SKIP', 0), page.get('LIMIT')
+        if isinstance(skip, str):
+            skip = self.__check_page_value('SKIP', (parameters or {}).get(skip))
+        if isinstance(limit, str):
+            limit = self.__check_page_value('LIMIT', (parameters or {}).get(limit))
+        return skip, limit
+
+    def get_code_parameters(self, parameters=None):
+        """
+        :param parameters: A dict with the values of the parameters
+        :return: The parameters as they are named in the LISP code
+        """
+        self.__check_parameters(parameters)
+        if not parameters:
+            return {}
+        return {get_parameter_symbol(name): value for name, value in parameters.items()}
+
+    # Private
+
+    def __check_parameters(self, parameters):
+        missing_parameters = self.parameters - set(parameters or {})
+        if missing_parameters:
+            raise ValueError('Missing values for the query parameters: ' + ', '.join(sorted(missing_parameters)))
+
+    def __bind_graph(self, graph, parameters):
+        positions = self._parameter_positions.get(id(graph), [])
+        graph = graph.copy()
+        for sequence_name, index, key, name in positions:
+            getattr(graph, sequence_name)[index][key] = parameters[name]
+        return graph
+
+    def __name_edges(self, graph, unnamed_edges, edge_names):
+        if edge_names is None:
+            for index in unnamed_edges:
+                graph.es[index]['name'] = get_random_name()
+            return
+        for edge in graph.es:
+            name = next(edge_names, None)
+            if name is None:
+                raise ValueError('There are fewer edge names than edges to create')
+            edge['name'] = name
+
+    def __get_command_lines(self, string):
+        lines = []
+        for line in string.split('\n'):
+            if not line.strip() or line.strip()[0] == '#':
+                continue
+            lines.append(line)
+        lines = '\n'.join(lines).split(';')
+        return lines
+
+    def __parse_line(self, line, action_list):
+        action_graph_pairs = []
+        texts = []
+        page = {}
+        for action, graph_str in self.__get_action_graph_pairs_from_query(line, action_list):
+            if action == 'CREATE' and graph_str.strip().startswith('INDEX ON '):
+                action = 'CREATE INDEX'
+                graph_str = graph_str.strip()[len('INDEX ON '):]
+            if action in ['DELETE', 'SET'] and graph_str.strip().startswith('ALL '):
+                action += ' ALL'
+                graph_str = graph_str.strip()[len('ALL '):]
+            texts.append((action, graph_str.strip()))
+            if action in ['SKIP', 'LIMIT']:
+                self.__add_page_value(page, action, graph_str.strip())
+                continue
+            action_graph_pairs.append((action, self.__parse_argument(action, graph_str)))
+        self.__check_set_oriented_commands([action for action, _ in action_graph_pairs])
+        self._texts[id(action_graph_pairs)] = texts
+        if page:
+            self._pages[id(action_graph_pairs)] = page
+        self.__add_match_key(action_graph_pairs, [(action, text) for action, text in texts
+                                                  if action not in ['SKIP', 'LIMIT']])
+        return action_graph_pairs
+
+    def __check_set_oriented_commands(self, actions):
+        if 'SET ALL' not in actions and 'DELETE ALL' not in actions:
+            return
+        if actions.count('MATCH') != 1 or actions[0] != 'MATCH':
+            raise ValueError('SET ALL and DELETE ALL must follow the only MATCH of the line')
+        position = 1
+        while position < len(actions) and actions[position] == 'WHERE':
+            position += 1
+        if not set(actions[position:]) <= {'SET ALL', 'DELETE ALL', 'RETURN', ''}:
+            raise ValueError('Only SET ALL, DELETE ALL and RETURN can follow MATCH and WHERE in a line with SET ALL '
+                             'or DELETE ALL')
+
+    def __add_page_value(self, page, action, text):
+        if action in page:
+            raise ValueError('A line can have only one ' + action)
+        match = _page_parameter_regex.match(text)
+        if match:
+            self.parameters.add(match.group(1))
+            page[action] = match.group(1)
+            return
+        try:
+            value = int(text)
+        except ValueError:
+            value = None
+        page[action] = self.__check_page_value(action, value)
+
+    def __check_page_value(self, action, value):
+        if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+            raise ValueError(action + ' must be followed by a number that is not negative, or by a parameter')
+        return value
+
+    def __add_match_key(self, action_graph_pairs, texts):
+        actions = [action for action, _ in texts]
+        if 'MATCH' not in actions:
+            return
+        position = actions.index('MATCH') + 1
+        while position < len(actions) and actions[position] == 'WHERE':
+            position += 1
+        texts = tuple(texts[:position])
+        parameter_names = set([match.group(2) for _, text in texts for match in _parameter_regex.finditer(text)
+                               if match.group(2)])
+        self._match_keys[id(action_graph_pairs)] = texts, sorted(parameter_names)
+
+    def __parse_argument(self, action, graph_str):
+        if action == 'CREATE':
+            unnamed_edges = []
+            graph = self.__parse_graph(graph_str, unnamed_edges)
+            if unnamed_edges:
+                self._unnamed_edges[id(graph)] = unnamed_edges
+            return graph
+        if action == 'MATCH':
+            return self.__parse_graph(graph_str)
+        if action in ['WHERE', 'SET', 'SET ALL']:
+            return self.__replace_parameters(graph_str, get_parameter_symbol)
+        return [v for v in graph_str.strip().replace(' ', '').split(',') if v]
+
+    def __parse_graph(self, graph_str, unnamed_edges=None):
+        graph_str = self.__replace_parameters(graph_str,
+                                              lambda name: repr(_parameter_placeholder_prefix + name))
+        graph = create_graph_from_string(graph_str, unnamed_edges=unnamed_edges)
+        positions = []
+        for sequence_name in ['vs', 'es']:
+            for item in getattr(graph, sequence_name):
+                for key, value in item.attributes().items():
+                    if isinstance(value, str) and value.startswith(_parameter_placeholder_prefix):
+                        positions.append((sequence_name, item.index, key, value[1:]))
+        if positions:
+            self._parameter_positions[id(graph)] = positions
+        return graph
+
+    def __replace_parameters(self, string, replace_function):
+        def replace(match):
+            if match.group(1):
+                return match.group(1)
+            self.parameters.add(match.group(2))
+            return replace_function(match.group(2))
+
+        return _parameter_regex.sub(replace, string)
+
+    def __get_action_graph_pairs_from_query(self, query, action_list):
+        """
+        Splits the query into command/argument pairs, for example [("MATCH","{}(_a))", ("RETURN","_a")]
+        The commands inside the properties between braces and inside the strings of the LISP code are not split.
+
+        :param query: The string with the list of commands
+        :return: the command/argument pairs
+        """
+        query = convert_special_characters_to_spaces(query)
+        items = []
+        start = 0
+        for match in re.finditer('(' + _quoted_regex_string + ')|(' + '|'.join(action_list) + ')', query):
+            if match.group(2):
+                items += [query[start:match.start()], match.group(2)]
+                start = match.end()
+        items.append(query[start:])
+        action_list = [action.strip() for action in items[1::2]]
+        graph_list = items[2::2]
+        return zip(action_list, graph_list)
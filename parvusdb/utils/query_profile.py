@@ -0,0 +1,82 @@
+import time
+from contextlib import contextmanager
+
+
+class QueryProfile:
+    def __init__(self):
+        """
+        This class measures where the time of a query goes, and counts the operations done to search the graph.
+        The time is split into phases:
+            * parse: parsing the query string
+            * bind: writing the values of the parameters into the graphs of the query
+            * compile: compiling the LISP code of WHERE and SET
+            * namespace: adding the graphs to the namespace of the LISP code
+            * match: looking for the matches of MATCH (including the callbacks of the search)
+            * write: changing the graph with CREATE, DELETE and SET
+            * return: building the results of RETURN
+        A phase that starts while another one is running is not counted in the other one,
+        therefore the phases add up to the time of the query.
+        """
+        self.phases = {}
+        self.counters = {'iterations': 0,
+                         'vertex_compat_calls': 0,
+                         'edge_compat_calls': 0,
+                         'vf2_callbacks': 0,
+                         'where_evaluations': 0,
+                         'matches_found': 0,
+                         'match_cache_hits': 0,
+                         'vertices_searched': 0,
+                         'vertices_written': 0}
+        self._running_phases = []
+        self._phase_start = None
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Adds the time spent in the block to a phase
+
+        :param name: The name of the phase
+        """
+        now = time.perf_counter()
+        if self._running_phases:
+            self.__add_time(self._running_phases[-1], now)
+        self._running_phases.append(name)
+        self._phase_start = now
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            self.__add_time(self._running_phases.pop(), now)
+            self._phase_start = now
+
+    def count(self, name, number=1):
+        """
+        :param name: The name of the counter
+        :param number: The number to add to the counter
+        :return: None
+        """
+        self.counters[name] = self.counters.get(name, 0) + number
+
+    def get_report(self):
+        """
+        :return: A dict with the time since the profile was created ('total_ms'), the time of each phase
+                 ('phases_ms') and the counters ('counters')
+        """
+        return {'total_ms': (time.perf_counter() - self._start) * 1000,
+                'phases_ms': {name: seconds * 1000 for name, seconds in self.phases.items()},
+                'counters': dict(self.counters)}
+
+    # Private
+
+    def __add_time(self, name, now):
+        self.phases[name] = self.phases.get(name, 0) + now - self._phase_start
+
+
+class DummyQueryProfile:
+    @contextmanager
+    def phase(self, name):
+        yield
+
+    def count(self, name, number=1):
+        pass
@@ -0,0 +1,81 @@
+import threading
+from contextlib import contextmanager
+
+
+class ReadWriteLock:
+    def __init__(self):
+        """
+        A lock that can be held by many readers at the same time or by a single writer.
+        A writer that is waiting stops new readers from entering, so that the writers are not starved.
+        A thread that already reads can read again, even if a writer is waiting, and the thread that writes
+        can also read. A thread that reads or writes cannot start writing: it gets a RuntimeError instead
+        of waiting for itself forever.
+        """
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._is_writing = False
+        self._writer = None
+        self._waiting_writers = 0
+        self._local = threading.local()
+
+    def acquire_read(self):
+        with self._condition:
+            reads_in_thread = getattr(self._local, 'reads', 0)
+            while self._writer != threading.get_ident() \
+                    and (self._is_writing or (self._waiting_writers and not reads_in_thread)):
+                self._condition.wait()
+            self._readers += 1
+            self._local.reads = reads_in_thread + 1
+
+    def release_read(self):
+        with self._condition:
+            self._readers -= 1
+            self._local.reads = max(getattr(self._local, 'reads', 0) - 1, 0)
+            if not self._readers:
+                self._condition.notify_all()
+
+    def acquire_write(self):
+        with self._condition:
+            if getattr(self._local, 'reads', 0):
+                raise RuntimeError('The graph cannot be modified by a thread that is reading it')
+            if self._writer == threading.get_ident():
+                raise RuntimeError('The graph cannot be modified by a thread that is already modifying it')
+            self._waiting_writers += 1
+            try:
+                while self._is_writing or self._readers:
+                    self._condition.wait()
+            except:
+                self._waiting_writers -= 1
+                self._condition.notify_all()
+                raise
+            self._waiting_writers -= 1
+            self._is_writing = True
+            self._writer = threading.get_ident()
+
+    def release_write(self):
+        with self._condition:
+            self._is_writing = False
+            self._writer = None
+            self._condition.notify_all()
+
+    @contextmanager
+    def reading(self):
+        """
+        Holds the lock as a reader inside a with statement
+        """
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def writing(self):
+        """
+        Holds the lock as the only writer inside a with statement
+        """
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
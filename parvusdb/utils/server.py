@@ -0,0 +1,98 @@
+import asyncio
+import json
+
+
+class GraphDatabaseServer:
+    def __init__(self, async_db, max_pipelined_requests=128, max_line_length=2 ** 24):
+        """
+        This class lets other processes query an AsyncGraphDatabase through a TCP or a Unix socket.
+        Each request is a JSON object written on a single line
+            {"query": "MATCH {'tag': 'PERSON', 'text': $name}(a) RETURN a", "parameters": {"name": "john"}}
+        and each response is a JSON object on a single line, with the result of the query or its error
+            {"result": [{"a": {"name": "v1", "tag": "PERSON", "text": "john"}}]}
+            {"error": "ValueError: Missing values for the query parameters: name"}
+        A client can send many requests without waiting for the responses. The requests of a connection are
+        sent to the database in the order they are read, and the responses are written in the same order.
+
+        :param async_db: The AsyncGraphDatabase to query
+        :param max_pipelined_requests: The number of requests of a connection that can wait for their response
+                                       before the server stops reading from the connection
+        :param max_line_length: The maximum length of a request in bytes
+        """
+        self.async_db = async_db
+        self.max_pipelined_requests = max_pipelined_requests
+        self.max_line_length = max_line_length
+        self._server = None
+
+    async def start(self, host='127.0.0.1', port=0, path=None):
+        """
+        Starts listening for connections
+
+        :param host: The address of the TCP socket
+        :param port: The port of the TCP socket, if 0 a free port is chosen
+        :param path: The path of a Unix socket, used instead of the TCP socket if it is given
+        :return: itself
+        """
+        if path:
+            self._server = await asyncio.start_unix_server(self.__handle_connection, path=path,
+                                                           limit=self.max_line_length)
+        else:
+            self._server = await asyncio.start_server(self.__handle_connection, host, port,
+                                                      limit=self.max_line_length)
+        return self
+
+    def get_addresses(self):
+        """
+        :return: The addresses of the sockets of the server, e.g. [('127.0.0.1', 40123)]
+        """
+        return [socket.getsockname() for socket in self._server.sockets]
+
+    async def close(self):
+        """
+        Stops listening for new connections
+
+        :return: None
+        """
+        self._server.close()
+        await self._server.wait_closed()
+
+    # Private
+
+    async def __handle_connection(self, reader, writer):
+        answers = asyncio.Queue(self.max_pipelined_requests)
+        sender = asyncio.ensure_future(self.__send_responses(answers, writer))
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.strip():
+                    await answers.put(asyncio.ensure_future(self.__answer(line)))
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            await answers.put(None)
+            await sender
+            writer.close()
+
+    async def __answer(self, line):
+        try:
+            request = json.loads(line.decode('utf-8'))
+            return {'result': await self.async_db.query(request['query'], request.get('parameters'))}
+        except Exception as e:
+            return {'error': type(e).__name__ + ': ' + str(e)}
+
+    async def __send_responses(self, answers, writer):
+        is_connected = True
+        while True:
+            answer = await answers.get()
+            if answer is None:
+                return
+            response = await answer
+            if not is_connected:
+                continue
+            try:
+                writer.write((json.dumps(response, default=str) + '\n').encode('utf-8'))
+                await writer.drain()
+            except ConnectionError:
+                is_connected = False
@@ -0,0 +1,173 @@
+import os
+import pickle
+import struct
+import zlib
+
+import numpy
+
+_record_header = struct.Struct('<II')
+
+
+class Storage:
+    def __init__(self, directory, sync_every=1, snapshot_every=None):
+        """
+        This class keeps a graph on disk, as a snapshot of the whole graph and a log of the changes made after it.
+        The changes are appended to the log before they are applied to the graph (write-ahead log). After a restart,
+        the graph is loaded from the snapshot and the changes in the log are applied again.
+
+        :param directory: The directory with the snapshot and the log. It is created if it does not exist
+        :param sync_every: The number of changes written to the log before it is synced to disk (group commit).
+                           With 1 each change is on disk before it is applied. With a larger number the last changes
+                           can be lost in a crash, but writing is faster
+        :param snapshot_every: The number of changes in the log after which a new snapshot is written and the log
+                               is emptied. If None the snapshots are written only when asked
+        """
+        self.directory = directory
+        self.sync_every = sync_every
+        self.snapshot_every = snapshot_every
+        self.sequence = 0
+        self.records_since_snapshot = 0
+        self._records_since_sync = 0
+        self._log_file = None
+        os.makedirs(directory, exist_ok=True)
+
+    def load(self):
+        """
+        Reads the snapshot and the changes that were logged after it. A change that was only partly written
+        (because of a crash) is removed from the end of the log.
+
+        :return: The snapshot (None if there is none) and the list of changes to apply to it
+        """
+        snapshot = None
+        if os.path.exists(self.__get_snapshot_path()):
+            with open(self.__get_snapshot_path(), 'rb') as f:
+                snapshot = pickle.load(f)
+            self.sequence = snapshot['sequence']
+        records = []
+        valid_length = 0
+        if os.path.exists(self.__get_log_path()):
+            with open(self.__get_log_path(), 'rb') as f:
+                for record, position in self.__read_records(f):
+                    valid_length = position
+                    if record['sequence'] > self.sequence:
+                        records.append(record)
+            with open(self.__get_log_path(), 'r+b') as f:
+                f.truncate(valid_length)
+        if records:
+            self.sequence = records[-1]['sequence']
+        self.records_since_snapshot = len(records)
+        return snapshot, records
+
+    def append(self, record):
+        """
+        Appends a change to the log
+
+        :param record: A dict that describes the change. It must be possible to pickle it
+        :return: None
+        """
+        self.sequence += 1
+        record = dict(record, sequence=self.sequence)
+        payload = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+        log_file = self.__get_log_file()
+        log_file.write(_record_header.pack(len(payload), zlib.crc32(payload)))
+        log_file.write(payload)
+        self.records_since_snapshot += 1
+        self._records_since_sync += 1
+        if self._records_since_sync >= self.sync_every:
+            self.sync()
+
+    def sync(self):
+        """
+        Makes sure that the changes in the log are on disk
+
+        :return: None
+        """
+        if self._log_file is None:
+            return
+        self._log_file.flush()
+        os.fsync(self._log_file.fileno())
+        self._records_since_sync = 0
+
+    def needs_snapshot(self):
+        """
+        :return: True if there are more changes in the log than self.snapshot_every
+        """
+        return self.snapshot_every is not None and self.records_since_snapshot >= self.snapshot_every
+
+    def write_snapshot(self, g, indexed_attributes=()):
+        """
+        Writes the whole graph to disk and empties the log.
+        The snapshot is first written to a temporary file, so that the old one is still valid if a crash happens.
+
+        :param g: The graph to write
+        :param indexed_attributes: The names of the attributes with an index
+        :return: None
+        """
+        snapshot = {'sequence': self.sequence,
+                    'directed': g.is_directed(),
+                    'vertex_count': g.vcount(),
+                    'edges': numpy.array(g.get_edgelist(), dtype=numpy.int64).reshape((g.ecount(), 2)),
+                    'vertex_attributes': {key: g.vs[key] for key in g.vs.attribute_names()},
+                    'edge_attributes': {key: g.es[key] for key in g.es.attribute_names()},
+                    'indexed_attributes': list(indexed_attributes)}
+        temporary_path = self.__get_snapshot_path() + '.tmp'
+        with open(temporary_path, 'wb') as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary_path, self.__get_snapshot_path())
+        self.__sync_directory()
+        if self._log_file is not None:
+            self._log_file.close()
+        self._log_file = open(self.__get_log_path(), 'wb')
+        self.sync()
+        self.records_since_snapshot = 0
+
+    def close(self):
+        """
+        Syncs and closes the log
+
+        :return: None
+        """
+        self.sync()
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
+
+    # Private
+
+    def __get_snapshot_path(self):
+        return os.path.join(self.directory, 'snapshot')
+
+    def __get_log_path(self):
+        return os.path.join(self.directory, 'log')
+
+    def __get_log_file(self):
+        if self._log_file is None:
+            self._log_file = open(self.__get_log_path(), 'ab')
+        return self._log_file
+
+    def __sync_directory(self):
+        try:
+            directory_descriptor = os.open(self.directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(directory_descriptor)
+        except OSError:
+            pass
+        finally:
+            os.close(directory_descriptor)
+
+    def __read_records(self, f):
+        position = 0
+        while True:
+            header = f.read(_record_header.size)
+            if len(header) < _record_header.size:
+                return
+            length, checksum = _record_header.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                return
+            position += _record_header.size + length
+            yield pickle.loads(payload), position
@@ -0,0 +1,121 @@
+from igraph import ALL, Vertex
+
+from .aux import fill_graph
+
+
+class UndoLog:
+    def __init__(self, g):
+        """
+        This class records what is needed to undo the changes made to g: the indices of the vertices and edges
+        that are added, the old attributes of the ones that are modified and the copies of the ones that are deleted.
+        The cost of recording a change depends only on the size of the change, not on the size of g.
+        The changes are undone in the opposite order. Only undoing a deletion builds g again, to put the deleted
+        vertices and edges back at their old indices.
+
+        :param g: The graph that is going to be modified
+        """
+        self.g = g
+        self._vertex_attribute_names = set(g.vs.attribute_names())
+        self._edge_attribute_names = set(g.es.attribute_names())
+        self._entries = []
+
+    def add_items(self, first_vertex_index, first_edge_index):
+        """
+        Records that the vertices and edges from these indices to the end of the graph are going to be added
+
+        :param first_vertex_index: The index of the first new vertex
+        :param first_edge_index: The index of the first new edge
+        :return: None
+        """
+        self._entries.append(('add', first_vertex_index, first_edge_index))
+
+    def change_attributes(self, items):
+        """
+        Records the attributes of some vertices and edges before they are modified
+
+        :param items: The vertices and edges that are going to be modified
+        :return: None
+        """
+        self._entries.append(('change', [(isinstance(item, Vertex), item.index, item.attributes())
+                                         for item in items]))
+
+    def delete_items(self, vertex_indices, edge_indices):
+        """
+        Records the vertices and edges that are going to be deleted, together with the edges of the vertices
+
+        :param vertex_indices: The indices of the vertices to delete
+        :param edge_indices: The indices of the edges to delete
+        :return: None
+        """
+        vertex_indices = set(vertex_indices)
+        edge_indices = set(edge_indices)
+        for vertex_index in vertex_indices:
+            edge_indices.update(self.g.incident(vertex_index, mode=ALL))
+        self._entries.append(('delete',
+                              [(index, self.g.vs[index].attributes()) for index in sorted(vertex_indices)],
+                              [(index, self.g.es[index].tuple, self.g.es[index].attributes())
+                               for index in sorted(edge_indices)]))
+
+    def rollback(self):
+        """
+        Undoes all the recorded changes
+
+        :return: None
+        """
+        while self._entries:
+            entry = self._entries.pop()
+            if entry[0] == 'add':
+                self.__undo_add(*entry[1:])
+            elif entry[0] == 'change':
+                self.__undo_change(*entry[1:])
+            else:
+                self.__undo_delete(*entry[1:])
+        for key in set(self.g.vs.attribute_names()) - self._vertex_attribute_names:
+            del self.g.vs[key]
+        for key in set(self.g.es.attribute_names()) - self._edge_attribute_names:
+            del self.g.es[key]
+
+    # Private
+
+    def __undo_add(self, first_vertex_index, first_edge_index):
+        self.g.delete_edges(range(first_edge_index, self.g.ecount()))
+        self.g.delete_vertices(range(first_vertex_index, self.g.vcount()))
+
+    def __undo_change(self, items):
+        for is_vertex, index, attributes in items:
+            sequence = self.g.vs if is_vertex else self.g.es
+            item = sequence[index]
+            for key in sequence.attribute_names():
+                item[key] = attributes.get(key)
+
+    def __undo_delete(self, vertices, edges):
+        vertex_positions = self.__get_remaining_positions(self.g.vcount() + len(vertices), vertices)
+        edge_positions = self.__get_remaining_positions(self.g.ecount() + len(edges), edges)
+        edge_list = [None] * (self.g.ecount() + len(edges))
+        for position, (source, target) in zip(edge_positions, self.g.get_edgelist()):
+            edge_list[position] = (vertex_positions[source], vertex_positions[target])
+        for index, edge_tuple, _ in edges:
+            edge_list[index] = edge_tuple
+        fill_graph(self.g, len(vertex_positions) + len(vertices),
+                   self.__get_columns(self.g.vs, vertex_positions, vertices),
+                   edge_list,
+                   self.__get_columns(self.g.es, edge_positions, [(edge[0], edge[2]) for edge in edges]))
+
+    def __get_remaining_positions(self, count, deleted_items):
+        deleted_indices = set([item[0] for item in deleted_items])
+        return [index for index in range(count) if index not in deleted_indices]
+
+    def __get_columns(self, sequence, positions, deleted_items):
+        keys = sequence.attribute_names()
+        for _, attributes in deleted_items:
+            keys += [key for key in attributes if key not in keys]
+        columns = {}
+        for key in keys:
+            column = [None] * (len(positions) + len(deleted_items))
+            if key in sequence.attribute_names():
+                for position, value in zip(positions, sequence[key]):
+                    column[position] = value
+            for index, attributes in deleted_items:
+                column[index] = attributes.get(key)
+            columns[key] = column
+        return columns
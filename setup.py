@@ -1,15 +1,30 @@
 from setuptools import setup
 from distutils.extension import Extension
 
-packages = ['parvusdb', 'parvusdb.utils']
+packages = ['parvusdb', 'parvusdb.benchmarks', 'parvusdb.utils']
 extensions = [Extension('parvusdb', ['parvusdb' + '/__init__.py']),
               Extension('parvusdb.utils', ['parvusdb/utils/__init__.py',
+                                           'parvusdb/utils/async_graph_database.py',
+                                           'parvusdb/utils/attribute_index.py',
                                            'parvusdb/utils/aux.py',
                                            'parvusdb/utils/code_container.py',
-                                           'parvusdb/utils/cache.py'
+                                           'parvusdb/utils/compatibility_matrix.py',
+                                           'parvusdb/utils/component_index.py',
+                                           'parvusdb/utils/cache.py',
                                            'parvusdb/utils/graph_builder.py',
                                            'parvusdb/utils/graph_database.py',
-                                           'parvusdb/utils/node_matcher.py'
+                                           'parvusdb/utils/graph_version.py',
+                                           'parvusdb/utils/lazy_namespace.py',
+                                           'parvusdb/utils/match_cache.py',
+                                           'parvusdb/utils/name_index.py',
+                                           'parvusdb/utils/node_matcher.py',
+                                           'parvusdb/utils/parallel_search.py',
+                                           'parvusdb/utils/query_plan.py',
+                                           'parvusdb/utils/query_profile.py',
+                                           'parvusdb/utils/read_write_lock.py',
+                                           'parvusdb/utils/server.py',
+                                           'parvusdb/utils/storage.py',
+                                           'parvusdb/utils/undo_log.py'
                                            ])]
 
 setup(name='parvusdb',
@@ -22,6 +37,7 @@ setup(name='parvusdb',
       install_requires=[
           'python-igraph==0.7.1.post6',
           'hy==0.13.0',
+          'numpy',
       ],
       zip_safe=False,
       classifiers=[